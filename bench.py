@@ -0,0 +1,193 @@
+"""
+Benchmarks for room construction, per-frame updates and per-frame drawing.
+
+Prints the results as JSON with p50/p95/p99 times in milliseconds, so runs can
+be compared across releases:
+python bench.py > bench_output.txt
+
+The JSON also has the texture registry's counters (hits, misses, decodes).
+
+Drawing needs a GL context, so it is only measured with --draw (in a hidden
+window). Everything else runs headless.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import headless
+import arcade
+from pyglet import gl
+import final
+import textures
+
+
+def summarize(samples):
+    """Turns a list of times in seconds into milliseconds percentiles"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 4)
+
+    return {'samples': len(ordered),
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4),
+            'p50_ms': percentile(50),
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99)}
+
+
+def timed(function, repeats):
+    """Calls function repeats times and returns how long each call took"""
+    samples = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def new_game():
+    """A headless game that has been set up and started"""
+    game = headless.HeadlessGame()
+    game.setup()
+    game.start_game()
+    return game
+
+
+def timed_updates(game, ticks, before_update = None):
+    """Times single updates of the game, optionally feeding input before each one"""
+    samples = []
+    for tick in range(ticks):
+        if before_update is not None:
+            before_update(game, tick)
+        start = time.perf_counter()
+        game.update(game.timestep)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def place_player(game, tile_x, tile_y):
+    game.player_sprite.left = tile_x * final.SPRITE_SIZE
+    game.player_sprite.bottom = tile_y * final.SPRITE_SIZE
+
+
+def bench_construction(repeats):
+    results = {}
+    #Making the game moves into the game folder and switches textures to headless
+    game = headless.HeadlessGame()
+    results['game_setup'] = summarize(timed(game.setup, repeats))
+    results['setup_room_1'] = summarize(timed(final.setup_room_1, repeats))
+    results['setup_room_2'] = summarize(timed(final.setup_room_2, repeats))
+    return results
+
+
+def bench_update(ticks):
+    results = {}
+
+    # Standing still in the starting cell
+    game = new_game()
+    results['update_idle'] = summarize(timed_updates(game, ticks))
+
+    # Wandering around the maze, changing direction every half second
+    game = new_game()
+    place_player(game, 15, 1)
+    rng = random.Random(0)
+    keys = [arcade.key.UP, arcade.key.DOWN, arcade.key.LEFT, arcade.key.RIGHT]
+
+    def wander(game, tick):
+        if tick % 30 == 0:
+            for key in keys:
+                game.release(key)
+            game.press(rng.choice(keys))
+    results['update_maze_walk'] = summarize(timed_updates(game, ticks, wander))
+
+    # Stepping onto each portal in turn and pressing Z
+    game = new_game()
+    portals = list(game.rooms[0].portal_list)
+
+    def teleport(game, tick):
+        if tick % 2 == 0:
+            portal = portals[(tick // 2) % len(portals)]
+            game.player_sprite.left = portal.start_x
+            game.player_sprite.bottom = portal.start_y
+            game.press(arcade.key.Z)
+        else:
+            game.release(arcade.key.Z)
+    results['update_portals'] = summarize(timed_updates(game, ticks, teleport))
+
+    # Standing under the first lever and pressing Z over and over
+    game = new_game()
+    place_player(game, 2, 10)
+    game.player.facing_y = 1
+
+    def spam_z(game, tick):
+        if tick % 2 == 0:
+            game.press(arcade.key.Z)
+        else:
+            game.release(arcade.key.Z)
+    samples = []
+    for tick in range(ticks):
+        start = time.perf_counter()
+        spam_z(game, tick)
+        game.update(game.timestep)
+        samples.append(time.perf_counter() - start)
+        #Close any dialogue so the levers keep getting pulled
+        game.state = final.GAME
+    results['update_switch_spam'] = summarize(samples)
+    return results
+
+
+def bench_draw(frames):
+    """Times on_draw in every game state, in a hidden window"""
+    #The headless benchmarks left the registry without real textures
+    textures.registry = textures.TextureRegistry()
+    window = final.MyGame(final.SCREEN_WIDTH, final.SCREEN_HEIGHT)
+    window.set_visible(False)
+    window.setup()
+
+    results = {}
+    note = final.objects.InteractObjects("Images/note.png", final.SPRITE_SCALING, "\"Sometimes, backtracking is necessary.\"")
+    states = [('START', final.START), ('GAME', final.GAME), ('DIALOGUE', final.DIALOGUE),
+              ('INVENTORY', final.INVENTORY), ('INSTRUCTIONS', final.INSTRUCTIONS), ('GAME_OVER', final.GAME_OVER)]
+    for name, state in states:
+        window.state = state
+        window.current_message = note.model
+
+        def draw():
+            #Nothing changes between frames here, so the frame is marked as needing a redraw
+            window.dirty = True
+            window.on_draw()
+            #Wait for the GPU so the time covers the whole frame
+            gl.glFinish()
+        results['draw_' + name] = summarize(timed(draw, frames))
+    window.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark room setup, updates and drawing.")
+    parser.add_argument('--repeats', type = int, default = 50, help = "how many times to build each room")
+    parser.add_argument('--ticks', type = int, default = 2000, help = "updates per update scenario")
+    parser.add_argument('--frames', type = int, default = 300, help = "frames per draw scenario")
+    parser.add_argument('--draw', action = 'store_true', help = "also time on_draw (needs a display)")
+    args = parser.parse_args()
+
+    report = {'python': platform.python_version(), 'arcade': arcade.version.VERSION, 'results': {}}
+    report['results'].update(bench_construction(args.repeats))
+    report['results'].update(bench_update(args.ticks))
+    if args.draw:
+        report['results'].update(bench_draw(args.frames))
+    else:
+        report['draw_skipped'] = "run with --draw to time on_draw"
+    #Misses after the first setup mean something was decoded mid-game
+    report['textures'] = textures.registry.stats()
+
+    json.dump(report, sys.stdout, indent = 2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
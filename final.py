@@ -6,10 +6,22 @@ Artwork from http://kenney.nl
 If Python and Arcade are installed, this example can be run from the command line with:
 python -m arcade.examples.sprite_rooms
 """
+import argparse
 import math
 import arcade
+import pyglet
 import os
+import struct
 import objects
+import model
+import textures
+import spatial
+import profiler
+import levels
+import roomcache
+import navigation
+import world
+import textcache
 
 #For the dialogue stuff
 TEXT_BOX_HEIGHT = 100
@@ -30,103 +42,409 @@ INVENTORY = 2
 INSTRUCTIONS = 3
 GAME_OVER = 4
 
+#The game logic always runs in steps of TIMESTEP seconds, however fast the screen
+#is drawn. After a slow frame at most MAX_CATCH_UP steps are run to catch up.
+TIMESTEP = 1 / 60
+MAX_CATCH_UP = 5
+#How many times a second the window is drawn while playing, and while nothing
+#moves (dialogue, inventory and menus)
+FRAME_RATE = 60
+IDLE_FRAME_RATE = 20
+
 #Inherent traits of player
 MOVEMENT_SPEED = 5
+#Where the player starts, in the first room
+PLAYER_START = (100, 100)
+
+#Seconds a room stays loaded after the player leaves it
+ROOM_KEEP_TIME = 30.0
+
+#The room past each edge of a room, by room number
+ROOM_EXITS = {0: {'UP': 1}, 1: {'DOWN': 0}}
+#How close to an edge (in pixels) the player gets before the next room starts loading
+PREFETCH_DISTANCE = 4 * SPRITE_SIZE
+
+#Rooms are split into square chunks this many pixels across, and the chunks
+#within STREAM_MARGIN of the screen are kept ready to draw
+CHUNK_SIZE = 16 * SPRITE_SIZE
+STREAM_MARGIN = CHUNK_SIZE
+#Sprites drawn over the floor are filed in a grid of cells this many pixels across,
+#and only the cells on screen are drawn
+CULL_CELL = 4 * SPRITE_SIZE
 
 class Player(arcade.Sprite):
     def __init__(self):
         """creates the character Sprite"""
         #The parent init method
-        super().__init__("Images/CharacterRight.png", SPRITE_SCALING)
-        
-        #Motion variables
-        self.leftMotion = False
-        self.rightMotion = False
-        self.upMotion = False
-        self.downMotion = False
-        self.inventory = Inventory()
-
-        #Directional Facing
-        self.direction = ["UP", "RIGHT"]
-
-        #Interacting Variables
-        self.useObject = False
-        self.canUsePortal = True
+        super().__init__(scale = SPRITE_SCALING)
+        self.texture = textures.load("Images/CharacterRight.png", scale = SPRITE_SCALING)
+
+        #What the player is doing and carrying, which this sprite only shows
+        self.model = model.PlayerState()
+        self.inventory = Inventory(self.model.items)
     
     def update_animation(self):
         """Adding images that show which direction the character is facing"""
-        if self.direction[1] == 'LEFT':
-            self.texture = arcade.load_texture("Images/CharacterRight.png", mirrored = True, scale = SPRITE_SCALING)
-        elif self.direction[1] == 'RIGHT':
-            self.texture = arcade.load_texture("Images/CharacterRight.png", scale = SPRITE_SCALING)
+        if self.model.facing_x < 0:
+            self.texture = textures.load("Images/CharacterRight.png", mirrored = True, scale = SPRITE_SCALING)
+        else:
+            self.texture = textures.load("Images/CharacterRight.png", scale = SPRITE_SCALING)
 
 class Room:
     """
     This class holds all the information about the
     different rooms.
     """
-    def __init__(self, ):
+    #What a snapshot remembers about each object, as bits of one number
+    IN_WALLS = 1
+    IN_OBJECTS = 2
+    ON_FLOOR = 4
+    LOCKED = 8
+    BREAKABLE = 16
+    HAS_ITEM = 32
+    NEW_MESSAGE = 64
+    NEW_IMAGE = 128
+    MIRRORED = 256
+
+    #passwords left, secret items left, number of objects, length of the lever positions that come next
+    SNAPSHOT = struct.Struct('<IIII')
+    THING = struct.Struct('<H')
+    TEXT = struct.Struct('<I')
+
+    def __init__(self, width = SCREEN_WIDTH, height = SCREEN_HEIGHT):
         # You may want many lists. Lists for coins, monsters, etc.
         self.wall_list = None
         self.portal_list = None
         self.object_list = None
         self.door_list = None
-        self.transparent_list = arcade.SpriteList()
+        self.transparent_list = world.CulledList(CULL_CELL)
         self.switch_list = arcade.SpriteList()
         self.password = []
         self.secret_item = None
+
+        # Size of the room in pixels. It can be bigger than the screen.
+        self.width = width
+        self.height = height
+
+        # The floor and plain walls, which never move and get drawn as a few big textures
+        self.static_layer = world.ChunkedLayer(width, height, SPRITE_SCALING, CHUNK_SIZE)
+        # Everything else in wall_list, which can change and is drawn on top of the layer
+        self.prop_list = world.CulledList(CULL_CELL)
+
+        # Which sprites sit on each tile, so lookups only check the tiles near the player
+        self.wall_index = spatial.TileIndex(SPRITE_SIZE)
+        self.portal_index = spatial.TileIndex(SPRITE_SIZE)
+        self.object_index = spatial.TileIndex(SPRITE_SIZE)
+        self.switch_index = spatial.TileIndex(SPRITE_SIZE)
+
+        # Tracks the levers so the password is only checked when one moves
+        self.puzzle = objects.LeverPuzzle()
+
+        # The walking and portal graph of the room, made when first asked for
+        self.nav_graph = None
+
+        # Goes up whenever a wall, portal or object is added or removed, so the
+        # window knows the room looks different
+        self.changes = 0
+
+        # Every object, door, lever and secret item from the level file, in order,
+        # with the message, texture and item each one started with. Snapshots go by this order.
+        self.things = []
+        self.originals = []
+        # The passwords and secret items the room started with, and a snapshot of it before
+        # the player changed anything, so any snapshot can be put back on a room that's in use
+        self.start_password = []
+        self.start_secrets = []
+        self.initial = None
         
         # This holds the background images. If you don't want changing
         # background images, you can delete this part.
         self.background = None
-        
+
+    def addWall(self, sprite, static = False):
+        """Adds a sprite the player collides with. Static walls are baked into the static layer."""
+        self.wall_list.append(sprite)
+        self.wall_index.insert(sprite)
+        self.nav_graph = None
+        self.changes += 1
+        if static:
+            self.static_layer.append(sprite)
+        else:
+            self.prop_list.append(sprite)
+
+    def removeWall(self, sprite):
+        """Removes a sprite the player collides with"""
+        self.wall_list.remove(sprite)
+        self.wall_index.remove(sprite)
+        self.nav_graph = None
+        self.changes += 1
+        if sprite in self.static_layer:
+            self.static_layer.remove(sprite)
+        else:
+            self.prop_list.remove(sprite)
+
+    def addPortal(self, portal):
+        """Adds a portal to the room"""
+        self.portal_list.append(portal)
+        self.portal_index.insert(portal)
+        self.nav_graph = None
+        self.changes += 1
+
+    def addObject(self, sprite):
+        """Adds an object the player can interact with"""
+        self.object_list.append(sprite)
+        self.object_index.insert(sprite)
+        self.changes += 1
+
+    def removeObject(self, sprite):
+        """Removes an object the player can interact with"""
+        self.object_list.remove(sprite)
+        self.object_index.remove(sprite)
+        self.changes += 1
+
+    def addSwitch(self, switch):
+        """Adds a lever to the room"""
+        self.switch_list.append(switch)
+        self.switch_index.insert(switch)
+        self.puzzle.addSwitch(switch)
+
+    def addThing(self, sprite):
+        """Remembers an object from the level file, so its state can be saved in a snapshot"""
+        self.things.append(sprite)
+        if isinstance(sprite, objects.InteractObjects):
+            self.originals.append((sprite.model.message, sprite.texture, sprite.model.item))
+        else:
+            self.originals.append((None, sprite.texture, model.NO_ITEM))
+
+    def navigation(self):
+        """Returns the navigation.NavGraph of the room as it is now. It is only rebuilt after
+        a wall or portal changes. The way out and the way to every object and lever are
+        worked out straight away."""
+        if self.nav_graph is None:
+            graph = navigation.NavGraph.fromRoom(self, SPRITE_SIZE)
+            goals = [graph.exits()]
+            for sprite in list(self.object_list) + list(self.switch_list):
+                goals.append(graph.besideSprite(sprite, SPRITE_SIZE))
+            graph.prepare([goal for goal in goals if goal])
+            self.nav_graph = graph
+        return self.nav_graph
+
+    def passwordsLeft(self):
+        return password_count(self.password)
+
+    def snapshot(self):
+        """Packs up everything the player changed in this room"""
+        #Two bits per lever, so there can be any number of them
+        state = self.puzzle.state
+        levers = state.to_bytes((state.bit_length() + 7) // 8, 'little')
+        data = [self.SNAPSHOT.pack(self.passwordsLeft(), len(self.secret_item), len(self.things), len(levers)), levers]
+        for thing, (message, texture, item) in zip(self.things, self.originals):
+            flags = 0
+            if thing in self.wall_index.placed:
+                flags |= self.IN_WALLS
+            if thing in self.object_index.placed:
+                flags |= self.IN_OBJECTS
+            if thing in self.transparent_list:
+                flags |= self.ON_FLOOR
+
+            texts = []
+            if isinstance(thing, objects.InteractObjects):
+                state = thing.model
+                if state.lock:
+                    flags |= self.LOCKED
+                if state.breakable:
+                    flags |= self.BREAKABLE
+                if state.item != model.NO_ITEM:
+                    flags |= self.HAS_ITEM
+                if state.message != message:
+                    flags |= self.NEW_MESSAGE
+                    texts.append(state.message)
+                if thing.texture is not texture:
+                    path, mirrored = textures.registry.sources[thing.texture.texture_id]
+                    flags |= self.NEW_IMAGE | (self.MIRRORED if mirrored else 0)
+                    texts.append(path)
+
+            data.append(self.THING.pack(flags))
+            for text in texts:
+                text = text.encode('utf-8')
+                data.append(self.TEXT.pack(len(text)) + text)
+        return b''.join(data)
+
+    @classmethod
+    def readSnapshot(cls, snapshot, things, passwords, secrets, levers):
+        """Unpacks a snapshot and checks it fits a room with that many objects, passwords,
+        secret items and levers. Returns (passwords left, secret items left, lever positions,
+        [(flags, new message or None, new image or None) for each object]). Raises ValueError
+        if the snapshot is cut short or made for a different room."""
+        try:
+            passwords_left, secrets_left, count, length = cls.SNAPSHOT.unpack_from(snapshot, 0)
+            if count != things:
+                raise ValueError("the snapshot has {} objects but the room has {}".format(count, things))
+            if passwords_left > passwords or secrets_left > secrets:
+                raise ValueError("the snapshot has more passwords or secret items than the room")
+            offset = cls.SNAPSHOT.size
+            if offset + length > len(snapshot):
+                raise ValueError("the snapshot is cut short")
+            state = int.from_bytes(snapshot[offset:offset + length], 'little')
+            offset += length
+            if state >> (2 * levers):
+                raise ValueError("the snapshot has more levers than the room")
+
+            def readText():
+                nonlocal offset
+                length, = cls.TEXT.unpack_from(snapshot, offset)
+                offset += cls.TEXT.size
+                if offset + length > len(snapshot):
+                    raise ValueError("the snapshot is cut short")
+                text = snapshot[offset:offset + length].decode('utf-8')
+                offset += length
+                return text
+
+            found = []
+            for i in range(count):
+                flags, = cls.THING.unpack_from(snapshot, offset)
+                offset += cls.THING.size
+                if flags >= cls.MIRRORED << 1:
+                    raise ValueError("the snapshot has an object in an unknown state")
+                message = readText() if flags & cls.NEW_MESSAGE else None
+                image = readText() if flags & cls.NEW_IMAGE else None
+                if image is not None and not os.path.isfile(image):
+                    raise ValueError("the snapshot shows an image that isn't there: {}".format(image))
+                found.append((flags, message, image))
+        except struct.error:
+            raise ValueError("the snapshot is cut short")
+        except UnicodeDecodeError:
+            raise ValueError("the snapshot has a message that isn't text")
+        if offset != len(snapshot):
+            raise ValueError("the snapshot is longer than the room needs")
+        return passwords_left, secrets_left, state, found
+
+    def restore(self, snapshot):
+        """Puts the room back the way snapshot says it was. The room can be freshly
+        built or one the player has already changed. A snapshot that doesn't fit
+        the room raises ValueError, before anything is changed."""
+        passwords, secrets, levers, found = self.readSnapshot(snapshot, len(self.things), password_count(self.start_password),
+                                                              len(self.start_secrets), len(self.puzzle.switches))
+
+        if passwords == 0:
+            self.password = []
+        elif type(self.start_password[0]) == list:
+            self.password = [list(password) for password in self.start_password[len(self.start_password) - passwords:]]
+        else:
+            self.password = list(self.start_password)
+        self.secret_item = self.start_secrets[len(self.start_secrets) - secrets:]
+        self.puzzle.restore(levers)
+        self.puzzle.changed = True
+
+        for thing, (message, texture, item), (flags, new_message, image) in zip(self.things, self.originals, found):
+            if flags & self.IN_WALLS and thing not in self.wall_index.placed:
+                self.addWall(thing)
+            elif not flags & self.IN_WALLS and thing in self.wall_index.placed:
+                self.removeWall(thing)
+            if flags & self.IN_OBJECTS and thing not in self.object_index.placed:
+                self.addObject(thing)
+            elif not flags & self.IN_OBJECTS and thing in self.object_index.placed:
+                self.removeObject(thing)
+            if flags & self.ON_FLOOR and thing not in self.transparent_list:
+                self.transparent_list.append(thing)
+            elif not flags & self.ON_FLOOR and thing in self.transparent_list:
+                self.transparent_list.remove(thing)
+
+            if isinstance(thing, objects.InteractObjects):
+                state = thing.model
+                state.lock = bool(flags & self.LOCKED)
+                state.breakable = bool(flags & self.BREAKABLE)
+                state.item = item if flags & self.HAS_ITEM else model.NO_ITEM
+                state.message = message if new_message is None else new_message
+                if image is not None:
+                    thing.texture = textures.load(image, mirrored = bool(flags & self.MIRRORED), scale = thing.scaling)
+                else:
+                    thing.texture = texture
+
+    def prepare(self, entrance = None):
+        """Does the CPU work of drawing the room for the first time, so it can happen ahead of time.
+        entrance is (edge, x or y) where the player will come in, and then only the chunks
+        around that spot are done. Otherwise the whole room is."""
+        if entrance is None:
+            self.static_layer.compose()
+            return
+        edge, along = entrance
+        if edge == 'DOWN':
+            view = (along - SCREEN_WIDTH, along + SCREEN_WIDTH, 0, SCREEN_HEIGHT)
+        elif edge == 'UP':
+            view = (along - SCREEN_WIDTH, along + SCREEN_WIDTH, self.height - SCREEN_HEIGHT, self.height)
+        elif edge == 'LEFT':
+            view = (0, SCREEN_WIDTH, along - SCREEN_HEIGHT, along + SCREEN_HEIGHT)
+        else:
+            view = (self.width - SCREEN_WIDTH, self.width, along - SCREEN_HEIGHT, along + SCREEN_HEIGHT)
+        self.static_layer.compose(view)
+
+    def release(self):
+        """Frees what the room holds on the graphics card once it's no longer used"""
+        self.static_layer.release()
+
+    def facing(self, index, player):
+        """Returns the sprites in index on the tiles the player is facing and standing against"""
+        found = []
+        for tile in objects.facingTiles(player, SPRITE_SIZE):
+            for sprite in index.atTile(*tile):
+                if sprite not in found:
+                    found.append(sprite)
+        return found
+
 
 class Inventory:
     """Holds all the information about the player's inventory"""
-    def __init__(self, screen_width = SCREEN_WIDTH, center_height = SCREEN_HEIGHT - (TEXT_BOX_HEIGHT // 4), inv_height = TEXT_BOX_HEIGHT // 2):
+    #Where each item slot is drawn in the inventory bar
+    item_locations = [150, 200, 250, 300, 350, 400, 450]
+
+    #The image shown for each kind of item
+    item_images = {model.KEY: 'Images/key.png', model.CROWBAR: 'Images/crowbar.png', model.BROKEN_LEVER: 'Images/lever_handle.png'}
+
+    def __init__(self, items = None, screen_width = SCREEN_WIDTH, center_height = SCREEN_HEIGHT - (TEXT_BOX_HEIGHT // 4), inv_height = TEXT_BOX_HEIGHT // 2):
+        #One sprite per held item, in the same order as items
         self.item_sprites = arcade.SpriteList()
         self.screen_width = screen_width
         self.inv_height = inv_height
         self.center_height = center_height
-        self.item_list = [] #starts with key for now for debugging
-
-    def storeSprites(self):
-        """Stores each item in the player's inventory as a sprite in item_sprites"""
-        item_locations = [150, 200, 250, 300, 350, 400, 450]
-        location = 0
-        for item in self.item_list:
-            if item == 'KEY':
-                key = arcade.Sprite('Images/key.png', SPRITE_SCALING)
-                key.left = item_locations[location]
-                key.bottom = self.center_height - 20
-                location += 1
-                self.item_sprites.append(key)
-            elif item == 'CROWBAR':
-                crowbar = arcade.Sprite('Images/crowbar.png', SPRITE_SCALING)
-                crowbar.left = item_locations[location]
-                crowbar.bottom = self.center_height - 20
-                location += 1
-                self.item_sprites.append(crowbar)
-            elif item == 'BROKEN_LEVER':
-                lever = arcade.Sprite('Images/lever_handle.png', SPRITE_SCALING)
-                lever.left = item_locations[location]
-                lever.bottom = self.center_height - 20
-                location += 1
-                self.item_sprites.append(lever)
-    
+        #The kinds of item held (model.KEY, ...). This is the player's model.PlayerState.items.
+        self.items = bytearray() if items is None else items
+
+    def placeSprite(self, index):
+        """Moves the sprite of the item at index into its slot"""
+        item_sprite = self.item_sprites[index]
+        item_sprite.left = self.item_locations[index]
+        item_sprite.bottom = self.center_height - 20
+
+    def addItem(self, item):
+        """Adds an item to the inventory and gives it the next free slot"""
+        self.items.append(item)
+        self.item_sprites.append(textures.sprite(self.item_images[item], SPRITE_SCALING))
+        self.placeSprite(len(self.items) - 1)
+
+    def setItems(self, items):
+        """Swaps everything held for items, like when a save is loaded"""
+        del self.items[:]
+        self.item_sprites = arcade.SpriteList()
+        for item in items:
+            self.addItem(item)
+
     def useItem(self, item):
         """Uses up an item and removes from inventory"""
-        self.item_list.remove(item)
-        self.item_sprites = arcade.SpriteList()
-        self.storeSprites()
+        index = self.items.index(item)
+        del self.items[index]
+        self.item_sprites.remove(self.item_sprites[index])
+
+        #Slide the items after it over so the slots stay packed
+        for i in range(index, len(self.items)):
+            self.placeSprite(i)
 
     def showInventory(self):
         """Draws the inventory and all its current components."""
         arcade.draw_rectangle_filled(self.screen_width//2, self.center_height, self.screen_width, self.inv_height, arcade.color.EGGPLANT)
-        arcade.draw_text('INVENTORY:', 20, self.center_height - 8, arcade.color.BLACK, 18)
-        self.storeSprites()
+        textcache.cache.draw('INVENTORY:', 20, self.center_height - 8, arcade.color.BLACK, 18)
         self.item_sprites.draw()
-        
+
 
 
 class Portal(arcade.Sprite):
@@ -136,311 +454,163 @@ class Portal(arcade.Sprite):
     """
     
     def __init__(self):
-        super().__init__("Images/blue_portal.png", SPRITE_SCALING)
+        super().__init__(scale = SPRITE_SCALING)
+        self.texture = textures.load("Images/blue_portal.png", scale = SPRITE_SCALING)
         self.start_x = 0
         self.start_y = 0
         self.end_x = 0
         self.end_y = 0
 
-def setup_room_1():
+def password_count(password):
+    """How many passwords a room's password list holds: it is one password, or a list of them"""
+    if password != [] and type(password[0]) == list:
+        return len(password)
+    return 1 if password != [] else 0
+
+
+def snapshot_limits(level):
+    """Returns (objects, passwords, secret items, levers) of the room a level builds, which
+    Room.readSnapshot checks snapshots against without building the room"""
+    levers = sum(1 for kind, image, x, y, options in level['objects'] if kind == 'switch')
+    return (len(level['objects']) + len(level['secrets']), password_count(level['password']),
+            len(level['secrets']), levers)
+
+
+def makeObject(kind, image, x, y, options):
+    """Makes an object, door or lever from a level file and puts it on its tile"""
+    if kind == 'switch':
+        sprite = objects.Switch(SPRITE_SCALING, **options)
+    else:
+        sprite = objects.InteractObjects(image, SPRITE_SCALING, **options)
+    sprite.left = x * SPRITE_SIZE
+    sprite.bottom = y * SPRITE_SIZE
+    return sprite
+
+
+def build_room(level):
     """
-    Create and return room 1.
-    If your program gets large, you may want to separate this into different
-    files.
+    Create and return a room from a level loaded by levels.load.
     """
-    room = Room()
+    width, height = level['size']
+    room = Room(width * SPRITE_SIZE, height * SPRITE_SIZE)
 
     """ Set up the game and initialize the variables. """
     # Sprite lists
     room.wall_list = arcade.SpriteList()
-    room.portal_list = arcade.SpriteList()
+    room.portal_list = world.CulledList(CULL_CELL)
     room.object_list = arcade.SpriteList()
-    room.door_list = arcade.SpriteList()
-    room.password = [['NEUTRAL', 'LEFT', 'LEFT', 'RIGHT', 'BROKEN'], ['RIGHT', 'LEFT', 'RIGHT', 'LEFT', 'NEUTRAL']]
+    room.door_list = world.CulledList(CULL_CELL)
+    #The room changes its password as it gets solved, so it gets its own copy
+    room.password = [list(password) if type(password) == list else password for password in level['password']]
+    room.start_password = level['password']
 
-    
     # Draw background
-    for x in range(0, SCREEN_WIDTH, SPRITE_SIZE):
-        for y in range(0, SCREEN_HEIGHT, SPRITE_SIZE):
-            floor = arcade.Sprite("Images/RogueSprites/floor.png", SPRITE_SCALING)
-            floor.left = x
-            floor.bottom = y
-            room.transparent_list.append(floor)
+    if level['floor'] is not None:
+        for x in range(width):
+            for y in range(height):
+                floor = textures.sprite(level['floor'], SPRITE_SCALING)
+                floor.left = x * SPRITE_SIZE
+                floor.bottom = y * SPRITE_SIZE
+                room.static_layer.append(floor)
 
     # -- Set up the walls
-    # Create bottom and top row of walls
-    # This y loops a list of two, the coordinate 0, and just under the top of window
-    for y in (0, SCREEN_HEIGHT - SPRITE_SIZE):
-        # Loop for each box going across
-        for x in range(0, SCREEN_WIDTH, SPRITE_SIZE):
-            if (x != SCREEN_WIDTH - 6 * SPRITE_SIZE) or (y != SCREEN_HEIGHT - SPRITE_SIZE):
-                wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-                wall.left = x
-                wall.bottom = y
-                room.wall_list.append(wall)
-
-    # Create walls of holding cell
-    for x in range(0, 6 * SPRITE_SIZE, SPRITE_SIZE):
-        wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-        wall.left = x
-        wall.bottom = 6 * SPRITE_SIZE
-        room.wall_list.append(wall)
-    for y in range(0, 6 * SPRITE_SIZE, SPRITE_SIZE):
-        if (y != SPRITE_SIZE * 3):
-            wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-            wall.left = 5 * SPRITE_SIZE
-            wall.bottom = y
-            room.wall_list.append(wall)        
-
-    # Create walls of first room
-    for x in range(0, 11 * SPRITE_SIZE, SPRITE_SIZE):
-        wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-        wall.left = x
-        wall.bottom = 8 * SPRITE_SIZE
-        room.wall_list.append(wall)
-    for y in range(0, 8 * SPRITE_SIZE, SPRITE_SIZE):
-        if (y != SPRITE_SIZE * 3):
-            wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-            wall.left = 10 * SPRITE_SIZE
-            wall.bottom = y
-            room.wall_list.append(wall)   
-
-    # Create middle dividing wall
-    for y in range(0, SCREEN_HEIGHT, SPRITE_SIZE):
-        if (y != SPRITE_SIZE * 5):
-            wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-            wall.left = 14 * SPRITE_SIZE
-            wall.bottom = y
-            room.wall_list.append(wall)         
-
-    # Create left and right column of walls
-    for x in (0, SCREEN_WIDTH - SPRITE_SIZE):
-        # Loop for each wall going across
-        for y in range(SPRITE_SIZE, SCREEN_HEIGHT - SPRITE_SIZE, SPRITE_SIZE):
-            wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-            wall.left = x
-            wall.bottom = y
-            room.wall_list.append(wall)
-
-    # Create maze walls
-    xList = [1,2,2,2,2,2,2,2,3,3,3,3,3,4,4,4,4,4,4,4,4,4,5,5,5,5,5,6,6,6,6,6,6,6,7,7,7,7,7,7,7,7,8,8,8,8,9,9,9,9,9,9,9,10,10,10,10,10,10,10,10,10,11,11,11,11,11,12,12,12,12,12,12,12,12,13,13,13,13,13,13,14,14]
-    yList = [12,1,4,6,7,8,9,10,3,4,8,11,12,1,2,3,5,6,8,10,12,13,3,8,9,13,14,4,5,6,7,8,12,13,2,3,4,5,8,9,10,12,2,5,6,11,2,5,8,9,10,11,14,2,3,5,6,8,9,10,12,13,1,4,6,10,13,1,3,4,6,7,8,9,11,2,6,8,11,13,14,4,10]
-    for i in range(len(xList)):
-        wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-        wall.left = (xList[i] + 14) * SPRITE_SIZE
-        wall.bottom = yList[i] * SPRITE_SIZE
-        room.wall_list.append(wall)
-
-    # If you want coins or monsters in a level, then add that code here.
+    for x, y in level['walls']:
+        wall = textures.sprite(level['wall'], SPRITE_SCALING)
+        wall.left = x * SPRITE_SIZE
+        wall.bottom = y * SPRITE_SIZE
+        room.addWall(wall, static = True)
+
     # Make portals
-    start_xList = [3,3,4,4,4,6,6,7,8,8,9,9,10,11,11,11,12,13,13,14]
-    start_yList = [1,10,4,11,14,3,9,1,3,10,7,12,4,3,5,9,10,3,7,14]
-    end_xList = [6,11,6,9,8,4,3,9,4,10,4,7,8,12,3,13,11,11,14,13]
-    end_yList = [9,5,3,7,3,4,1,12,14,4,11,1,10,10,10,3,3,9,14,7]
-    for i in range(len(start_xList)):
+    for start_x, start_y, end_x, end_y in level['portals']:
         portal = Portal()
-        portal.start_x = (start_xList[i] + 14) * SPRITE_SIZE
-        portal.start_y = start_yList[i] * SPRITE_SIZE
-        portal.end_x = (end_xList[i] + 14) * SPRITE_SIZE
-        portal.end_y = end_yList[i] * SPRITE_SIZE
+        portal.start_x = start_x * SPRITE_SIZE
+        portal.start_y = start_y * SPRITE_SIZE
+        portal.end_x = end_x * SPRITE_SIZE
+        portal.end_y = end_y * SPRITE_SIZE
         portal.left = portal.start_x
         portal.bottom = portal.start_y
-        room.portal_list.append(portal)
-
-    # Adding interactable objects
-    #box = objects.InteractObjects("Images/Sign.png", SPRITE_SCALING, "A boring, brown, container... Oh, never mind. It has a key.", otherMessage = "Yup, just a boring, brown, container...", hasItem = 'KEY')
-    #box.left = 2 * SPRITE_SIZE
-    #box.bottom = 13 * SPRITE_SIZE
-    # Adding this object to the wall_list so that it can be drawn and have collision
-    #room.wall_list.append(box)
-    #room.object_list.append(box)
-
-    # Same as the above
-    #box2 = objects.InteractObjects("Images/Sign.png", SPRITE_SCALING, "Another daft box. ")
-    #box2.left = 4 * SPRITE_SIZE
-    #box2.bottom = 13 * SPRITE_SIZE
-    #room.wall_list.append(box2)
-    #room.object_list.append(box2)
-
-    # Crates
-    crate1 = objects.InteractObjects("Images/barrel.png", SPRITE_SCALING, "A moldy wooden crate. ", breakable=True, hasItem = 'KEY')
-    crate1.left = 3 * SPRITE_SIZE
-    crate1.bottom = 5 * SPRITE_SIZE
-    room.wall_list.append(crate1)
-    room.object_list.append(crate1)
-
-    # Creating starting note
-    note1 = objects.InteractObjects("Images/note.png", SPRITE_SCALING, "\"Sometimes, backtracking is necessary.\"")
-    note1.left = 4 * SPRITE_SIZE
-    note1.bottom = 1 * SPRITE_SIZE
-    room.object_list.append(note1)
-    #room.transparent_list.append(note1)
-    room.wall_list.append(note1)
-
-    note2 = objects.InteractObjects("Images/note.png", SPRITE_SCALING, "\"Two hooded figures bow to a monument in the west, while the third one flees.\"")
-    note2.left = 5 * SPRITE_SIZE
-    note2.bottom = 13 * SPRITE_SIZE
-    room.object_list.append(note2)
-    room.wall_list.append(note2)
-
-    note3 = objects.InteractObjects("Images/note.png", SPRITE_SCALING, '\"Two couples whisper to each other, while the lonely man stands tall, trying to eavesdrop.\"')
-    note3.left = 7 * SPRITE_SIZE
-    note3.bottom = 1 * SPRITE_SIZE
-    room.object_list.append(note3)
-    room.wall_list.append(note3)
-
-    note4 = objects.InteractObjects("Images/note.png", SPRITE_SCALING, '\"Jason, make sure you fix the lever before waking the prisoner. There should be a spare part in the maze. -Nick\"')
-    note4.left = 9 * SPRITE_SIZE
-    note4.bottom = 6 * SPRITE_SIZE
-    room.object_list.append(note4)
-    room.wall_list.append(note4)
-
-    # Creating doors:
-    door1 = objects.InteractObjects("Images/LockDoor.png", SPRITE_SCALING, "A locked door. I'll need to get a key.", lock = True, door = True)
-    door1.left = 14*SPRITE_SIZE
-    door1.bottom = 5*SPRITE_SIZE
-    room.wall_list.append(door1)
-    room.door_list.append(door1)
-    room.object_list.append(door1)
-
-    door2 = objects.InteractObjects("Images/LockDoor.png", SPRITE_SCALING, "A locked door. I'll need to get a key.", lock = True, door = True)
-    door2.left = 5*SPRITE_SIZE
-    door2.bottom = 3*SPRITE_SIZE
-    room.wall_list.append(door2)
-    room.door_list.append(door2)
-    room.object_list.append(door2)
-
-    door3 = objects.InteractObjects("Images/LockDoor.png", SPRITE_SCALING, "A locked door. I'll need to get a key.", lock = True, door = True)
-    door3.left = 10*SPRITE_SIZE
-    door3.bottom = 3*SPRITE_SIZE
-    room.wall_list.append(door3)
-    room.door_list.append(door3)
-    room.object_list.append(door3)
-
-    doorfinal = objects.InteractObjects("Images/LockDoor.png", SPRITE_SCALING, "A locked door. I'll need to get a key.", lock = True, door = True)
-    doorfinal.left = 24*SPRITE_SIZE
-    doorfinal.bottom = 15*SPRITE_SIZE
-    room.wall_list.append(doorfinal)
-    room.door_list.append(doorfinal)
-    room.object_list.append(doorfinal)
-
-    # Furniture/Items
-    bed = objects.InteractObjects("Images/bed.png", SPRITE_SCALING, "A filthy bed... Looks like there's a key hidden beneath the blanket.", otherMessage="A filthy bed.", hasItem = 'KEY')
-    bed.left = 1 * SPRITE_SIZE
-    bed.bottom = 1 * SPRITE_SIZE
-    room.wall_list.append(bed)
-    room.object_list.append(bed)
-
-    crowbar = objects.InteractObjects("Images/crowbar.png", SPRITE_SCALING, "A brittle, rusty crowbar.", hasItem = 'CROWBAR')
-    crowbar.left = 2 * SPRITE_SIZE
-    crowbar.bottom = 7 * SPRITE_SIZE
-    room.wall_list.append(crowbar)
-    room.object_list.append(crowbar)
-
-
-    #Switches
-    switch1 = objects.Switch(SPRITE_SCALING)
-    switch1.left = 2 * SPRITE_SIZE
-    switch1.bottom = 11 * SPRITE_SIZE
-    room.wall_list.append(switch1)
-    room.switch_list.append(switch1)
-
-    broken_lever = objects.InteractObjects('Images/lever_handle.png', SPRITE_SCALING, "A lever handle.", hasItem = 'BROKEN_LEVER')
-    broken_lever.left = 18 * SPRITE_SIZE
-    broken_lever.bottom = 9 * SPRITE_SIZE
-    room.wall_list.append(broken_lever)
-    room.object_list.append(broken_lever)
-    
-    switch2 = objects.Switch(SPRITE_SCALING)
-    switch2.left = 4 * SPRITE_SIZE
-    switch2.bottom = 11 * SPRITE_SIZE
-    room.wall_list.append(switch2)
-    room.switch_list.append(switch2)
-
-    switch3 = objects.Switch(SPRITE_SCALING)
-    switch3.left = 6 * SPRITE_SIZE
-    switch3.bottom = 11 * SPRITE_SIZE
-    room.wall_list.append(switch3)
-    room.switch_list.append(switch3)
-
-    switch4 = objects.Switch(SPRITE_SCALING)
-    switch4.left = 8 * SPRITE_SIZE
-    switch4.bottom = 11 * SPRITE_SIZE
-    room.wall_list.append(switch4)
-    room.switch_list.append(switch4)
-
-    switch5 = objects.Switch(SPRITE_SCALING, orientation = 'BROKEN')
-    switch5.left = 6 * SPRITE_SIZE
-    switch5.bottom = 1 * SPRITE_SIZE
-    room.wall_list.append(switch5)
-    room.switch_list.append(switch5)
-
-    #The key that comes from these switches
-    room.secret_item = []
-    key1 = objects.InteractObjects("Images/key.png", SPRITE_SCALING, "You picked up the key.", hasItem = 'KEY', disappears= True)
-    key1.left = 11 * SPRITE_SIZE
-    key1.bottom = 13 * SPRITE_SIZE
-
-    key2 = objects.InteractObjects("Images/key.png", SPRITE_SCALING, "You picked up the key.", hasItem = 'KEY', disappears= True)
-    key2.left = 26 * SPRITE_SIZE
-    key2.bottom = 2 * SPRITE_SIZE
-    
-    room.secret_item.append(key1)
-    room.secret_item.append(key2)
-    
+        room.addPortal(portal)
+
+    # Adding interactable objects, doors and levers. They all have collision.
+    for kind, image, x, y, options in level['objects']:
+        sprite = makeObject(kind, image, x, y, options)
+        room.addThing(sprite)
+        room.addWall(sprite)
+        if kind == 'switch':
+            room.addSwitch(sprite)
+        else:
+            if kind == 'door':
+                room.door_list.append(sprite)
+            room.addObject(sprite)
+
+    #The items that appear once the password is solved
+    room.secret_item = [makeObject(*secret) for secret in level['secrets']]
+    room.start_secrets = list(room.secret_item)
+    for secret in room.secret_item:
+        room.addThing(secret)
 
     # Load the background image for this level.
-    room.background = arcade.load_texture("Images/floor1.jpg")
+    if level['background'] is not None:
+        room.background = textures.load(level['background'])
 
+    room.initial = room.snapshot()
     return room
 
 
-def setup_room_2():
+#The level file of each room, by room number
+LEVELS = ["Levels/room1.json", "Levels/room2.json"]
+
+
+def setup_room_1():
     """
-    Create and return room 2.
+    Create and return room 1.
     """
-    room = Room()
+    return build_room(levels.load(LEVELS[0]))
 
-    """ Set up the game and initialize the variables. """
-    # Sprite lists
-    room.wall_list = arcade.SpriteList()
-    room.portal_list = arcade.SpriteList()
-    room.object_list = arcade.SpriteList()
-    room.door_list = arcade.SpriteList()
 
-    # -- Set up the walls
-    # Create bottom and top row of boxes
-    # This y loops a list of two, the coordinate 0, and just under the top of window
-    for y in (0, SCREEN_HEIGHT - SPRITE_SIZE):
-        # Loop for each box going across
-        for x in range(0, SCREEN_WIDTH, SPRITE_SIZE):
-            if x != SCREEN_WIDTH - 6 * SPRITE_SIZE or y != 0:
-                wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-                wall.left = x
-                wall.bottom = y
-                room.wall_list.append(wall)
-
-    # Create left and right column of boxes
-    for x in (0, SCREEN_WIDTH - SPRITE_SIZE):
-        # Loop for each box going across
-        for y in range(SPRITE_SIZE, SCREEN_HEIGHT - SPRITE_SIZE, SPRITE_SIZE):
-            wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-            wall.left = x
-            wall.bottom = y
-            room.wall_list.append(wall)
-
-    wall = arcade.Sprite("Images/RogueSprites/block1.png", SPRITE_SCALING)
-    wall.left = 5 * SPRITE_SIZE
-    wall.bottom = 5 * SPRITE_SIZE
-    room.wall_list.append(wall)
-
-
-
-    #Setting the background of the room
-    room.background = arcade.load_texture("Images/floor1.jpg")
+def setup_room_2():
+    """
+    Create and return room 2.
+    """
+    return build_room(levels.load(LEVELS[1]))
+
+
+#Builds each room, by room number. Extend the pattern for each room.
+ROOM_BUILDERS = [setup_room_1, setup_room_2]
+
+#Textures the game shows whatever is in the levels, as (image, mirrored, scale): the
+#player both ways, portals, opened doors and smashed crates, and the screens
+TEXTURES = [("Images/CharacterRight.png", False, SPRITE_SCALING), ("Images/CharacterRight.png", True, SPRITE_SCALING),
+            ("Images/blue_portal.png", False, SPRITE_SCALING),
+            ("Images/OpenDoor.png", True, SPRITE_SCALING), ("Images/broken_scraps.png", True, SPRITE_SCALING),
+            ("Images/minecraft.jpg", False, 1), ("Images/tutorial.jpg", False, 1), ("Images/WinScreen.png", False, 1)]
+
+
+def level_textures(level):
+    """Returns every texture build_room asks for when it builds a level, as (image, mirrored, scale)"""
+    found = []
+    for image in (level['floor'], level['wall']):
+        if image is not None:
+            found.append((image, False, SPRITE_SCALING))
+    for kind, image, x, y, options in level['objects'] + level['secrets']:
+        if kind == 'switch':
+            #A lever can be turned any way once it's built
+            found.extend((path, False, SPRITE_SCALING) for path in objects.Switch.images)
+        else:
+            found.append((image, False, SPRITE_SCALING))
+    if level['background'] is not None:
+        found.append((level['background'], False, 1))
+    return found
 
-    return room
 
+def all_textures():
+    """Returns every texture the game can show: the ones above, the items and levers, and the ones
+    the levels need. Preloading these means building a room never has to load a texture."""
+    found = TEXTURES + [(path, False, SPRITE_SCALING) for path in Inventory.item_images.values()]
+    found += [(path, False, SPRITE_SCALING) for path in objects.Switch.images]
+    for path in LEVELS:
+        found += level_textures(levels.load(path))
+    return sorted(set(found))
 
 
 class TextButton:
@@ -509,10 +679,10 @@ class TextButton:
             x -= self.button_height
             y += self.button_height
 
-        arcade.draw_text(self.text, x, y,
-                         arcade.color.BLACK, font_size=self.font_size,
-                         width=self.width, align="center",
-                         anchor_x="center", anchor_y="center")
+        textcache.cache.draw(self.text, x, y,
+                             arcade.color.BLACK, font_size=self.font_size,
+                             width=self.width, align="center",
+                             anchor_x="center", anchor_y="center")
 
     def on_press(self):
         self.pressed = True
@@ -554,15 +724,16 @@ class StartTextButton(TextButton):
 
 
 
-class MyGame(arcade.Window):
-    """ Main application class. """
+class Game:
+    """
+    All of the game's state and logic. MyGame shows it in a window, and
+    headless.HeadlessGame runs it without one.
+    """
     
-    def __init__(self, width, height):
+    def __init__(self):
         """
         Initializer
         """
-        super().__init__(width, height)
-
         # Set the working directory (where we expect to find files) to the same
         # directory this .py file is in. You can leave this out of your own
         # code, but it is needed to easily run the examples using "python -m"
@@ -574,29 +745,71 @@ class MyGame(arcade.Window):
         # Sprite lists
         self.current_room = 0
 
+        # Whether the screen has to be drawn again. Input, state changes and the
+        # window being uncovered set it; movement is caught by comparing scenes.
+        self.dirty = True
+        # What the last drawn frame showed, and how many frames were skipped since nothing changed
+        self.drawn_scene = None
+        self.skipped_frames = 0
+
         #Setting the state of the game
+        self._state = None
         self.state = GAME
 
-        #The object that has a message with it
+        #The model.Thing whose message is in the dialogue box
         self.current_message = None
 
         # Set up the player
         self.rooms = None
         self.score = 0
         self.player_sprite = None
+        # What the player is doing and carrying (a model.PlayerState), which player_sprite shows
+        self.player = None
         self.player_list = None
         self.physics_engine = None
         self.useObject = None
         self.total_time = 0.0
         self.onCrate = False
 
+        # How many updates have run, and an optional replay.InputRecorder that logs input
+        self.ticks = 0
+        self.recorder = None
+
+        # Time not yet simulated, how far the screen is between the last two steps,
+        # and where the player was before the last step
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.previous = None
+
+        # Times the phases of update and on_draw, turned on by BILL_PROFILE or F3
+        self.profiler = profiler.FrameProfiler.fromEnvironment()
+
+        # The part of the room on screen, which follows the player around big rooms
+        self.camera = world.Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+        # How many sprites were off screen and not drawn last frame
+        self.culled = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if state != self._state:
+            self.dirty = True
+        self._state = state
+
     def setup(self):
         """ Set up the game and initialize the variables. """
+        # Decode every texture the game can show up front, so nothing is loaded from disk
+        # mid-frame, and rooms can be built on another thread
+        textures.registry.preload(all_textures())
+
         # Set up the player
         self.score = 0
         self.player_sprite = Player()
-        self.player_sprite.center_x = 100
-        self.player_sprite.center_y = 100
+        self.player_sprite.center_x, self.player_sprite.center_y = PLAYER_START
+        self.player = self.player_sprite.model
         self.player_list = arcade.SpriteList()
         self.player_list.append(self.player_sprite)
 
@@ -615,21 +828,17 @@ class MyGame(arcade.Window):
 
         back_to_menu = StartTextButton(600, 75, 100, 'Return', self.show_start)
         self.button_list_howTo.append(back_to_menu)
-        # Our list of rooms
-        self.rooms = []
 
-        # Create the rooms. Extend the pattern for each room.
-        room = setup_room_1()
-        self.rooms.append(room)
-
-        room = setup_room_2()
-        self.rooms.append(room)
+        # The text of the instructions screen
+        self.instructions_text = self.make_instructions_text()
+        # Our list of rooms. Each room is only built once the player goes into it.
+        self.rooms = roomcache.RoomCache(ROOM_BUILDERS, ROOM_KEEP_TIME)
 
         # Our starting room number
         self.current_room = 0
 
-        # Create a physics engine for this room
-        self.physics_engine = arcade.PhysicsEngineSimple(self.player_sprite, self.rooms[self.current_room].wall_list)
+        # Create the physics engine. It stays the same for every room.
+        self.physics_engine = spatial.TilePhysicsEngine(self.player_sprite, self.rooms[self.current_room].wall_index)
 
     def start_game(self):
         """
@@ -653,7 +862,7 @@ class MyGame(arcade.Window):
         """
         Draw the start menu
         """
-        arcade.draw_texture_rectangle(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, SCREEN_WIDTH, SCREEN_HEIGHT, arcade.load_texture("Images/minecraft.jpg"))
+        arcade.draw_texture_rectangle(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, SCREEN_WIDTH, SCREEN_HEIGHT, textures.load("Images/minecraft.jpg"))
 
         for button in self.button_list_start:
             button.draw()
@@ -665,69 +874,94 @@ class MyGame(arcade.Window):
 
 
         # background
-        arcade.draw_texture_rectangle(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, SCREEN_WIDTH, SCREEN_HEIGHT, arcade.load_texture("Images/tutorial.jpg"))
-
-        arcade.draw_text("PREMISE:", SCREEN_WIDTH // 2, 550,
-                        arcade.color.WHITE, font_size=40,
-                        width=1000, align="center",
-                        anchor_x="center", anchor_y="center")
-        arcade.draw_text("You play Bill, a confused Mudd student who wakes up in a dungeon.", SCREEN_WIDTH // 2, 500,
-                        arcade.color.WHITE, font_size=20,
-                        width=1000, align="center",
-                        anchor_x="center", anchor_y="center")
-        arcade.draw_text("Can you solve all the puzzles and escape?", SCREEN_WIDTH // 2, 450,
-                        arcade.color.WHITE, font_size=20,
-                        width=1000, align="center",
-                        anchor_x="center", anchor_y="center")
-
-        arcade.draw_text("INSTRUCTIONS", SCREEN_WIDTH // 2, 400,
-                         arcade.color.WHITE, font_size=40,
-                         width=1000, align="center",
-                         anchor_x="center", anchor_y="center")
-        arcade.draw_text("Use the arrow keys to move", SCREEN_WIDTH // 2, 350,
-                         arcade.color.WHITE, font_size=20,
-                         width=1000, align="center",
-                         anchor_x="center", anchor_y="center")
-        arcade.draw_text("Press \"Z\" to interact with objects while facing them", SCREEN_WIDTH // 2, 300,
-                         arcade.color.WHITE, font_size=20,
-                         width=1000, align="center",
-                         anchor_x="center", anchor_y="center")
-        arcade.draw_text("Press \"C\" to show the inventory", SCREEN_WIDTH // 2, 250,
-                         arcade.color.WHITE, font_size=20,
-                         width=1000, align="center",
-                         anchor_x="center", anchor_y="center")
+        arcade.draw_texture_rectangle(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, SCREEN_WIDTH, SCREEN_HEIGHT, textures.load("Images/tutorial.jpg"))
+
+        # The text never changes, so it is laid out once and drawn in one go
+        self.instructions_text.draw()
 
 
         for button in self.button_list_howTo:
             button.draw()
 
+    def make_instructions_text(self):
+        """
+        Lay out the text of the instructions menu
+        """
+        text = textcache.TextBatch()
+        text.add("PREMISE:", SCREEN_WIDTH // 2, 550,
+                 arcade.color.WHITE, font_size=40,
+                 width=1000, align="center",
+                 anchor_x="center", anchor_y="center")
+        text.add("You play Bill, a confused Mudd student who wakes up in a dungeon.", SCREEN_WIDTH // 2, 500,
+                 arcade.color.WHITE, font_size=20,
+                 width=1000, align="center",
+                 anchor_x="center", anchor_y="center")
+        text.add("Can you solve all the puzzles and escape?", SCREEN_WIDTH // 2, 450,
+                 arcade.color.WHITE, font_size=20,
+                 width=1000, align="center",
+                 anchor_x="center", anchor_y="center")
+        text.add("INSTRUCTIONS", SCREEN_WIDTH // 2, 400,
+                 arcade.color.WHITE, font_size=40,
+                 width=1000, align="center",
+                 anchor_x="center", anchor_y="center")
+        text.add("Use the arrow keys to move", SCREEN_WIDTH // 2, 350,
+                 arcade.color.WHITE, font_size=20,
+                 width=1000, align="center",
+                 anchor_x="center", anchor_y="center")
+        text.add("Press \"Z\" to interact with objects while facing them", SCREEN_WIDTH // 2, 300,
+                 arcade.color.WHITE, font_size=20,
+                 width=1000, align="center",
+                 anchor_x="center", anchor_y="center")
+        text.add("Press \"C\" to show the inventory", SCREEN_WIDTH // 2, 250,
+                 arcade.color.WHITE, font_size=20,
+                 width=1000, align="center",
+                 anchor_x="center", anchor_y="center")
+        return text
+
     def draw_game(self):
         """
         Render the screen.
         """
+        room = self.rooms[self.current_room]
+        view = self.camera.view()
+
+        # Everything in the room is drawn where the camera is looking
+        self.camera.apply()
 
-        # Draw the background texture
+        # Draw the floor and walls, which are baked into a texture per chunk
+        with self.profiler.phase('floor/walls'):
+            room.static_layer.draw(view)
 
-        self.rooms[self.current_room].transparent_list.draw()
+            # Draw things lying on the floor, like smashed crates
+            culled = room.transparent_list.draw(view)
 
         #arcade.draw_texture_rectangle(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2,
         #                              SCREEN_WIDTH, SCREEN_HEIGHT, self.rooms[self.current_room].background)
 
 
-        # Draw all the walls in this room
-        self.rooms[self.current_room].wall_list.draw()
+        # Draw all the objects in this room the player can bump into
+        with self.profiler.phase('props'):
+            culled += room.prop_list.draw(view)
 
         # If you have coins or monsters, then copy and modify the line
         # above for each list.
-        self.rooms[self.current_room].portal_list.draw()
+        with self.profiler.phase('portals'):
+            culled += room.portal_list.draw(view)
 
 
-        #Draws all player sprites
-        self.player_list.draw()
+        #Draws all player sprites. The camera follows the player, so it is always on screen.
+        with self.profiler.phase('player'):
+            self.player_list.draw()
 
 
+        with self.profiler.phase('doors'):
+            culled += room.door_list.draw(view)
 
-        self.rooms[self.current_room].door_list.draw()
+        self.culled = culled
+        self.profiler.count('culled', culled)
+
+        # The dialogue box, inventory and profiler are drawn on the screen, not in the room
+        self.camera.reset()
 
     def draw_dialogue(self):
         """Draws the dialogue over the screen"""
@@ -735,88 +969,139 @@ class MyGame(arcade.Window):
         """Delivers the object's message when interacted with"""
 
         message = self.current_message.message
-        # displays a rectangle of a certain color at the bottom of the screen.
-        #arcade.start_render()
-        arcade.draw_rectangle_filled(SCREEN_WIDTH//2, TEXT_BOX_HEIGHT//2, SCREEN_WIDTH, TEXT_BOX_HEIGHT, arcade.color.DARK_BLUE)
-        
-        # displays text inside the rectangle.
-        arcade.draw_text(message, 20,  TEXT_BOX_HEIGHT - 35, arcade.color.WHITE, 16)
+        with self.profiler.phase('dialogue'):
+            # Long messages wrap onto more lines, and the box grows to fit them
+            label = textcache.cache.label(message, arcade.color.WHITE, 16, width = SCREEN_WIDTH - 40, anchor_y = 'top')
+            box_height = max(TEXT_BOX_HEIGHT, label.content_height + 40)
+
+            # displays a rectangle of a certain color at the bottom of the screen.
+            #arcade.start_render()
+            arcade.draw_rectangle_filled(SCREEN_WIDTH//2, box_height//2, SCREEN_WIDTH, box_height, arcade.color.DARK_BLUE)
+            
+            # displays text inside the rectangle.
+            textcache.cache.drawLabel(label, 20, box_height - 20)
 
 
     def draw_inventory(self):
         self.draw_game()
-        self.player_sprite.inventory.showInventory()
+        with self.profiler.phase('inventory'):
+            self.player_sprite.inventory.showInventory()
 
     def draw_game_over(self):
-         arcade.draw_texture_rectangle(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, SCREEN_WIDTH, SCREEN_HEIGHT, arcade.load_texture("Images/WinScreen.png"))   
+         arcade.draw_texture_rectangle(SCREEN_WIDTH//2, SCREEN_HEIGHT//2, SCREEN_WIDTH, SCREEN_HEIGHT, textures.load("Images/WinScreen.png"))   
+
+    def scene(self):
+        """Returns everything that changes what the game screen looks like without input:
+        where the player is drawn, and what changed in the room"""
+        if self.state not in (GAME, DIALOGUE, INVENTORY):
+            return self.state
+        room = self.rooms[self.current_room]
+        message = self.current_message.message if self.state == DIALOGUE else None
+        return (self.state, self.current_room, self.interpolated(), room.changes, room.transparent_list.version,
+                room.puzzle.state, len(self.player.items), message)
 
     def on_draw(self):
-        """Draws the things on the screen"""
+        """Draws the things on the screen. If nothing changed since the last frame
+        it draws nothing, and MyGame keeps the last frame on screen."""
+        scene = self.scene()
+        if not self.dirty and scene == self.drawn_scene and not self.profiler.enabled:
+            self.skipped_frames += 1
+            return False
+        self.dirty = False
+        self.drawn_scene = scene
+
         arcade.start_render()
 
         if self.state == START:
-            self.draw_start()
-
-        elif self.state == GAME:
-            self.draw_game()
+            with self.profiler.phase('menu'):
+                self.draw_start()
+
+        elif self.state in (GAME, DIALOGUE, INVENTORY):
+            # The player (and the camera following it) are drawn where they are
+            # part way through the current step, then put back
+            player = self.player_sprite
+            x, y = player.center_x, player.center_y
+            player.center_x, player.center_y = self.interpolated()
+            room = self.rooms[self.current_room]
+            self.camera.follow(player, room.width, room.height)
+
+            if self.state == GAME:
+                self.draw_game()
+            elif self.state == DIALOGUE:
+                self.draw_dialogue()
+            else:
+                self.draw_inventory()
 
-        elif self.state == DIALOGUE:
-            self.draw_dialogue()
-
-        elif self.state == INVENTORY:
-            self.draw_inventory()
+            player.center_x, player.center_y = x, y
+            self.camera.follow(player, room.width, room.height)
 
         elif self.state == INSTRUCTIONS:
-            self.draw_instructions()
+            with self.profiler.phase('menu'):
+                self.draw_instructions()
 
         elif self.state == GAME_OVER:
-            self.draw_game_over()
+            with self.profiler.phase('menu'):
+                self.draw_game_over()
+
+        # The profiler overlay goes on top of everything, and isn't timed itself
+        self.profiler.endFrame('draw')
+        self.profiler.draw(10, SCREEN_HEIGHT - 10)
+        return True
 
     def on_key_press(self, key, modifiers):
         """Called whenever a key is pressed. """
-        
+        self.dirty = True
+        if self.recorder is not None:
+            self.recorder.keyPress(self.ticks, key, modifiers)
+
+        # F3 shows or hides the frame profiler on any screen
+        if key == arcade.key.F3:
+            self.profiler.toggle()
+            return
         
         if self.state == GAME:
             ## MOVEMENT:
             if key == arcade.key.UP:
                 #The direction is made so that we'll know what object the player will interact with
-                self.player_sprite.direction[0] = "UP"
+                self.player.facing_y = 1
                 #This boolean is used for the program to remember that this key was pressed and is held down
-                self.player_sprite.upMotion = True
+                self.player.upMotion = True
                 #Changing the velocity of the player
                 self.player_sprite.change_y = MOVEMENT_SPEED
             elif key == arcade.key.DOWN:
-                self.player_sprite.direction[0] = "DOWN"
-                self.player_sprite.downMotion = True
+                self.player.facing_y = -1
+                self.player.downMotion = True
                 self.player_sprite.change_y = -MOVEMENT_SPEED
             elif key == arcade.key.LEFT:
-                self.player_sprite.direction[1] = "LEFT"
-                self.player_sprite.leftMotion = True
+                self.player.facing_x = -1
+                self.player.leftMotion = True
                 self.player_sprite.change_x = -MOVEMENT_SPEED
             elif key == arcade.key.RIGHT:
-                self.player_sprite.direction[1] = "RIGHT"
-                self.player_sprite.rightMotion = True
+                self.player.facing_x = 1
+                self.player.rightMotion = True
                 self.player_sprite.change_x = MOVEMENT_SPEED
 
             ## PLAYER INTERACTIONS:
             elif key == arcade.key.Z:
-                self.player_sprite.useObject = True
-                for switch in self.rooms[self.current_room].switch_list:
-                    if switch.isColliding(self.player_sprite) and self.player_sprite.useObject and switch.orientation != 'BROKEN':
-                        switch.toggleSwitch()
-                    elif switch.isColliding(self.player_sprite) and self.player_sprite.useObject and switch.orientation == 'BROKEN' and 'BROKEN_LEVER' in self.player_sprite.inventory.item_list:
-                        switch.orientation = 'LEFT'
-                        switch.texture = arcade.load_texture("Images/lever_left.png", scale = switch.scaling)
-                        self.player_sprite.inventory.useItem('BROKEN_LEVER')
+                self.player.useObject = True
+                room = self.rooms[self.current_room]
+                #Counted in the next update, the tick that acts on the key press
+                with self.profiler.phase('interact', 'update'):
+                    #Only the levers and objects right in front of the player can be used
+                    for switch in room.facing(room.switch_index, self.player_sprite):
+                        if switch.model.orientation != model.BROKEN:
+                            switch.toggleSwitch()
+                        elif model.BROKEN_LEVER in self.player.items:
+                            switch.repair()
+                            self.player_sprite.inventory.useItem(model.BROKEN_LEVER)
+                    for items in room.facing(room.object_index, self.player_sprite):
+                        self.interact(items)
             
             elif key == arcade.key.C:
                 #Ensuring there is no movement after opening the inventory
                 self.player_sprite.change_x = 0
                 self.player_sprite.change_y = 0
-                self.player_sprite.rightMotion = False
-                self.player_sprite.leftMotion = False
-                self.player_sprite.upMotion = False
-                self.player_sprite.downMotion = False
+                self.player.stop()
 
                 self.state = INVENTORY
 
@@ -829,7 +1114,7 @@ class MyGame(arcade.Window):
                 elif self.current_message.otherMessage == None and self.onCrate == True:
                     self.current_message.message = 'A pile of wooden scraps.'
                 self.onCrate = False
-                self.player_sprite.useObject = False
+                self.player.useObject = False
                 self.state = GAME
                 
         #Press X or C to exit inventory
@@ -840,68 +1125,74 @@ class MyGame(arcade.Window):
 
     def on_key_release(self, key, modifiers):
         """Called when the user releases a key. """
+        self.dirty = True
+        if self.recorder is not None:
+            self.recorder.keyRelease(self.ticks, key, modifiers)
 
         ## MOVEMENT:
         if self.state == GAME:
             #Handles if two opposing keys are being pressed
             #UP and DOWN key
-            if self.player_sprite.upMotion and self.player_sprite.downMotion:
+            if self.player.upMotion and self.player.downMotion:
                 #If UP is released, move down
                 if key == arcade.key.UP:
                     #Make the upMotion boolean false bc not moving up anymore
-                    self.player_sprite.upMotion = False
+                    self.player.upMotion = False
                     #Change the direction the player is facing
-                    self.player_sprite.direction[0] = 'DOWN'
+                    self.player.facing_y = -1
                     #Changing the velocity of the object
                     self.player_sprite.change_y = -MOVEMENT_SPEED
                 #If DOWN is released, move up
                 elif key == arcade.key.DOWN:
-                    self.player_sprite.downMotion = False
-                    self.player_sprite.direction[0] = 'UP'
+                    self.player.downMotion = False
+                    self.player.facing_y = 1
                     self.player_sprite.change_y = MOVEMENT_SPEED
                 #This will handle any other key being released
                 elif key == arcade.key.LEFT or key == arcade.key.RIGHT:
-                    self.player_sprite.rightMotion = False
-                    self.player_sprite.leftMotion = False
+                    self.player.rightMotion = False
+                    self.player.leftMotion = False
                     self.player_sprite.change_x = 0
             #RIGHT and DOWN key 
-            elif self.player_sprite.leftMotion and self.player_sprite.rightMotion:
+            elif self.player.leftMotion and self.player.rightMotion:
                 #If RIGHT is released, move left
                 if key == arcade.key.RIGHT:
-                    self.player_sprite.rightMotion = False
-                    self.player_sprite.direction[1] = 'LEFT'
+                    self.player.rightMotion = False
+                    self.player.facing_x = -1
                     self.player_sprite.change_x = -MOVEMENT_SPEED
                 #If LEFT is released, move right
                 elif key == arcade.key.LEFT:
-                    self.player_sprite.leftMotion = False
-                    self.player_sprite.direction[1] = 'RIGHT'
+                    self.player.leftMotion = False
+                    self.player.facing_x = 1
                     self.player_sprite.change_x = MOVEMENT_SPEED
                 #Handle all other key being pressed
                 elif key == arcade.key.UP or key == arcade.key.DOWN:
-                    self.player_sprite.upMotion = False
-                    self.player_sprite.downMotion = False
+                    self.player.upMotion = False
+                    self.player.downMotion = False
                     self.player_sprite.change_y = 0
 
             #Normal movement with only one key being held down
             elif key == arcade.key.UP or key == arcade.key.DOWN:
-                self.player_sprite.upMotion = False
-                self.player_sprite.downMotion = False
+                self.player.upMotion = False
+                self.player.downMotion = False
                 self.player_sprite.change_y = 0
             elif key == arcade.key.LEFT or key == arcade.key.RIGHT:
-                self.player_sprite.rightMotion = False
-                self.player_sprite.leftMotion = False
+                self.player.rightMotion = False
+                self.player.leftMotion = False
                 self.player_sprite.change_x = 0
             
 
             ## PLAYER INTERACTIONS
             elif key == arcade.key.Z:
-                self.player_sprite.useObject = False
-                self.player_sprite.canUsePortal = True
+                self.player.useObject = False
+                self.player.canUsePortal = True
 
     def on_mouse_press(self, x, y, button, key_modifiers):
         """
         Called when the user presses a mouse button.
         """
+        self.dirty = True
+        if self.recorder is not None:
+            self.recorder.mousePress(self.ticks, x, y)
         if self.state == START:
             check_mouse_press_for_buttons(x, y, self.button_list_start)
         elif self.state == INSTRUCTIONS:
@@ -911,15 +1202,127 @@ class MyGame(arcade.Window):
         """
         Called when a user releases a mouse button.
         """
+        self.dirty = True
+        if self.recorder is not None:
+            self.recorder.mouseRelease(self.ticks, x, y)
         if self.state == START:
             check_mouse_release_for_buttons(x, y, self.button_list_start)
         elif self.state == INSTRUCTIONS:
             check_mouse_release_for_buttons(x, y, self.button_list_howTo)
 
+    def interact(self, items):
+        """Uses an object the player is facing"""
+        state = items.model
+        room = self.rooms[self.current_room]
+        inventory = self.player_sprite.inventory
+
+        #If the object has a key, update inventory
+        if state.item == model.KEY and not state.breakable:
+            state.item = model.NO_ITEM
+            if state.disappears:
+                room.removeWall(items)
+                room.removeObject(items)
+            inventory.addItem(model.KEY)
+
+        #If the object has a crowbar, update inventory
+        if state.item == model.CROWBAR and not state.breakable:
+            state.item = model.NO_ITEM
+            room.removeWall(items)
+            room.removeObject(items)
+            inventory.addItem(model.CROWBAR)
+
+        #If the object has a broken lever, update inventory
+        if state.item == model.BROKEN_LEVER and not state.breakable:
+            state.item = model.NO_ITEM
+            room.removeWall(items)
+            room.removeObject(items)
+            inventory.addItem(model.BROKEN_LEVER)
+
+        #Opening doors with a key
+        if state.lock and model.KEY in self.player.items:
+            state.message = "Used the key."
+            items.unlock()
+            state.lock = False
+            room.removeWall(items)
+            room.removeObject(items)
+            inventory.useItem(model.KEY)
+
+        #Breaking crates with a crowbar
+        if state.breakable and model.CROWBAR in self.player.items and state.item == model.KEY:
+            state.message = "Smashed the crate with the crowbar, Gordon Freeman style. There was a key inside."
+            items.broken()
+            state.item = model.NO_ITEM
+            state.breakable = False
+            self.onCrate = True
+            room.removeWall(items)
+            room.removeObject(items)
+            room.transparent_list.append(items)
+            inventory.useItem(model.CROWBAR)
+            inventory.addItem(model.KEY)
+
+        #Ensuring there is no movement after interacting with an object
+        self.player_sprite.change_x = 0
+        self.player_sprite.change_y = 0
+        self.player.stop()
+        
+        self.current_message = state
+
+        #Changing the state of the game
+        self.state = DIALOGUE
+
+    def change_room(self, index):
+        """Moves the player into another room. If it was prefetched this only swaps rooms."""
+        self.current_room = index
+        self.physics_engine.setWalls(self.rooms[self.current_room].wall_index)
+
+    def prefetch_rooms(self):
+        """Starts building the room past any edge the player is close to,
+        getting ready the part of it the player will walk into"""
+        exits = ROOM_EXITS[self.current_room]
+        room = self.rooms[self.current_room]
+        player = self.player_sprite
+        if 'UP' in exits and player.top > room.height - PREFETCH_DISTANCE:
+            self.rooms.prefetch(exits['UP'], ('DOWN', player.center_x))
+        if 'DOWN' in exits and player.bottom < PREFETCH_DISTANCE:
+            self.rooms.prefetch(exits['DOWN'], ('UP', player.center_x))
+        if 'RIGHT' in exits and player.right > room.width - PREFETCH_DISTANCE:
+            self.rooms.prefetch(exits['RIGHT'], ('LEFT', player.center_y))
+        if 'LEFT' in exits and player.left < PREFETCH_DISTANCE:
+            self.rooms.prefetch(exits['LEFT'], ('RIGHT', player.center_y))
+
+    def advance(self, delta_time):
+        """Runs as many TIMESTEP updates as the time since the last frame covers"""
+        self.accumulator += delta_time
+        steps = 0
+        while self.accumulator >= TIMESTEP and steps < MAX_CATCH_UP:
+            player = self.player_sprite
+            self.previous = (self.current_room, self.physics_engine.teleports, player.center_x, player.center_y)
+            self.update(TIMESTEP)
+            self.accumulator -= TIMESTEP
+            steps += 1
+        if self.accumulator >= TIMESTEP:
+            #Too far behind to catch up, so the game slows down instead of stalling
+            self.accumulator %= TIMESTEP
+        self.alpha = self.accumulator / TIMESTEP
+        self.profiler.count('steps', steps)
+
+    def interpolated(self):
+        """Where to draw the player: part way between where it was before the last step
+        and where it is now, so movement looks smooth at any frame rate"""
+        player = self.player_sprite
+        if self.previous is None:
+            return player.center_x, player.center_y
+        room, teleports, x, y = self.previous
+        #Portals and room changes jump straight to the new place
+        if room != self.current_room or teleports != self.physics_engine.teleports:
+            return player.center_x, player.center_y
+        return x + (player.center_x - x) * self.alpha, y + (player.center_y - y) * self.alpha
+
     def update(self, delta_time):
         """ Movement and game logic """
         ## TIME:
         self.total_time += delta_time
+        self.ticks += 1
 
         #Changing the sprite to face direction it's direction
         self.player_sprite.update_animation()
@@ -927,150 +1330,177 @@ class MyGame(arcade.Window):
         #Normalizing diagonal movement.\:
         #Diagonal speed will be 5 
         #If the player has upward movement
-        if self.player_sprite.upMotion:
-            if self.player_sprite.rightMotion and self.player_sprite.change_x > 0:
+        if self.player.upMotion:
+            if self.player.rightMotion and self.player_sprite.change_x > 0:
                 x = math.sqrt(MOVEMENT_SPEED**2/2)
                 y = math.sqrt(MOVEMENT_SPEED**2/2)
-            elif self.player_sprite.leftMotion and self.player_sprite.change_x < 0:
+            elif self.player.leftMotion and self.player_sprite.change_x < 0:
                 x = -1 * math.sqrt(MOVEMENT_SPEED**2/2)
                 y = math.sqrt(MOVEMENT_SPEED**2/2)
         #If the player has downward movement
-        if self.player_sprite.downMotion:
-            if self.player_sprite.rightMotion and self.player_sprite.change_x > 0:
+        if self.player.downMotion:
+            if self.player.rightMotion and self.player_sprite.change_x > 0:
                 x = math.sqrt(MOVEMENT_SPEED**2/2)
                 y = -1 * math.sqrt(MOVEMENT_SPEED**2/2)
-            elif self.player_sprite.leftMotion and self.player_sprite.change_x < 0:
+            elif self.player.leftMotion and self.player_sprite.change_x < 0:
                 x = -1 * math.sqrt(MOVEMENT_SPEED**2/2)
                 y = -1 * math.sqrt(MOVEMENT_SPEED**2/2)
     
         #Collision list for portals
-        hit_list = arcade.check_for_collision_with_list(self.player_sprite, self.rooms[self.current_room].portal_list)
+        with self.profiler.phase('portals'):
+            hit_list = self.rooms[self.current_room].portal_index.collisions(self.player_sprite)
 
         # Call update on all sprites (The sprites don't do much in this
         # example though.)
-        self.physics_engine.update()
+        with self.profiler.phase('physics'):
+            self.physics_engine.update()
 
         # Do some logic here to figure out what room we are in, and if we need to go
         # to a different room.
-        if self.player_sprite.center_y > SCREEN_HEIGHT and self.current_room == 0:
-            self.current_room = 1
-            self.physics_engine = arcade.PhysicsEngineSimple(self.player_sprite,
-                                                             self.rooms[self.current_room].wall_list)
+        exits = ROOM_EXITS[self.current_room]
+        room = self.rooms[self.current_room]
+        if self.player_sprite.center_y > room.height and 'UP' in exits:
+            self.change_room(exits['UP'])
             self.player_sprite.center_y = 0
-        elif self.player_sprite.center_y < 0 and self.current_room == 1:
-            self.current_room = 0
-            self.physics_engine = arcade.PhysicsEngineSimple(self.player_sprite,
-                                                             self.rooms[self.current_room].wall_list)
-            self.player_sprite.center_y = SCREEN_HEIGHT
+        elif self.player_sprite.center_y < 0 and 'DOWN' in exits:
+            self.change_room(exits['DOWN'])
+            self.player_sprite.center_y = self.rooms[self.current_room].height
+        elif self.player_sprite.center_x > room.width and 'RIGHT' in exits:
+            self.change_room(exits['RIGHT'])
+            self.player_sprite.center_x = 0
+        elif self.player_sprite.center_x < 0 and 'LEFT' in exits:
+            self.change_room(exits['LEFT'])
+            self.player_sprite.center_x = self.rooms[self.current_room].width
 
         #PORTAL INTERACTION
-        elif len(hit_list) > 0 and self.player_sprite.useObject == True:
-            if self.player_sprite.canUsePortal == True:
+        elif len(hit_list) > 0 and self.player.useObject == True:
+            if self.player.canUsePortal == True:
                 p = hit_list[0]
-                self.player_sprite.left = p.end_x
-                self.player_sprite.bottom = p.end_y
-                self.physics_engine = arcade.PhysicsEngineSimple(self.player_sprite, self.rooms[self.current_room].wall_list)
-                self.player_sprite.canUsePortal = False
-
-        # OBJECT INTERACTIONS
-        for items in self.rooms[self.current_room].object_list:
-            if items.isColliding(self.player_sprite) and self.player_sprite.useObject:
-                
-                #If the object has a key, update inventory
-
-                if items.hasItem == 'KEY' and not items.breakable:
-                    items.hasItem = None
-                    if items.disappears:
-                        self.rooms[self.current_room].wall_list.remove(items)
-                        self.rooms[self.current_room].object_list.remove(items)
-                    self.player_sprite.inventory.item_list.append('KEY')
-
-                #If the object has a crowbar, update inventory
-                if items.hasItem == 'CROWBAR' and not items.breakable:
-                    items.hasItem = None
-                    self.rooms[self.current_room].wall_list.remove(items)
-                    self.rooms[self.current_room].object_list.remove(items)
-                    self.player_sprite.inventory.item_list.append('CROWBAR')
-
-                #If the object has a broken lever, update inventory
-                if items.hasItem == 'BROKEN_LEVER' and not items.breakable:
-                    items.hasItem = None
-                    self.rooms[self.current_room].wall_list.remove(items)
-                    self.rooms[self.current_room].object_list.remove(items)
-                    self.player_sprite.inventory.item_list.append('BROKEN_LEVER')
-
-                #Opening doors with a key
-                if items.lock and 'KEY' in (self.player_sprite.inventory.item_list):
-                    items.message = "Used the key."
-                    items.unlock()
-                    items.lock = False
-                    self.rooms[self.current_room].wall_list.remove(items)
-                    self.rooms[self.current_room].object_list.remove(items)
-                    self.player_sprite.inventory.useItem('KEY')
-
-                #Breaking crates with a crowbar
-                if items.breakable and 'CROWBAR' in (self.player_sprite.inventory.item_list) and items.hasItem == 'KEY':
-                    items.message = "Smashed the crate with the crowbar, Gordon Freeman style. There was a key inside."
-                    items.broken()
-                    items.hasItem = None
-                    items.breakable = False
-                    self.onCrate = True
-                    self.rooms[self.current_room].wall_list.remove(items)
-                    self.rooms[self.current_room].object_list.remove(items)
-                    self.rooms[self.current_room].transparent_list.append(items)
-                    self.player_sprite.inventory.useItem('CROWBAR')
-                    self.player_sprite.inventory.item_list.append('KEY')
-
-                #Ensuring there is no movement after interacting with an object
-                self.player_sprite.change_x = 0
-                self.player_sprite.change_y = 0
-                self.player_sprite.rightMotion = False
-                self.player_sprite.leftMotion = False
-                self.player_sprite.upMotion = False
-                self.player_sprite.downMotion = False
-                
-                self.current_message = items
-
-                #Changing the state of the game
-                self.state = DIALOGUE
-
-        #Checks if the password in the room is correct
-        if self.rooms[self.current_room].password != []:
-            password = []
-            for switch in self.rooms[self.current_room].switch_list:
-                password.append(switch.orientation)
-            if type(self.rooms[self.current_room].password[0]) == list:
-                if password == self.rooms[self.current_room].password[0]:
-
-                    #self.rooms[self.current_room].secret_item.hasItem = 'KEY'
-                    self.rooms[self.current_room].wall_list.append(self.rooms[self.current_room].secret_item[0])
-                    self.rooms[self.current_room].object_list.append(self.rooms[self.current_room].secret_item[0])
-                    del self.rooms[self.current_room].password[0]
-                    del self.rooms[self.current_room].secret_item[0]
-                    if self.rooms[self.current_room].password == []:
-                        self.current_message = objects.InteractObjects('Images/key.png' , SPRITE_SCALING, 'Sounds like something dropped into the maze...')
-                        self.state = DIALOGUE
-            else:
-                if password == self.rooms[self.current_room].password:
-
-                    #self.rooms[self.current_room].secret_item.hasItem = 'KEY'
-                    self.rooms[self.current_room].wall_list.append(self.rooms[self.current_room].secret_item[0])
-                    self.rooms[self.current_room].object_list.append(self.rooms[self.current_room].secret_item[0])
-                    self.rooms[self.current_room].password = []
+                self.physics_engine.teleport(p.end_x, p.end_y)
+                self.player.canUsePortal = False
+
+        #Checks if the password in the room is correct, but only after a lever moved
+        room = self.rooms[self.current_room]
+        with self.profiler.phase('password'):
+            if room.password != [] and room.puzzle.changed:
+                room.puzzle.changed = False
+                if type(room.password[0]) == list:
+                    if room.puzzle.matches(room.password[0]):
+
+                        #self.rooms[self.current_room].secret_item.hasItem = 'KEY'
+                        room.addWall(room.secret_item[0])
+                        room.addObject(room.secret_item[0])
+                        del room.password[0]
+                        del room.secret_item[0]
+                        #The next password has to be checked against the levers too
+                        room.puzzle.changed = True
+                        if room.password == []:
+                            self.current_message = model.Thing('Sounds like something dropped into the maze...')
+                            self.state = DIALOGUE
+                else:
+                    if room.puzzle.matches(room.password):
+
+                        #self.rooms[self.current_room].secret_item.hasItem = 'KEY'
+                        room.addWall(room.secret_item[0])
+                        room.addObject(room.secret_item[0])
+                        room.password = []
 
         #Checks if you finished the game
         if self.current_room == 1:
             self.state = GAME_OVER
-        
 
-        
+        #Moves the camera with the player, and gets the chunks around it ready
+        room = self.rooms[self.current_room]
+        self.camera.follow(self.player_sprite, room.width, room.height)
+        room.static_layer.stream(self.camera.view(), STREAM_MARGIN)
+
+        #Starts loading the next room if the player is heading for it, and
+        #lets go of rooms the player left a while ago
+        self.prefetch_rooms()
+        self.rooms.update(delta_time, self.current_room)
+
+        self.profiler.endFrame('update')
+
+
+class MyGame(Game, arcade.Window):
+    """ Main application class. """
+
+    def __init__(self, width, height):
+        """
+        Initializer
+        """
+        arcade.Window.__init__(self, width, height)
+        Game.__init__(self)
+
+        # arcade calls update once a frame with however long the frame took. The
+        # game steps at a fixed rate instead, so advance takes over from it.
+        pyglet.clock.unschedule(self.update)
+        pyglet.clock.unschedule(self.on_update)
+        self.frame_rate = None
+        self.set_frame_rate(FRAME_RATE)
+
+        # Whether on_draw drew anything this frame
+        self.presented = True
+
+    def set_frame_rate(self, rate):
+        """Sets how often the window is drawn. The game runs at the same speed whatever it is."""
+        if rate != self.frame_rate:
+            pyglet.clock.unschedule(self.advance)
+            pyglet.clock.schedule_interval(self.advance, 1 / rate)
+            self.frame_rate = rate
+
+    def on_draw(self):
+        self.presented = Game.on_draw(self)
+
+    def flip(self):
+        """Shows the frame just drawn. When on_draw skipped a frame the buffers aren't
+        swapped, so the last frame stays on screen."""
+        if self.presented:
+            arcade.Window.flip(self)
+
+    def on_resize(self, width, height):
+        arcade.Window.on_resize(self, width, height)
+        self.dirty = True
+
+    def on_expose(self):
+        # The window was uncovered, and what was behind it needs drawing over
+        self.dirty = True
+
+    def advance(self, delta_time):
+        Game.advance(self, delta_time)
+        # Nothing moves in the dialogue box, the inventory or the menus, so they are drawn less often
+        self.set_frame_rate(FRAME_RATE if self.state == GAME else IDLE_FRAME_RATE)
+
 
 def main():
     """ Main method """
+    parser = argparse.ArgumentParser(description = "Bill's Adventures")
+    parser.add_argument('--record', metavar = 'PATH', help = "save every key and mouse event to PATH, for replay.py")
+    parser.add_argument('--save', metavar = 'PATH', help = "carry on from the progress saved in PATH, and save to it on exit")
+    args = parser.parse_args()
+
     window = MyGame(SCREEN_WIDTH, SCREEN_HEIGHT)
     window.setup()
+    if args.save:
+        import savegame
+        if os.path.exists(args.save):
+            #A save that can't be loaded leaves the game as it was, so it starts afresh
+            try:
+                seconds = savegame.load(args.save, window)
+                print("Loaded {} in {:.1f}ms".format(args.save, seconds * 1000))
+            except (savegame.SaveError, OSError) as error:
+                print("Couldn't load {} ({}), starting a new game".format(args.save, error))
+    if args.record:
+        import replay
+        window.recorder = replay.InputRecorder()
+
     arcade.run()
 
+    if args.record:
+        window.recorder.save(args.record, window)
+    if args.save:
+        savegame.save(args.save, window)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Runs the game logic without a window or GPU.
+
+The same rooms, movement, physics, portals, objects and lever passwords as the
+real game, with drawing switched off and time stepped by hand. Good for soak
+and regression tests on machines with no display.
+
+Import this module before anything else imports arcade, so that pyglet does
+not try to open a display. From the command line:
+python headless.py --sessions 1000 --ticks 3600
+"""
+import argparse
+import os
+import random
+import time
+
+import pyglet
+pyglet.options['shadow_window'] = False
+
+import arcade
+import textures
+import final
+
+#Simulated seconds per update, the same step the window's game runs at
+TIMESTEP = final.TIMESTEP
+
+#Keys a random session can press
+SESSION_KEYS = [arcade.key.UP, arcade.key.DOWN, arcade.key.LEFT, arcade.key.RIGHT, arcade.key.Z, arcade.key.C, arcade.key.X]
+
+
+def enable():
+    """Gets the process ready to use the game without a window: in the game folder, where
+    the Images and Levels folders are, and with textures read as sizes only"""
+    os.chdir(os.path.dirname(os.path.abspath(final.__file__)))
+    #No window means no GL, so textures only need their sizes
+    textures.registry.headless = True
+
+
+class HeadlessGame(final.Game):
+    """The game with drawing stubbed out, stepped at a fixed timestep"""
+    def __init__(self, timestep = TIMESTEP):
+        super().__init__()
+        enable()
+        self.timestep = timestep
+
+    def on_draw(self):
+        """There is nothing to draw to"""
+        pass
+
+    def step(self, ticks = 1):
+        """Runs the game logic for a number of updates"""
+        for i in range(ticks):
+            self.update(self.timestep)
+
+    def press(self, key):
+        self.on_key_press(key, 0)
+
+    def release(self, key):
+        self.on_key_release(key, 0)
+
+    def hold(self, key, ticks = 1):
+        """Holds a key down for a number of updates, then lets go"""
+        self.press(key)
+        self.step(ticks)
+        self.release(key)
+
+
+def random_session(seed, ticks):
+    """Plays one session of random key presses and returns the finished game"""
+    rng = random.Random(seed)
+    game = HeadlessGame()
+    game.setup()
+    game.start_game()
+
+    while game.ticks < ticks and game.state != final.GAME_OVER:
+        game.hold(rng.choice(SESSION_KEYS), rng.randint(1, 30))
+    return game
+
+
+def main():
+    """Soak-tests the game logic with random sessions"""
+    parser = argparse.ArgumentParser(description = "Run the game without a window.")
+    parser.add_argument('--sessions', type = int, default = 100, help = "how many sessions to play")
+    parser.add_argument('--ticks', type = int, default = 3600, help = "updates per session")
+    parser.add_argument('--seed', type = int, default = 0, help = "seed of the first session")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    finished = 0
+    total_ticks = 0
+    for i in range(args.sessions):
+        game = random_session(args.seed + i, args.ticks)
+        total_ticks += game.ticks
+        if game.state == final.GAME_OVER:
+            finished += 1
+    elapsed = time.perf_counter() - start
+
+    print("{} sessions, {} updates in {:.2f}s ({:.0f} sessions/min, {:.0f} updates/s)".format(
+        args.sessions, total_ticks, elapsed, 60 * args.sessions / elapsed, total_ticks / elapsed))
+    print("{} sessions reached the end".format(finished))
+
+
+if __name__ == "__main__":
+    main()
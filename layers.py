@@ -0,0 +1,79 @@
+"""
+Pre-rendered room layers.
+
+The floor and plain walls of a room never move, so instead of drawing hundreds
+of sprites every frame they are pasted into one texture the first time the room
+is drawn. The texture is only rebuilt when a sprite leaves the layer.
+
+A layer covers one rectangle of the room. world.ChunkedLayer splits big rooms
+into many of them.
+"""
+import arcade
+import PIL.Image
+import textures
+
+
+class StaticLayer:
+    """Holds the sprites of a room that never move and draws them as one texture"""
+    def __init__(self, width, height, scale, left = 0, bottom = 0):
+        #Where the layer sits in the room and how big it is, and how much the sprite images are scaled up
+        self.left = left
+        self.bottom = bottom
+        self.width = width
+        self.height = height
+        self.scale = scale
+
+        self.sprite_list = arcade.SpriteList(is_static = True)
+        #The composed picture of the layer, and the texture made from it
+        self.image = None
+        self.texture = None
+        self.bakes = 0
+
+    def __contains__(self, sprite):
+        return sprite in self.sprite_list.sprite_list
+
+    def __len__(self):
+        return len(self.sprite_list)
+
+    def append(self, sprite):
+        """Adds a sprite to the layer"""
+        self.sprite_list.append(sprite)
+        self.release()
+
+    def remove(self, sprite):
+        """Takes a sprite out of the layer, so the layer has to be baked again"""
+        self.sprite_list.remove(sprite)
+        self.release()
+
+    def compose(self):
+        """Pastes every sprite of the layer into one image. This doesn't touch GL,
+        so it can run on a worker thread ahead of time."""
+        #The layer is built at the images' own size and scaled up when drawn
+        image = PIL.Image.new('RGBA', (int(self.width / self.scale), int(self.height / self.scale)))
+        for sprite in self.sprite_list:
+            x = int(round((sprite.left - self.left) / self.scale))
+            #Images count y from the top of the picture
+            y = int(round((self.bottom + self.height - sprite.top) / self.scale))
+            image.alpha_composite(textures.registry.image(sprite.texture), (x, y))
+        self.image = image
+
+    def bake(self):
+        """Uploads the layer as a single texture, composing it first if needed"""
+        if self.image is None:
+            self.compose()
+        self.texture = textures.registry.bake(self.image)
+        self.bakes += 1
+
+    def release(self):
+        """Frees the composed image and baked texture. They get made again if the layer is drawn later."""
+        self.image = None
+        if self.texture is not None:
+            textures.registry.unbake(self.texture)
+            self.texture = None
+
+    def draw(self):
+        """Draws the layer, baking it first if it changed"""
+        if self.texture is None:
+            self.bake()
+        arcade.draw_texture_rectangle(self.left + self.width / 2, self.bottom + self.height / 2,
+                                      self.width, self.height, self.texture)
@@ -0,0 +1,185 @@
+"""
+Loads rooms from level files.
+
+A level is a JSON file in the Levels folder: a tile map of the walls, plus
+lists of portals, objects, doors, levers, the lever password and the secret
+items the password releases. It also says which edges lead out of the room
+and, for the first room, which tile the player starts on. See Levels/room1.json.
+
+Parsing and checking the JSON is the slow part, so the first load compiles it
+into a small binary file in Levels/__levelcache__ and later loads read that
+instead, for as long as the JSON file stays the same.
+"""
+import hashlib
+import json
+import marshal
+import os
+import struct
+import model
+
+#Bump this when the compiled format changes, so old cache files get rebuilt
+VERSION = 2
+MAGIC = b'BILLLVL'
+
+#magic, version, sha1 of the JSON file it was compiled from
+HEADER = struct.Struct('<7sB20s')
+
+CACHE_FOLDER = '__levelcache__'
+
+WALL = '#'
+
+#Edges of the map a room can be left by
+EDGES = ('UP', 'DOWN', 'LEFT', 'RIGHT')
+
+#What each kind of object is allowed to say about itself, besides kind, image and at
+OPTIONS = {'object': ('message', 'otherMessage', 'hasItem', 'lock', 'breakable', 'disappears'),
+           'door': ('message', 'otherMessage', 'hasItem', 'lock', 'breakable', 'disappears'),
+           'switch': ('orientation',)}
+
+#Loaded levels, so a level is only read from disk once per run
+loaded = {}
+
+
+class LevelError(ValueError):
+    """A level file that doesn't describe a valid room"""
+    pass
+
+
+def compileObject(path, spec):
+    """Turns one object from the JSON file into (kind, image, tile x, tile y, options)"""
+    kind = spec.get('kind', 'object')
+    if kind not in OPTIONS:
+        raise LevelError("{}: unknown kind of object {!r}".format(path, kind))
+    options = {}
+    for name, value in spec.items():
+        if name in ('kind', 'image', 'at'):
+            continue
+        if name not in OPTIONS[kind]:
+            raise LevelError("{}: a {} can't have {!r}".format(path, kind, name))
+        options[name] = value
+    if kind == 'door':
+        options['door'] = True
+    if kind != 'switch' and 'message' not in options:
+        raise LevelError("{}: the {} at {} has no message".format(path, kind, spec.get('at')))
+    if options.get('hasItem') not in model.ITEMS:
+        raise LevelError("{}: the {} at {} holds an unknown item {!r}".format(path, kind, spec.get('at'), options['hasItem']))
+    if options.get('orientation', 'LEFT') not in model.ORIENTATIONS:
+        raise LevelError("{}: the lever at {} can't point {!r}".format(path, spec.get('at'), options['orientation']))
+
+    x, y = spec['at']
+    return (kind, spec.get('image'), x, y, options)
+
+
+def compileLevel(path, source):
+    """Checks a level's JSON and turns it into plain tuples that marshal can store"""
+    try:
+        level = json.loads(source.decode('utf-8'))
+    except ValueError as error:
+        raise LevelError("{}: {}".format(path, error))
+    for key in ('size', 'wall', 'map'):
+        if key not in level:
+            raise LevelError("{}: the level has no {!r}".format(path, key))
+
+    size = level['size']
+    if type(size) != list or len(size) != 2 or any(type(number) != int or number < 1 for number in size):
+        raise LevelError("{}: the size has to be [width, height] in tiles, not {!r}".format(path, size))
+    width, height = size
+    rows = level['map']
+    if len(rows) != height or any(len(row) != width for row in rows):
+        raise LevelError("{}: the map has to be {} rows of {} tiles".format(path, height, width))
+
+    #The map is written top row first, but rows are counted from the bottom
+    walls = []
+    for row, line in enumerate(rows):
+        y = height - 1 - row
+        for x, tile in enumerate(line):
+            if tile == WALL:
+                walls.append((x, y))
+    walls.sort(key = lambda tile: (tile[1], tile[0]))
+
+    exits = level.get('exits', [])
+    for edge in exits:
+        if edge not in EDGES:
+            raise LevelError("{}: {!r} isn't an edge, exits can be {}".format(path, edge, ', '.join(EDGES)))
+    start = level.get('start')
+    if start is not None:
+        start = tuple(start)
+
+    portals = []
+    for portal in level.get('portals', []):
+        if len(portal) != 4:
+            raise LevelError("{}: a portal is [start x, start y, end x, end y]".format(path))
+        portals.append(tuple(portal))
+
+    return {'size': (width, height),
+            'floor': level.get('floor'),
+            'wall': level['wall'],
+            'background': level.get('background'),
+            'exits': tuple(exits),
+            'start': start,
+            'walls': tuple(walls),
+            'portals': tuple(portals),
+            'objects': tuple(compileObject(path, spec) for spec in level.get('objects', [])),
+            'password': level.get('password', []),
+            'secrets': tuple(compileObject(path, spec) for spec in level.get('secrets', []))}
+
+
+def cachePath(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, CACHE_FOLDER, name + '.bin')
+
+
+def readCache(path, digest):
+    """Returns the compiled level if the cache was made from the same JSON, otherwise None"""
+    try:
+        with open(cachePath(path), 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, source_digest = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or source_digest != digest:
+        return None
+    try:
+        return marshal.loads(data[HEADER.size:])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def writeCache(path, digest, level):
+    """Saves a compiled level. If the folder can't be written to, the level just isn't cached."""
+    cache = cachePath(path)
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok = True)
+        #Write to a temporary file first so a half written cache is never read
+        with open(cache + '.tmp', 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, digest))
+            file.write(marshal.dumps(level))
+        os.replace(cache + '.tmp', cache)
+    except OSError:
+        pass
+
+
+def load(path):
+    """Returns the compiled form of a level file, using the cache when it is up to date"""
+    with open(path, 'rb') as file:
+        source = file.read()
+    digest = hashlib.sha1(source).digest()
+
+    level = loaded.get(path)
+    if level is not None and level[0] == digest:
+        return level[1]
+
+    compiled = readCache(path, digest)
+    if compiled is None:
+        compiled = compileLevel(path, source)
+        writeCache(path, digest, compiled)
+    loaded[path] = (digest, compiled)
+    return compiled
+
+
+def fingerprint(path):
+    """Returns the sha1 of a level file, which changes whenever the file does"""
+    load(path)
+    return loaded[path][0]
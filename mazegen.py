@@ -0,0 +1,212 @@
+"""
+Makes random mazes, with portals and a lever puzzle, at any size.
+
+A maze comes out in the same form as levels.load returns, so final.build_room
+turns it into a Room like any level file:
+
+    room = final.build_room(mazegen.generate(60, 40, seed = 3))
+
+The maze is carved into a bytearray with a depth first search, so no sprites
+are made until the room is built. The same seed always gives the same maze.
+Levers, secret keys and the locked exit door only go on dead ends and the
+outer wall, so they never cut the maze in two.
+
+python mazegen.py 500 500 --seed 1 --out Levels/maze.json
+"""
+import argparse
+import json
+import random
+import time
+
+WALL_IMAGE = "Images/RogueSprites/block1.png"
+FLOOR_IMAGE = "Images/RogueSprites/floor.png"
+NOTE = "\"The door at the top opens for whoever finds the key.\""
+
+#Lever orientations a password can ask for
+ORIENTATIONS = ('LEFT', 'NEUTRAL', 'RIGHT')
+
+
+def carve(width, height, rng):
+    """Returns a bytearray of width * height tiles (1 is open) holding a perfect maze.
+    Open cells are on odd tiles, and the outer edge is always wall."""
+    grid = bytearray(width * height)
+    columns = (width - 1) // 2
+    rows = (height - 1) // 2
+    if columns < 1 or rows < 1:
+        return grid
+
+    #Cells sit on odd tiles, from 1 up to the last odd tile inside the outer wall
+    last_x = 2 * columns - 1
+    last_y = 2 * rows - 1
+    first = width + 1
+    grid[first] = 1
+    stack = [first]
+    while stack:
+        tile = stack[-1]
+        x = tile % width
+        y = tile // width
+        choices = []
+        if x < last_x and not grid[tile + 2]:
+            choices.append(2)
+        if x > 1 and not grid[tile - 2]:
+            choices.append(-2)
+        if y < last_y and not grid[tile + 2 * width]:
+            choices.append(2 * width)
+        if y > 1 and not grid[tile - 2 * width]:
+            choices.append(-2 * width)
+        if not choices:
+            stack.pop()
+            continue
+        step = choices[rng.randrange(len(choices))]
+        #Knock down the wall between the two cells
+        grid[tile + step // 2] = 1
+        grid[tile + step] = 1
+        stack.append(tile + step)
+    return grid
+
+
+def dead_ends(grid, width, height):
+    """Returns the open cells with only one open neighbour"""
+    found = []
+    for y in range(1, height - 1, 2):
+        row = y * width
+        for x in range(1, width - 1, 2):
+            tile = row + x
+            if grid[tile] and grid[tile + 1] + grid[tile - 1] + grid[tile + width] + grid[tile - width] == 1:
+                found.append((x, y))
+    return found
+
+
+def generate(width, height, seed = 0, portals = None, levers = 5, passwords = 2, floor = False):
+    """Makes a maze level of width x height tiles. By default there is one portal
+    for every 25 cells of the maze."""
+    rng = random.Random(seed)
+    grid = carve(width, height, rng)
+    start = (1, 1)
+    if levers == 0:
+        passwords = 0
+
+    #The way out is a locked door in the top wall, above one of the top cells.
+    #The cell below it leads out, so it can't be used as a dead end.
+    top = height - 2 if height % 2 == 1 else height - 3
+    top_cells = [x for x in range(1, width - 1, 2) if grid[top * width + x]]
+    door = None
+    if top_cells and passwords > 0:
+        door = (top_cells[rng.randrange(len(top_cells))], height - 1)
+
+    #Everything that stands in the maze goes on a different dead end, so nothing blocks a corridor
+    ends = [tile for tile in dead_ends(grid, width, height) if tile != start and (door is None or tile != (door[0], top))]
+    rng.shuffle(ends)
+    if len(ends) < levers + passwords + 1:
+        levers = passwords = 0
+        door = None
+    lever_tiles = ends[:levers]
+    secret_tiles = ends[levers:levers + passwords]
+    note_tile = ends[levers + passwords] if len(ends) > levers + passwords else None
+    spare = ends[levers + passwords + 1:]
+
+    if door is not None:
+        for y in range(top + 1, height):
+            grid[y * width + door[0]] = 1
+    walls = [(index % width, index // width) for index in range(width * height) if not grid[index]]
+    cells = [(x, y) for y in range(1, height - 1, 2) for x in range(1, width - 1, 2) if grid[y * width + x]]
+
+    objects = []
+    for x, y in lever_tiles:
+        objects.append(('switch', None, x, y, {}))
+    if note_tile is not None:
+        objects.append(('object', "Images/note.png", note_tile[0], note_tile[1], {'message': NOTE}))
+    exits = []
+    if door is not None:
+        objects.append(('door', "Images/LockDoor.png", door[0], door[1],
+                        {'message': "A locked door. I'll need to get a key.", 'lock': True, 'door': True}))
+        exits.append('UP')
+
+    secrets = tuple(('object', "Images/key.png", x, y, {'message': "You picked up the key.", 'hasItem': 'KEY', 'disappears': True})
+                    for x, y in secret_tiles)
+    password = [[ORIENTATIONS[rng.randrange(3)] for i in range(levers)] for j in range(passwords)]
+    #A password the levers already match would be solved before the player moves
+    for combination in password:
+        if all(orientation == 'LEFT' for orientation in combination):
+            combination[0] = 'NEUTRAL'
+
+    #Portals also start on dead ends, since a portal in a corridor would cut the maze in two.
+    #They land on any cell that has nothing on it and isn't another portal.
+    if portals is None:
+        portals = len(cells) // 25
+    starts = spare[:portals]
+    taken = set(ends[:levers + passwords + 1]) | set(starts)
+    landings = [tile for tile in cells if tile not in taken]
+    portal_list = []
+    if landings:
+        for begin in starts:
+            portal_list.append(begin + landings[rng.randrange(len(landings))])
+
+    return {'size': (width, height),
+            'floor': FLOOR_IMAGE if floor else None,
+            'wall': WALL_IMAGE,
+            'background': None,
+            'exits': tuple(exits),
+            'start': start,
+            'walls': tuple(walls),
+            'portals': tuple(portal_list),
+            'objects': tuple(objects),
+            'password': password,
+            'secrets': secrets}
+
+
+def to_json(level):
+    """Turns a generated level into the JSON level file format"""
+    width, height = level['size']
+    walls = set(level['walls'])
+    rows = [''.join('#' if (x, y) in walls else '.' for x in range(width)) for y in range(height - 1, -1, -1)]
+
+    def spec(kind, image, x, y, options):
+        result = {'kind': kind}
+        if image is not None:
+            result['image'] = image
+        result['at'] = [x, y]
+        for name, value in options.items():
+            #Doors get door = True from their kind when loaded
+            if not (kind == 'door' and name == 'door'):
+                result[name] = value
+        return result
+
+    return {'size': [width, height],
+            'floor': level['floor'],
+            'wall': level['wall'],
+            'background': level['background'],
+            'exits': list(level['exits']),
+            'start': list(level['start']),
+            'map': rows,
+            'portals': [list(portal) for portal in level['portals']],
+            'objects': [spec(*thing) for thing in level['objects']],
+            'password': level['password'],
+            'secrets': [spec(*thing) for thing in level['secrets']]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Make a random maze level.")
+    parser.add_argument('width', type = int, help = "width in tiles")
+    parser.add_argument('height', type = int, help = "height in tiles")
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--portals', type = int, default = None, help = "how many portals (one per 25 cells by default)")
+    parser.add_argument('--levers', type = int, default = 5)
+    parser.add_argument('--passwords', type = int, default = 2)
+    parser.add_argument('--out', metavar = 'PATH', help = "save the level as a JSON level file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    level = generate(args.width, args.height, args.seed, args.portals, args.levers, args.passwords)
+    seconds = time.perf_counter() - started
+    print("{}x{} maze: {} walls, {} portals, {} levers in {:.1f}ms".format(
+        args.width, args.height, len(level['walls']), len(level['portals']),
+        sum(1 for thing in level['objects'] if thing[0] == 'switch'), seconds * 1000))
+
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump(to_json(level), file, indent = 1)
+
+
+if __name__ == "__main__":
+    main()
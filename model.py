@@ -0,0 +1,87 @@
+"""
+The state of the game, kept apart from the sprites that show it.
+
+Gameplay reads and changes these records, and each sprite holds its record in
+.model and only changes its picture to match. The records use __slots__ and
+small numbers instead of strings, so an object costs a few bytes instead of a
+whole Sprite, snapshots have little to look at, and gameplay checks never go
+through arcade's Sprite properties.
+
+Level files and passwords still name things ('KEY', 'LEFT', ...); ITEMS and
+ORIENTATIONS turn the names into numbers when a room is built.
+"""
+
+#Kinds of item. NO_ITEM is what an object that holds nothing has.
+NO_ITEM = 0
+KEY = 1
+CROWBAR = 2
+BROKEN_LEVER = 3
+ITEM_NAMES = (None, 'KEY', 'CROWBAR', 'BROKEN_LEVER')
+ITEMS = {name: item for item, name in enumerate(ITEM_NAMES)}
+
+#Ways a lever can point. These are also the two bits each lever has in objects.LeverPuzzle.state.
+LEFT = 0
+NEUTRAL = 1
+RIGHT = 2
+BROKEN = 3
+ORIENTATION_NAMES = ('LEFT', 'NEUTRAL', 'RIGHT', 'BROKEN')
+ORIENTATIONS = {name: orientation for orientation, name in enumerate(ORIENTATION_NAMES)}
+
+
+class Thing:
+    """An object, door or crate: what it says, what it holds and what can be done to it"""
+    __slots__ = ('message', 'otherMessage', 'item', 'lock', 'door', 'breakable', 'disappears')
+
+    def __init__(self, message, otherMessage = None, item = NO_ITEM, lock = False, door = False, breakable = False, disappears = False):
+        self.message = message
+        self.otherMessage = otherMessage
+        self.item = item
+        self.lock = lock
+        self.door = door
+        self.breakable = breakable
+        self.disappears = disappears
+
+    def changeMessage(self):
+        self.message = self.otherMessage
+
+
+class Lever:
+    """Which way a lever points, and where it is in its room's puzzle"""
+    __slots__ = ('orientation', 'puzzle', 'slot')
+
+    def __init__(self, orientation = LEFT):
+        self.orientation = orientation
+        self.puzzle = None
+        self.slot = 0
+
+
+class PlayerState:
+    """What the player is doing and carrying. The position stays on the sprite, since
+    that's what the physics engine moves."""
+    __slots__ = ('facing_x', 'facing_y', 'leftMotion', 'rightMotion', 'upMotion', 'downMotion',
+                 'useObject', 'canUsePortal', 'items')
+
+    def __init__(self):
+        #1 or -1: facing right or left, and up or down
+        self.facing_x = 1
+        self.facing_y = 1
+
+        #Which arrow keys are held down
+        self.leftMotion = False
+        self.rightMotion = False
+        self.upMotion = False
+        self.downMotion = False
+
+        #Interacting Variables
+        self.useObject = False
+        self.canUsePortal = True
+
+        #The items being carried, in the order they were picked up
+        self.items = bytearray()
+
+    def stop(self):
+        """Forgets the arrow keys being held, like when a menu opens"""
+        self.leftMotion = False
+        self.rightMotion = False
+        self.upMotion = False
+        self.downMotion = False
@@ -0,0 +1,278 @@
+"""
+The walkable tiles of a room and the portals between them, as a graph.
+
+Walking moves between neighbouring open tiles, and standing on a portal and
+pressing Z jumps to where it leads, which counts as one more step. Portals only
+go one way, so a spot can be reachable from another without the reverse being
+true.
+
+The graph is built once per room. Walking is the same both ways, so open tiles
+are grouped into regions the player can walk around freely, and which regions
+lead to which (through portals) is worked out up front. "Can I get from here to
+there" is then a lookup on the regions, however big the room is.
+
+Distances and paths need a breadth first search of the whole room backwards
+from the goal, about 35ms on a 286x151 maze. So they can only be asked about
+goals that were searched when the graph was built, with prepare, and are then
+lookups too. Room.navigation prepares the exits and every object and lever.
+Asking about any other goal raises ValueError rather than stall a frame.
+"""
+import collections
+import math
+from array import array
+
+#Ways the player can walk from a tile
+STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class NavGraph:
+    """Open tiles of a room joined by walking and by portals"""
+    def __init__(self, width, height, blocked, portals):
+        """blocked is a set of (x, y) tiles that can't be walked on.
+        portals is a list of ((start x, start y), (end x, end y)) tiles."""
+        self.width = width
+        self.height = height
+
+        #Tiles are numbered row by row from the bottom left
+        self.open = bytearray(b'\x01') * (width * height)
+        for x, y in blocked:
+            if 0 <= x < width and 0 <= y < height:
+                self.open[y * width + x] = 0
+
+        #Tile -> tiles its portals lead to, and tile -> tiles with portals leading to it
+        self.portals_from = collections.defaultdict(list)
+        self.portals_to = collections.defaultdict(list)
+        for start, end in portals:
+            start = self.number(*start)
+            end = self.number(*end)
+            if start is not None and end is not None and self.open[start] and self.open[end]:
+                self.portals_from[start].append(end)
+                self.portals_to[end].append(start)
+
+        self.findRegions()
+        self.linkRegions()
+
+        #Goal tiles -> (distance of every tile to the nearest one, next tile on the way there)
+        self.prepared = {}
+        self.searches = 0
+
+    @classmethod
+    def fromRoom(cls, room, tile_size, ignore = ()):
+        """Builds the graph of a room as it is now. Sprites in ignore (like a door
+        that is about to be opened) are treated as if they weren't there."""
+        width = int(room.width // tile_size)
+        height = int(room.height // tile_size)
+        blocked = set()
+        for sprite in room.wall_list:
+            if sprite not in ignore:
+                blocked.update(coveredTiles(sprite.left, sprite.right, sprite.bottom, sprite.top, tile_size))
+        portals = [((int(portal.start_x // tile_size), int(portal.start_y // tile_size)),
+                    (int(portal.end_x // tile_size), int(portal.end_y // tile_size))) for portal in room.portal_list]
+        return cls(width, height, blocked, portals)
+
+    def number(self, x, y):
+        """Returns the number of a tile, or None if it is outside the room"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return None
+
+    def tile(self, number):
+        return (number % self.width, number // self.width)
+
+    def isOpen(self, x, y):
+        number = self.number(x, y)
+        return number is not None and self.open[number] == 1
+
+    def neighbours(self, number):
+        """Open tiles next to a tile"""
+        x = number % self.width
+        y = number // self.width
+        found = []
+        if x + 1 < self.width and self.open[number + 1]:
+            found.append(number + 1)
+        if x > 0 and self.open[number - 1]:
+            found.append(number - 1)
+        if y + 1 < self.height and self.open[number + self.width]:
+            found.append(number + self.width)
+        if y > 0 and self.open[number - self.width]:
+            found.append(number - self.width)
+        return found
+
+    def findRegions(self):
+        """Gives every open tile the number of the region it can walk around in"""
+        self.region = array('i', [-1]) * (self.width * self.height)
+        self.region_count = 0
+        #The lowest numbered tile of each region
+        self.region_start = []
+        for start in range(self.width * self.height):
+            if not self.open[start] or self.region[start] != -1:
+                continue
+            label = self.region_count
+            self.region_count += 1
+            self.region_start.append(start)
+            self.region[start] = label
+            queue = [start]
+            for number in queue:
+                for neighbour in self.neighbours(number):
+                    if self.region[neighbour] == -1:
+                        self.region[neighbour] = label
+                        queue.append(neighbour)
+
+    def linkRegions(self):
+        """Works out which regions can be reached from each region, as bits of a number"""
+        leads_to = [set() for i in range(self.region_count)]
+        for start, ends in self.portals_from.items():
+            for end in ends:
+                leads_to[self.region[start]].add(self.region[end])
+
+        self.reaches = []
+        for region in range(self.region_count):
+            seen = 1 << region
+            queue = [region]
+            for current in queue:
+                for other in leads_to[current]:
+                    if not seen >> other & 1:
+                        seen |= 1 << other
+                        queue.append(other)
+            self.reaches.append(seen)
+
+    def regionOf(self, x, y):
+        """Returns the region of a tile, or -1 for a wall or a tile outside the room"""
+        number = self.number(x, y)
+        if number is None:
+            return -1
+        return self.region[number]
+
+    def reachable(self, start, goal):
+        """Returns True if the player can get from the start tile to the goal tile"""
+        start_region = self.regionOf(*start)
+        goal_region = self.regionOf(*goal)
+        if start_region == -1 or goal_region == -1:
+            return False
+        return self.reaches[start_region] >> goal_region & 1 == 1
+
+    def reachableRegions(self, start):
+        """Returns every region that can be reached from the start tile, as bits of a number"""
+        region = self.regionOf(*start)
+        return 0 if region == -1 else self.reaches[region]
+
+    def goals(self, goal):
+        """Turns a goal (one tile, or a list of tiles where any of them will do) into a tuple of tiles"""
+        if len(goal) == 2 and isinstance(goal[0], int):
+            return (tuple(goal),)
+        return tuple(sorted(set(tuple(tile) for tile in goal)))
+
+    def reachesAny(self, start, goals):
+        """Returns True if the player can get from the start tile to any of the goal tiles"""
+        return any(self.reachable(start, goal) for goal in goals)
+
+    def prepare(self, goals):
+        """Searches for goals (exits, objects) ahead of time, so distances and paths to them are
+        lookups. Each goal is one tile or a list of tiles where any of them will do."""
+        for goal in goals:
+            goal = self.goals(goal)
+            if goal not in self.prepared:
+                self.prepared[goal] = self.search(goal)
+
+    def lookup(self, goals):
+        """Returns what prepare found for goals"""
+        found = self.prepared.get(goals)
+        if found is None:
+            raise ValueError("the way to {} wasn't prepared, which would take searching the whole room".format(list(goals)))
+        return found
+
+    def search(self, goals):
+        """Returns the distance of every tile to the nearest goal, and the next tile to go to from each"""
+        self.searches += 1
+        size = self.width * self.height
+        distance = array('i', [-1]) * size
+        step = array('i', [-1]) * size
+        queue = []
+        for goal in goals:
+            target = self.number(*goal)
+            if target is not None and self.open[target] and distance[target] == -1:
+                distance[target] = 0
+                queue.append(target)
+        #Going backwards: walking is the same either way, portals are followed against their direction
+        for number in queue:
+            for previous in self.neighbours(number) + self.portals_to.get(number, []):
+                if distance[previous] == -1:
+                    distance[previous] = distance[number] + 1
+                    step[previous] = number
+                    queue.append(previous)
+
+        return distance, step
+
+    def distance(self, start, goal):
+        """Returns how many steps (walking a tile or using a portal) it takes to get from
+        start to goal, or -1 if it can't be done. goal can also be a list of tiles, and has
+        to have been prepared."""
+        goals = self.goals(goal)
+        distance, step = self.lookup(goals)
+        if not self.reachesAny(start, goals):
+            return -1
+        return distance[self.number(*start)]
+
+    def path(self, start, goal):
+        """Returns the tiles on a shortest way from start to goal (both included), or None.
+        goal has to have been prepared."""
+        goals = self.goals(goal)
+        distance, step = self.lookup(goals)
+        if not self.reachesAny(start, goals):
+            return None
+        number = self.number(*start)
+        tiles = [tuple(start)]
+        while distance[number] > 0:
+            number = step[number]
+            tiles.append(self.tile(number))
+        return tiles
+
+    def nextStep(self, start, goal):
+        """Returns the tile to go to next on the way from start to goal, or None"""
+        path = self.path(start, goal)
+        if path is None or len(path) < 2:
+            return None
+        return path[1]
+
+    def beside(self, tiles):
+        """Returns the open tiles next to any of tiles, where the player can stand to use
+        something covering them"""
+        tiles = set(tuple(tile) for tile in tiles)
+        found = set()
+        for x, y in tiles:
+            for step_x, step_y in STEPS:
+                tile = (x + step_x, y + step_y)
+                if tile not in tiles and self.isOpen(*tile):
+                    found.add(tile)
+        return sorted(found)
+
+    def besideSprite(self, sprite, tile_size):
+        """Returns the tiles the player can stand on to use a sprite"""
+        return self.beside(coveredTiles(sprite.left, sprite.right, sprite.bottom, sprite.top, tile_size))
+
+    def exits(self):
+        """Returns the open tiles on the edge of the room, which lead out of it"""
+        tiles = []
+        for x in range(self.width):
+            for y in (0, self.height - 1):
+                if self.isOpen(x, y):
+                    tiles.append((x, y))
+        for y in range(1, self.height - 1):
+            for x in (0, self.width - 1):
+                if self.isOpen(x, y):
+                    tiles.append((x, y))
+        return tiles
+
+
+def coveredTiles(left, right, bottom, top, tile_size):
+    """Returns the tiles a box covers. A box that ends exactly on a tile edge doesn't cover the next tile."""
+    tiles = []
+    for x in range(int(math.floor(left / tile_size)), int(math.ceil(right / tile_size))):
+        for y in range(int(math.floor(bottom / tile_size)), int(math.ceil(top / tile_size))):
+            tiles.append((x, y))
+    return tiles
+
+
+def tileOf(sprite, tile_size):
+    """Returns the tile the center of a sprite is on"""
+    return (int(sprite.center_x // tile_size), int(sprite.center_y // tile_size))
@@ -1,20 +1,52 @@
 import arcade
+import model
+import textures
 
-class InteractObjects(arcade.Sprite):
-    """Is an object that stores a message"""
+def facingTiles(player, tile_size):
+    """Returns the tiles right in front of the player, one for each way it is facing.
+    A tile only counts if the player is standing up against it."""
+    tiles = []
+    reach = player.scale
+    x = player.center_x
+    y = player.center_y
+    column = int(x // tile_size)
+    row = int(y // tile_size)
+    #The player is never turned, so its edges are half its size from its middle.
+    #Working them out is much cheaper than asking the sprite for them.
+    half = player.width / 2
+
+    state = player.model
+    if state.facing_x < 0:
+        edge = round((x - half) / tile_size)
+        if abs(x - half - edge * tile_size) < reach:
+            tiles.append((edge - 1, row))
+    elif state.facing_x > 0:
+        edge = round((x + half) / tile_size)
+        if abs(x + half - edge * tile_size) < reach:
+            tiles.append((edge, row))
+    if state.facing_y < 0:
+        edge = round((y - half) / tile_size)
+        if abs(y - half - edge * tile_size) < reach:
+            tiles.append((column, edge - 1))
+    elif state.facing_y > 0:
+        edge = round((y + half) / tile_size)
+        if abs(y + half - edge * tile_size) < reach:
+            tiles.append((column, edge))
+    return tiles
+
+
+class Interactable(arcade.Sprite):
+    """A sprite the player can use by facing it and pressing Z. Room.facing finds them."""
+    pass
+
+
+class InteractObjects(Interactable):
+    """Shows an object that stores a message. What it says and holds is in .model."""
     def __init__(self, image, scaling, message, otherMessage = None, hasItem = None, lock = False, door = False, breakable = False, disappears = False):
-        super().__init__(image, scaling)
-        self.message = message
+        super().__init__(scale = scaling)
+        self.texture = textures.load(image, scale = scaling)
         self.scaling = scaling
-        self.otherMessage = otherMessage
-        self.hasItem = hasItem
-        self.lock = lock
-        self.door = door
-        self.breakable = breakable
-        self.disappears = disappears
-
-    def changeMessage(self):
-        self.message = self.otherMessage
+        self.model = model.Thing(message, otherMessage, model.ITEMS[hasItem], lock, door, breakable, disappears)
 
     def deliverMessage(self, color):
         """Delivers the object's message when interacted with"""
@@ -24,77 +56,100 @@ class InteractObjects(arcade.Sprite):
         arcade.draw_rectangle_filled(self.screen_width//2, self.text_height//2, self.screen_width, self.text_height, color)
         
         # displays text inside the rectangle.
-        arcade.draw_text(self.message, 20, self.text_height - 35, arcade.color.WHITE, 16)
+        arcade.draw_text(self.model.message, 20, self.text_height - 35, arcade.color.WHITE, 16)
 
 
     def unlock(self):
         """Changes sprite image based if a key is brought to it"""
         
-        self.texture = arcade.load_texture("Images/OpenDoor.png", mirrored = True, scale = self.scaling)
+        self.texture = textures.load("Images/OpenDoor.png", mirrored = True, scale = self.scaling)
 
     def broken(self):
         """Changes sprite image based on if a crowbar is used on it (for crates)"""
 
-        self.texture = arcade.load_texture("Images/broken_scraps.png", mirrored = True, scale = self.scaling)
-
-    def isColliding(self, player):
-        """Takes a player and returns true if this object is in contact with the player"""
-        direction = player.direction
-        if direction[1] == 'LEFT':
-            if abs(player.left - super().right) < player.scale and abs(super().top - player.top) < 4 * player.scale:
-                return True
-        elif direction[1] == 'RIGHT':
-            if abs(super().left - player.right) < player.scale and abs(super().top - player.top) < 4 * player.scale:
-                return True
-        if direction[0] == 'DOWN':
-            if abs(super().top - player.bottom) < player.scale and abs(super().right - player.right) < 4 * player.scale:
-                return True
-        elif direction[0] == 'UP':
-            if abs(super().bottom - player.top) < player.scale and abs(super().right - player.right) < 4 * player.scale:
-                return True
-        else: 
-            return False
-
-class Switch(arcade.Sprite):
+        self.texture = textures.load("Images/broken_scraps.png", mirrored = True, scale = self.scaling)
+
+class Switch(Interactable):
+    """Shows a lever. Which way it points is in .model."""
+    #The image for each way a lever can point
+    images = ('Images/lever_left.png', 'Images/lever_neutral.png', 'Images/lever_right.png', 'Images/lever_broken.png')
+
     def __init__(self, scaling, orientation = 'LEFT'):
+        super().__init__(scale = scaling)
         self.scaling = scaling
-        self.orientation = orientation
-        self.message = None
-
-        if self.orientation != 'BROKEN':
-            super().__init__('Images/lever_left.png', scaling)
-            self.message = 'A lever, but it\'s missing the handle.'
-        else:
-            super().__init__('Images/lever_broken.png', scaling)
+        self.model = model.Lever(model.ORIENTATIONS[orientation])
+        self.texture = textures.load(self.images[self.model.orientation], scale = scaling)
 
     def toggleSwitch(self):
-        if self.orientation != 'BROKEN':
-            if self.orientation == 'LEFT':
-                self.texture = arcade.load_texture("Images/lever_neutral.png",scale = self.scaling)
-                self.orientation = 'NEUTRAL'
-            elif self.orientation == 'NEUTRAL':
-                self.texture = arcade.load_texture("Images/lever_right.png", scale = self.scaling)
-                self.orientation = 'RIGHT'
-            else:
-                self.texture = arcade.load_texture("Images/lever_left.png", scale = self.scaling)
-                self.orientation = 'LEFT'
-
-
-    def isColliding(self, player):
-        """Takes a player and returns true if this object is in contact with the player"""
-        direction = player.direction
-        if direction[1] == 'LEFT':
-            if abs(player.left - super().right) < player.scale and abs(super().top - player.top) < 4 * player.scale:
-                return True
-        elif direction[1] == 'RIGHT':
-            if abs(super().left - player.right) < player.scale and abs(super().top - player.top) < 4 * player.scale:
-                return True
-        if direction[0] == 'DOWN':
-            if abs(super().top - player.bottom) < player.scale and abs(super().right - player.right) < 4 * player.scale:
-                return True
-        elif direction[0] == 'UP':
-            if abs(super().bottom - player.top) < player.scale and abs(super().right - player.right) < 4 * player.scale:
-                return True
-        else: 
-            return False
-        
\ No newline at end of file
+        if self.model.orientation != model.BROKEN:
+            #LEFT -> NEUTRAL -> RIGHT -> LEFT
+            self.setOrientation((self.model.orientation + 1) % 3)
+
+    def repair(self):
+        """Puts the missing handle back on a broken lever"""
+        self.setOrientation(model.LEFT)
+
+    def setOrientation(self, orientation):
+        """Points the lever a certain way, like when a room is loaded back in"""
+        old = self.model.orientation
+        self.model.orientation = orientation
+        self.texture = textures.load(self.images[orientation], scale = self.scaling)
+        self.moved(old)
+
+    def moved(self, old):
+        """Tells the puzzle this lever belongs to that it changed"""
+        if self.model.puzzle is not None:
+            self.model.puzzle.switchMoved(self.model, old)
+
+
+class LeverPuzzle:
+    """Keeps track of a room's levers so the password only gets checked after one moves.
+    The lever positions are stored as one number, two bits per lever."""
+    codes = model.ORIENTATIONS
+
+    def __init__(self):
+        self.switches = []
+        self.state = 0
+        #True when the levers moved since the password was last checked
+        self.changed = True
+        #Password (as a tuple) -> its number, so each password is only encoded once
+        self.targets = {}
+
+    def addSwitch(self, switch):
+        """Adds a lever as the next position of the password"""
+        lever = switch.model
+        lever.puzzle = self
+        lever.slot = len(self.switches)
+        self.switches.append(switch)
+        self.state |= lever.orientation << (2 * lever.slot)
+        self.changed = True
+
+    def switchMoved(self, lever, old):
+        """Updates the stored state for the one lever that moved"""
+        self.state += (lever.orientation - old) << (2 * lever.slot)
+        self.changed = True
+
+    def restore(self, state):
+        """Points every lever the way it was when state was saved"""
+        for switch in self.switches:
+            orientation = (state >> (2 * switch.model.slot)) & 3
+            if orientation != switch.model.orientation:
+                switch.setOrientation(orientation)
+
+    def encode(self, password):
+        """Turns a list of lever orientations into the number the state is compared against"""
+        key = tuple(password)
+        target = self.targets.get(key)
+        if target is None:
+            target = 0
+            for slot, orientation in enumerate(password):
+                target |= self.codes[orientation] << (2 * slot)
+            #A password only matches if it names every lever
+            if len(password) != len(self.switches):
+                target = -1
+            self.targets[key] = target
+        return target
+
+    def matches(self, password):
+        """Returns True if the levers are set to the password"""
+        return self.state == self.encode(password)
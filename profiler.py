@@ -0,0 +1,162 @@
+"""
+Built-in frame profiler.
+
+Times the named phases of each update and each draw (physics, portals, the
+floor layer, the dialogue box, ...) and keeps rolling averages that can be
+drawn on screen, along with counters like how many sprites were culled. Every
+frame can also be written to a CSV file.
+
+Work done between frames, like handling a key press, is counted in the next
+update, which is the tick that acts on it.
+
+Turn it on with the environment variable BILL_PROFILE=1, or press F3 in game.
+Set BILL_PROFILE_CSV=frames.csv to also save every frame.
+"""
+import collections
+import csv
+import os
+import time
+import arcade
+import textcache
+
+#How many drawn frames the numbers on screen stay the same for, so they can be read
+#and only get laid out again a few times a second
+REFRESH_FRAMES = 30
+
+
+class Phase:
+    """Times one phase; used in a with statement"""
+    def __init__(self, times, name):
+        #Phase name -> seconds, of the frame the time goes to
+        self.times = times
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        times = self.times
+        times[self.name] = times.get(self.name, 0) + time.perf_counter() - self.start
+        return False
+
+
+class NoPhase:
+    """Stands in for Phase when the profiler is off, so timing costs nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_PHASE = NoPhase()
+
+
+class FrameProfiler:
+    """Collects phase times per frame and keeps a rolling average of each phase"""
+    def __init__(self, enabled = False, csv_path = None, frames = 120):
+        self.enabled = enabled
+        #(kind, phase name) -> times (in seconds) of the last few frames it ran in. Update and
+        #draw are kept apart, since both have phases with the same name (like 'portals').
+        self.history = collections.defaultdict(lambda: collections.deque(maxlen = frames))
+        #Phase name -> time spent in it so far this frame
+        self.current = {}
+        #Kind -> phase name -> time spent in it between frames, which goes to the next frame of that kind
+        self.upcoming = collections.defaultdict(dict)
+        #Counter name -> its last few values, and the values counted this frame
+        self.counters = collections.defaultdict(lambda: collections.deque(maxlen = frames))
+        self.counted = {}
+        self.frame = 0
+
+        #The overlay's lines, worked out again every REFRESH_FRAMES drawn frames
+        self.lines = []
+        self.drawn = 0
+        self.text = textcache.TextCache(limit = 64)
+
+        self.csv_file = None
+        self.csv_writer = None
+        if csv_path:
+            self.csv_file = open(csv_path, 'w', newline = '', buffering = 1)
+            self.csv_writer = csv.writer(self.csv_file)
+            #value is in ms for phases, and a plain number for counters
+            self.csv_writer.writerow(['frame', 'kind', 'phase', 'value'])
+
+    @classmethod
+    def fromEnvironment(cls):
+        """Makes a profiler set up by BILL_PROFILE and BILL_PROFILE_CSV"""
+        csv_path = os.environ.get('BILL_PROFILE_CSV')
+        enabled = os.environ.get('BILL_PROFILE', '') not in ('', '0') or bool(csv_path)
+        return cls(enabled, csv_path)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.current = {}
+        self.upcoming.clear()
+        self.counted = {}
+        self.lines = []
+
+    def phase(self, name, kind = None):
+        """Returns something to time a phase with: with profiler.phase('physics'): ...
+        Work done between frames gives the kind ('update' or 'draw') of the frame it belongs to."""
+        if not self.enabled:
+            return NO_PHASE
+        return Phase(self.current if kind is None else self.upcoming[kind], name)
+
+    def count(self, name, value):
+        """Records a number for this frame, like how many sprites were culled"""
+        if self.enabled:
+            self.counted[name] = value
+
+    def endFrame(self, kind):
+        """Files away the phases timed since the last frame. kind is 'update' or 'draw'."""
+        if not self.enabled:
+            return
+        for name, seconds in self.upcoming.pop(kind, {}).items():
+            self.current[name] = self.current.get(name, 0) + seconds
+        for name, seconds in self.current.items():
+            self.history[(kind, name)].append(seconds)
+            if self.csv_writer is not None:
+                self.csv_writer.writerow([self.frame, kind, name, round(seconds * 1000, 4)])
+        for name, value in self.counted.items():
+            self.counters[name].append(value)
+            if self.csv_writer is not None:
+                self.csv_writer.writerow([self.frame, kind, name, value])
+        self.current = {}
+        self.counted = {}
+        self.frame += 1
+
+    def averages(self):
+        """Returns ('kind:phase', average ms) pairs, slowest first"""
+        result = [(kind + ':' + name, 1000 * sum(times) / len(times)) for (kind, name), times in self.history.items() if times]
+        result.sort(key = lambda pair: pair[1], reverse = True)
+        return result
+
+    def draw(self, left, top):
+        """Draws the rolling averages in a box with its top left corner at (left, top)"""
+        if not self.enabled:
+            return
+        lines = self.overlay()
+        height = 18 * len(lines) + 10
+        arcade.draw_rectangle_filled(left + 140, top - height / 2, 280, height, (0, 0, 0, 160))
+        for i, line in enumerate(lines):
+            self.text.draw(line, left + 6, top - 18 * (i + 1), arcade.color.WHITE, 11, font_name = ('Courier New', 'Courier'))
+
+    def overlay(self):
+        """Returns the lines the overlay shows, which only change every REFRESH_FRAMES calls"""
+        if self.drawn % REFRESH_FRAMES == 0 or not self.lines:
+            lines = ["{:<18} {:7.3f} ms".format(name, ms) for name, ms in self.averages()]
+            for name, values in sorted(self.counters.items()):
+                if values:
+                    lines.append("{:<18} {:7.1f}".format(name, sum(values) / len(values)))
+            self.lines = lines
+        self.drawn += 1
+        return self.lines
+
+    def close(self):
+        self.text.clear()
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
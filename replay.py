@@ -0,0 +1,160 @@
+"""
+Records the input of a play session and replays it without a window.
+
+A recording is a small binary file: every key and mouse event with the update
+it happened on, followed by how the session ended. Replaying feeds the events
+back into a headless game as fast as possible and checks that it ends the same
+way, so a real playthrough can be rerun after every change.
+
+Record:  python final.py --record walkthrough.rec
+Replay:  python replay.py walkthrough.rec
+"""
+import argparse
+import struct
+import sys
+import time
+
+import headless
+import final
+import model
+
+MAGIC = b'BILLREC'
+VERSION = 1
+
+#Kinds of events
+KEY_PRESS = 0
+KEY_RELEASE = 1
+MOUSE_PRESS = 2
+MOUSE_RELEASE = 3
+
+#magic, version, number of events, number of updates in the session
+HEADER = struct.Struct('<7sBII')
+#update the event happened before, kind, key or x, modifiers or y
+EVENT = struct.Struct('<IBii')
+#state, room, player x, player y, number of items
+OUTCOME = struct.Struct('<bBddB')
+
+
+class InputRecorder:
+    """Collects the input events of a session. Set it as game.recorder to start recording."""
+    def __init__(self):
+        self.events = []
+
+    def keyPress(self, tick, key, modifiers):
+        self.events.append((tick, KEY_PRESS, key, modifiers))
+
+    def keyRelease(self, tick, key, modifiers):
+        self.events.append((tick, KEY_RELEASE, key, modifiers))
+
+    def mousePress(self, tick, x, y):
+        self.events.append((tick, MOUSE_PRESS, int(x), int(y)))
+
+    def mouseRelease(self, tick, x, y):
+        self.events.append((tick, MOUSE_RELEASE, int(x), int(y)))
+
+    def save(self, path, game):
+        """Writes the events and how the game ended to a file"""
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(self.events), game.ticks))
+            for event in self.events:
+                file.write(EVENT.pack(*event))
+            file.write(pack_outcome(outcome(game)))
+
+
+def outcome(game):
+    """Returns what a replay has to match: state, room, player position and inventory"""
+    player = game.player_sprite
+    return (game.state, game.current_room, player.center_x, player.center_y, tuple(model.ITEM_NAMES[item] for item in game.player.items))
+
+
+def pack_outcome(result):
+    state, room, x, y, items = result
+    data = OUTCOME.pack(state, room, x, y, len(items))
+    for item in items:
+        name = item.encode('utf-8')
+        data += struct.pack('<B', len(name)) + name
+    return data
+
+
+def unpack_outcome(data, offset):
+    state, room, x, y, count = OUTCOME.unpack_from(data, offset)
+    offset += OUTCOME.size
+    items = []
+    for i in range(count):
+        length = data[offset]
+        items.append(data[offset + 1:offset + 1 + length].decode('utf-8'))
+        offset += 1 + length
+    return (state, room, x, y, tuple(items))
+
+
+def load(path):
+    """Reads a recording. Returns (events, number of updates, expected outcome)."""
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    magic, version, count, ticks = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("{} is not a recording".format(path))
+    if version != VERSION:
+        raise ValueError("{} is recording version {}, expected {}".format(path, version, VERSION))
+
+    offset = HEADER.size
+    events = [EVENT.unpack_from(data, offset + i * EVENT.size) for i in range(count)]
+    expected = unpack_outcome(data, offset + count * EVENT.size)
+    return events, ticks, expected
+
+
+def replay(events, ticks):
+    """Plays the events back in a headless game and returns the finished game"""
+    game = headless.HeadlessGame()
+    game.setup()
+
+    handlers = {KEY_PRESS: game.on_key_press,
+                KEY_RELEASE: game.on_key_release,
+                MOUSE_PRESS: lambda x, y: game.on_mouse_press(x, y, 1, 0),
+                MOUSE_RELEASE: lambda x, y: game.on_mouse_release(x, y, 1, 0)}
+
+    next_event = 0
+    while game.ticks < ticks or next_event < len(events):
+        #Deliver every event that happened before this update
+        while next_event < len(events) and events[next_event][0] <= game.ticks:
+            tick, kind, first, second = events[next_event]
+            handlers[kind](first, second)
+            next_event += 1
+        if game.ticks < ticks:
+            game.step()
+    return game
+
+
+def matches(result, expected):
+    """Compares two outcomes, allowing for rounding in the player position"""
+    return (result[0] == expected[0] and result[1] == expected[1] and result[4] == expected[4]
+            and abs(result[2] - expected[2]) < 1e-6 and abs(result[3] - expected[3]) < 1e-6)
+
+
+def main():
+    """Replays recordings and checks they end the way they did when recorded"""
+    parser = argparse.ArgumentParser(description = "Replay recorded sessions without a window.")
+    parser.add_argument('recordings', nargs = '+', help = "files written by final.py --record")
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.recordings:
+        events, ticks, expected = load(path)
+        start = time.perf_counter()
+        game = replay(events, ticks)
+        elapsed = time.perf_counter() - start
+
+        result = outcome(game)
+        if matches(result, expected):
+            print("{}: ok, {} updates in {:.1f}ms".format(path, ticks, elapsed * 1000))
+        else:
+            failed += 1
+            print("{}: MISMATCH after {} updates".format(path, ticks))
+            print("  expected {}".format(expected))
+            print("  got      {}".format(result))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
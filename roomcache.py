@@ -0,0 +1,140 @@
+"""
+Builds rooms when they are first needed and lets go of rooms nobody is in.
+
+Only the room the player is in (and rooms left recently) are kept built. A room
+that has been left alone for a while is evicted: its sprites are freed and all
+that's kept is a small snapshot of what the player changed in it (opened doors,
+taken items, levers, solved passwords). Going back into it builds it again from
+its level file and puts the snapshot back.
+
+Rooms next to the player can also be prefetched: built on a worker thread
+before the player gets there, so walking through the door only has to swap
+rooms. Building a room never touches GL (every texture a room uses is preloaded,
+see final.all_textures, and the static layer is only composed, not uploaded), so
+it is safe off the main thread. If a texture was missed, the texture registry
+raises TextureError on the worker rather than load it there, and the room is
+built on the main thread instead.
+"""
+import concurrent.futures
+
+import textures
+
+
+class RoomCache:
+    """Acts like the list of rooms, but builds each room the first time it is looked up"""
+    def __init__(self, builders, keep_time = 30.0, workers = 1):
+        #One function per room that builds it from scratch
+        self.builders = builders
+        #Seconds a room stays built after the player leaves it
+        self.keep_time = keep_time
+
+        #Room number -> built room
+        self.built = {}
+        #Room number -> snapshot of a room that was evicted
+        self.snapshots = {}
+        #Room number -> game clock the room was last in use
+        self.last_used = {}
+        self.clock = 0.0
+
+        #Room number -> future of a room being built in the background
+        self.pending = {}
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers = workers, thread_name_prefix = 'rooms')
+
+        self.builds = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.builders)
+
+    def __getitem__(self, index):
+        room = self.built.get(index)
+        if room is None:
+            if index in self.pending:
+                #Already on its way, so wait for it rather than building it twice
+                room = self.install(index, self.finish(index, self.pending.pop(index)))
+            else:
+                room = self.install(index, self.make(index, self.snapshots.get(index)))
+        return room
+
+    def isBuilt(self, index):
+        return index in self.built
+
+    def make(self, index, snapshot, prepare = False, entrance = None):
+        """Builds a room, putting back its snapshot if it was evicted before. Runs on any thread.
+        With prepare the room also does the work it would otherwise do the first time it's drawn,
+        around the entrance if one is given."""
+        room = self.builders[index]()
+        if snapshot is not None:
+            room.restore(snapshot)
+        if prepare:
+            room.prepare(entrance)
+        return room
+
+    def finish(self, index, future):
+        """Returns a room built in the background, or builds it here if it needed a texture
+        that only the main thread can load"""
+        try:
+            return future.result()
+        except textures.TextureError:
+            return self.make(index, self.snapshots.get(index))
+
+    def install(self, index, room):
+        """Makes a built room the one handed out for index"""
+        self.snapshots.pop(index, None)
+        self.built[index] = room
+        self.last_used[index] = self.clock
+        self.builds += 1
+        return room
+
+    def prefetch(self, index, entrance = None):
+        """Starts building a room in the background, unless it's already built or on its way"""
+        if index in self.built or index in self.pending:
+            return
+        self.pending[index] = self.pool.submit(self.make, index, self.snapshots.get(index), True, entrance)
+
+    def collect(self):
+        """Installs the rooms that finished building in the background"""
+        for index, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[index]
+                self.install(index, self.finish(index, future))
+
+    def evict(self, index):
+        """Frees a room, keeping only a snapshot of its state"""
+        room = self.built.pop(index)
+        self.snapshots[index] = room.snapshot()
+        room.release()
+        self.evictions += 1
+
+    def restore(self, snapshots):
+        """Puts every room back the way snapshots (room number -> snapshot) says, without
+        building any. Built rooms are changed in place, and the others keep their snapshot
+        until they're needed. A room with no snapshot goes back to how it started."""
+        #Rooms still being built in the background were made from the old state
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        for index, room in self.built.items():
+            room.restore(snapshots.get(index, room.initial))
+        self.snapshots = {index: snapshot for index, snapshot in snapshots.items() if index not in self.built}
+
+    def everySnapshot(self):
+        """Returns room number -> snapshot for every room that was ever built"""
+        snapshots = dict(self.snapshots)
+        for index, room in self.built.items():
+            snapshots[index] = room.snapshot()
+        return snapshots
+
+    def update(self, delta_time, current):
+        """Moves the clock on, installs prefetched rooms and evicts rooms that
+        have been left for longer than keep_time"""
+        self.collect()
+        self.clock += delta_time
+        self.last_used[current] = self.clock
+        for index in list(self.built):
+            if index != current and self.clock - self.last_used[index] > self.keep_time:
+                self.evict(index)
+
+    def snapshotSize(self):
+        """How many bytes the snapshots of evicted rooms take up"""
+        return sum(len(snapshot) for snapshot in self.snapshots.values())
@@ -0,0 +1,164 @@
+"""
+Saves the player's progress and loads it back.
+
+A save is a small binary file: the fingerprint (sha1) of every level file,
+which screen and room the player is in, where they stand, which way they face
+and what they carry, then the Room.snapshot of every room that was built
+(opened doors, taken items, smashed crates, levers, passwords and secret items
+left). Nothing else is stored, since the rest comes from the level files, so a
+save made before a level file changed can't be loaded.
+
+Every snapshot is checked against its level before anything is changed, so a
+save that can't be loaded raises SaveError and leaves the game as it was.
+
+Loading never runs setup again or rebuilds rooms. Rooms that are built get
+their snapshot put back in place, and the others keep it until the player goes
+in, like rooms the RoomCache evicted.
+
+python final.py --save progress.sav    starts from progress.sav if it's there, and saves to it on exit
+"""
+import struct
+import time
+
+import final
+import levels
+import model
+
+MAGIC = b'BILLSAV'
+#Bump this when the format changes, or when Room.SNAPSHOT does
+VERSION = 3
+
+#magic, version, number of level files
+HEADER = struct.Struct('<7sBB')
+#sha1 of a level file, one for each
+LEVEL = struct.Struct('<20s')
+#state, room, player x, player y, facing x, facing y, number of items
+PLAYER = struct.Struct('<bBddbbB')
+#number of rooms
+ROOMS = struct.Struct('<B')
+#room number, length of its snapshot
+ROOM = struct.Struct('<BI')
+
+#Screens a save can be made on
+STATES = (final.START, final.GAME, final.DIALOGUE, final.INVENTORY, final.INSTRUCTIONS, final.GAME_OVER)
+
+#The dialogue box and inventory need what was open at the time, so they load into the game
+LOADS_AS = {final.DIALOGUE: final.GAME, final.INVENTORY: final.GAME}
+
+
+class SaveError(ValueError):
+    """A file that isn't a save this version of the game can load"""
+    pass
+
+
+def dump(game):
+    """Packs the game's progress into bytes"""
+    player = game.player_sprite
+    state = game.player
+    data = [HEADER.pack(MAGIC, VERSION, len(final.LEVELS))]
+    data.extend(LEVEL.pack(levels.fingerprint(path)) for path in final.LEVELS)
+    data.append(PLAYER.pack(game.state, game.current_room, player.center_x, player.center_y,
+                            state.facing_x, state.facing_y, len(state.items)))
+    data.append(bytes(state.items))
+
+    snapshots = game.rooms.everySnapshot()
+    data.append(ROOMS.pack(len(snapshots)))
+    for index, snapshot in sorted(snapshots.items()):
+        data.append(ROOM.pack(index, len(snapshot)))
+        data.append(snapshot)
+    return b''.join(data)
+
+
+def parse(data):
+    """Reads bytes from dump and checks them against the level files.
+    Returns (state, room, x, y, facing x, facing y, items, room number -> snapshot)."""
+    try:
+        magic, version, level_count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise SaveError("not a save file")
+        if version != VERSION:
+            raise SaveError("the save is version {}, but this game loads version {}".format(version, VERSION))
+        offset = HEADER.size
+        if level_count != len(final.LEVELS):
+            raise SaveError("the save has {} rooms but this game has {}".format(level_count, len(final.LEVELS)))
+        for path in final.LEVELS:
+            fingerprint, = LEVEL.unpack_from(data, offset)
+            offset += LEVEL.size
+            if fingerprint != levels.fingerprint(path):
+                raise SaveError("{} changed since the game was saved".format(path))
+
+        state, room, x, y, facing_x, facing_y, count = PLAYER.unpack_from(data, offset)
+        offset += PLAYER.size
+        items = bytes(data[offset:offset + count])
+        offset += count
+
+        rooms, = ROOMS.unpack_from(data, offset)
+        offset += ROOMS.size
+        snapshots = {}
+        for i in range(rooms):
+            index, length = ROOM.unpack_from(data, offset)
+            offset += ROOM.size
+            snapshots[index] = bytes(data[offset:offset + length])
+            offset += length
+            if len(snapshots[index]) != length:
+                raise SaveError("the save is cut short")
+    except struct.error:
+        raise SaveError("the save is cut short")
+
+    if len(items) != count:
+        raise SaveError("the save is cut short")
+    if state not in STATES:
+        raise SaveError("the save is on a screen this game doesn't have")
+    if any(item == model.NO_ITEM or item >= len(model.ITEM_NAMES) for item in items):
+        raise SaveError("the save holds an unknown item")
+    if room >= len(final.LEVELS) or any(index >= len(final.LEVELS) for index in snapshots):
+        raise SaveError("the save has rooms this game doesn't")
+    for index, snapshot in snapshots.items():
+        try:
+            final.Room.readSnapshot(snapshot, *final.snapshot_limits(levels.load(final.LEVELS[index])))
+        except ValueError as error:
+            raise SaveError("room {}: {}".format(index + 1, error))
+    return (state, room, x, y, facing_x, facing_y, items, snapshots)
+
+
+def restore(game, data):
+    """Puts a game that has been set up back to the progress in data"""
+    state, room, x, y, facing_x, facing_y, items, snapshots = parse(data)
+    game.rooms.restore(snapshots)
+    game.change_room(room)
+
+    player = game.player_sprite
+    player.center_x, player.center_y = x, y
+    player.change_x = 0
+    player.change_y = 0
+    game.player.stop()
+    game.player.facing_x = facing_x
+    game.player.facing_y = facing_y
+    game.player.useObject = False
+    game.player.canUsePortal = True
+    player.inventory.setItems(items)
+    player.update_animation()
+
+    game.current_message = None
+    game.onCrate = False
+    game.state = LOADS_AS.get(state, state)
+
+    #Nothing to blend the player's position from, and the screen needs drawing
+    game.previous = None
+    game.accumulator = 0.0
+    current = game.rooms[room]
+    game.camera.follow(player, current.width, current.height)
+    game.dirty = True
+
+
+def save(path, game):
+    with open(path, 'wb') as file:
+        file.write(dump(game))
+
+
+def load(path, game):
+    """Loads a save file into game. Returns how many seconds it took."""
+    started = time.perf_counter()
+    with open(path, 'rb') as file:
+        restore(game, file.read())
+    return time.perf_counter() - started
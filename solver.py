@@ -0,0 +1,334 @@
+"""
+Proves rooms can be finished, and finds the fewest Z presses to do it.
+
+The solver doesn't move the player tile by tile. Walking is free, so all that
+matters is which walkable region the player is in (navigation.NavGraph). The
+rest of a state is what has changed: the inventory, which objects still block
+the way or still hold an item, which doors are locked, how the levers point and
+how many passwords are left. Each state is searched once (states are hashed),
+cheapest first, until the player can reach a way out of the room.
+
+Levers are not tried one toggle at a time, which would mean 3 to the power of
+the number of levers states. Only the first password left gets checked, so the
+only useful thing to do with levers is to set the ones the player can reach to
+that password.
+
+python solver.py          checks every room of the game
+"""
+import argparse
+import heapq
+import itertools
+import os
+import sys
+import time
+
+import headless
+import final
+import model
+import navigation
+import objects
+import textures
+
+#Lever orientations in the order pressing Z moves through them
+CYCLE = model.ORIENTATION_NAMES[:3]
+BROKEN = model.BROKEN
+
+#What is known about each object in a state
+IN_WALLS, IN_OBJECTS, HAS_ITEM, LOCKED, BREAKABLE = range(5)
+
+
+class Action:
+    """One thing the player does: use an object, or move or repair levers.
+    presses lists (tile to stand on, tile to face, times to press Z)."""
+    def __init__(self, kind, what, presses):
+        self.kind = kind
+        self.what = what
+        self.presses = presses
+        self.stand = presses[-1][0]
+
+    def count(self):
+        return sum(times for stand, target, times in self.presses)
+
+    def __str__(self):
+        if self.kind == 'use':
+            return "use the {} from {}".format(self.what, self.stand)
+        if self.kind == 'repair':
+            return "repair {} from {}".format(self.what, self.stand)
+        return self.what
+
+
+class Solution:
+    """The cheapest way through a room, and how much searching it took"""
+    def __init__(self, actions, presses, states, seconds):
+        self.actions = actions
+        self.presses = presses
+        self.states = states
+        self.seconds = seconds
+
+
+class RoomSolver:
+    """Searches the states of one room, starting from a tile"""
+    def __init__(self, room, start, tile_size = final.SPRITE_SIZE):
+        self.room = room
+        self.start = start
+        self.tile_size = tile_size
+
+        #Objects and secret items, in level order, and the tiles they cover
+        self.things = [thing for thing in room.things if isinstance(thing, objects.InteractObjects)]
+        self.covers = [navigation.coveredTiles(thing.left, thing.right, thing.bottom, thing.top, tile_size) for thing in self.things]
+        self.secrets = [self.things.index(thing) for thing in room.secret_item]
+
+        #Walls that never go away, like the maze and the levers
+        self.fixed = set()
+        for sprite in room.wall_list:
+            if sprite not in self.things:
+                self.fixed.update(navigation.coveredTiles(sprite.left, sprite.right, sprite.bottom, sprite.top, tile_size))
+        self.portals = [((int(portal.start_x // tile_size), int(portal.start_y // tile_size)),
+                         (int(portal.end_x // tile_size), int(portal.end_y // tile_size))) for portal in room.portal_list]
+
+        self.switches = list(room.puzzle.switches)
+        self.lever_tiles = [navigation.coveredTiles(switch.left, switch.right, switch.bottom, switch.top, tile_size) for switch in self.switches]
+
+        password = room.password
+        if password != [] and type(password[0]) != list:
+            password = [password]
+        self.passwords = [room.puzzle.encode(combination) for combination in password]
+
+        #Which objects block the way -> the graph of the room like that
+        self.graphs = {}
+
+    def graph(self, walls):
+        """Returns the navigation graph with the given objects (a bit per object) in the way"""
+        graph = self.graphs.get(walls)
+        if graph is None:
+            blocked = set(self.fixed)
+            for index, tiles in enumerate(self.covers):
+                if walls >> index & 1:
+                    blocked.update(tiles)
+            graph = navigation.NavGraph(int(self.room.width // self.tile_size),
+                                        int(self.room.height // self.tile_size), blocked, self.portals)
+            self.graphs[walls] = graph
+        return graph
+
+    def wallBits(self, things):
+        bits = 0
+        for index, thing in enumerate(things):
+            if thing[IN_WALLS]:
+                bits |= 1 << index
+        return bits
+
+    def place(self, graph, tile):
+        """The tile that stands for the region a tile is in, so states in the same region match"""
+        return graph.tile(graph.region_start[graph.regionOf(*tile)])
+
+    def name(self, index):
+        """Describes an object by its picture and where it is, like 'bed at (1, 1)'"""
+        path, mirrored = textures.registry.sources[self.things[index].texture.texture_id]
+        return "{} at {}".format(os.path.splitext(os.path.basename(path))[0], self.covers[index][0])
+
+    def startState(self):
+        things = []
+        for index, thing in enumerate(self.things):
+            released = index not in self.secrets
+            things.append((released, released, thing.model.item, thing.model.lock, thing.model.breakable))
+        state = (None, (), tuple(things), self.room.puzzle.state, len(self.passwords))
+        #The game checks the password on its first update
+        state = self.checkPassword(state)
+        graph = self.graph(self.wallBits(state[2]))
+        return (self.place(graph, self.start),) + state[1:]
+
+    def checkPassword(self, state):
+        """Releases the secret items of every password the levers match, like Game.update"""
+        place, inventory, things, levers, left = state
+        things = list(things)
+        while left > 0 and levers == self.passwords[len(self.passwords) - left]:
+            solved = len(self.passwords) - left
+            if solved < len(self.secrets):
+                secret = self.secrets[solved]
+                things[secret] = (True, True) + things[secret][2:]
+            left -= 1
+        return (place, inventory, tuple(things), levers, left)
+
+    def use(self, state, index):
+        """What using an object does, following Game.interact. Returns None if nothing happens."""
+        place, inventory, things, levers, left = state
+        in_walls, in_objects, item, lock, breakable = things[index]
+        inventory = list(inventory)
+
+        if item != model.NO_ITEM and not breakable:
+            if item != model.KEY or self.things[index].model.disappears:
+                in_walls = in_objects = False
+            inventory.append(item)
+            item = model.NO_ITEM
+        if lock and model.KEY in inventory:
+            lock = False
+            in_walls = in_objects = False
+            inventory.remove(model.KEY)
+        if breakable and model.CROWBAR in inventory and item == model.KEY:
+            item = model.NO_ITEM
+            breakable = False
+            in_walls = in_objects = False
+            inventory.remove(model.CROWBAR)
+            inventory.append(model.KEY)
+
+        after = (in_walls, in_objects, item, lock, breakable)
+        if after == things[index]:
+            return None
+        things = things[:index] + (after,) + things[index + 1:]
+        return (place, tuple(sorted(inventory)), things, levers, left)
+
+    def facing(self, stand, tiles):
+        """The tile of tiles right next to where the player stands"""
+        for x, y in tiles:
+            if abs(x - stand[0]) + abs(y - stand[1]) == 1:
+                return (x, y)
+
+    def approach(self, graph, tiles, reach):
+        """The regions (each with one tile to stand on) the player can use something from"""
+        found = {}
+        for tile in graph.beside(tiles):
+            region = graph.regionOf(*tile)
+            if reach >> region & 1 and region not in found:
+                found[region] = tile
+        return list(found.values())
+
+    def moves(self, state):
+        """Yields (action, next state) for everything worth doing in a state. The player
+        ends up where they stood for the last Z press."""
+        place, inventory, things, levers, left = state
+        graph = self.graph(self.wallBits(things))
+        reach = graph.reachableRegions(place)
+
+        for index, thing in enumerate(things):
+            if not thing[IN_OBJECTS]:
+                continue
+            after = self.use(state, index)
+            if after is None:
+                continue
+            for stand in self.approach(graph, self.covers[index], reach):
+                yield Action('use', self.name(index), [(stand, self.facing(stand, self.covers[index]), 1)]), after
+
+        for slot, tiles in enumerate(self.lever_tiles):
+            code = levers >> (2 * slot) & 3
+            if code == BROKEN and model.BROKEN_LEVER in inventory:
+                repaired = list(inventory)
+                repaired.remove(model.BROKEN_LEVER)
+                after = (place, tuple(repaired), things, levers - (BROKEN << (2 * slot)), left)
+                for stand in self.approach(graph, tiles, reach):
+                    yield Action('repair', "lever {}".format(slot + 1), [(stand, self.facing(stand, tiles), 1)]), self.checkPassword(after)
+
+        target = self.passwords[len(self.passwords) - left] if left > 0 else -1
+        #A password that doesn't name every lever can never be matched
+        if target >= 0:
+            #Levers the player can reach from each region, and how they need to move
+            groups = {}
+            for slot, tiles in enumerate(self.lever_tiles):
+                code = levers >> (2 * slot) & 3
+                wanted = target >> (2 * slot) & 3
+                if code == wanted or code == BROKEN or wanted == BROKEN:
+                    continue
+                for stand in self.approach(graph, tiles, reach):
+                    groups.setdefault(graph.regionOf(*stand), []).append((slot, code, wanted, stand))
+            for region, levers_here in groups.items():
+                after = levers
+                presses = []
+                steps = []
+                for slot, code, wanted, stand in levers_here:
+                    times = (wanted - code) % 3
+                    after += (wanted - code) << (2 * slot)
+                    presses.append((stand, self.facing(stand, self.lever_tiles[slot]), times))
+                    steps.append("pull lever {} to {} from {}".format(slot + 1, CYCLE[wanted], stand))
+                yield Action('levers', ', '.join(steps), presses), self.checkPassword((place, inventory, things, after, left))
+
+    def solved(self, state):
+        """The player is done once they can walk out of the room"""
+        place, inventory, things, levers, left = state
+        graph = self.graph(self.wallBits(things))
+        return any(graph.reachable(place, tile) for tile in graph.exits())
+
+    def solve(self):
+        """Returns the Solution with the fewest Z presses, or None if the room can't be finished"""
+        started = time.perf_counter()
+        start = self.startState()
+        cost = {start: 0}
+        came_from = {start: None}
+        order = itertools.count()
+        queue = [(0, next(order), start)]
+        explored = 0
+
+        while queue:
+            presses, _, state = heapq.heappop(queue)
+            if presses > cost[state]:
+                continue
+            explored += 1
+            if self.solved(state):
+                actions = []
+                while came_from[state] is not None:
+                    state, action = came_from[state]
+                    actions.append(action)
+                actions.reverse()
+                return Solution(actions, presses, explored, time.perf_counter() - started)
+
+            for action, after in self.moves(state):
+                graph = self.graph(self.wallBits(after[2]))
+                after = (self.place(graph, action.stand),) + after[1:]
+                total = presses + action.count()
+                if total < cost.get(after, total + 1):
+                    cost[after] = total
+                    came_from[after] = (state, action)
+                    heapq.heappush(queue, (total, next(order), after))
+        return None
+
+
+def entrance(index, tile_size = final.SPRITE_SIZE):
+    """The tile the player starts from in a room: the start of the game for the
+    first room, otherwise where they come in from a room leading to it"""
+    if index == 0:
+        return (final.PLAYER_START[0] // tile_size, final.PLAYER_START[1] // tile_size)
+    room = final.ROOM_BUILDERS[index]()
+    graph = room.navigation()
+    #Leaving a room by one edge comes in by the opposite edge of the next room
+    sides = {'UP': [(x, 0) for x in range(graph.width)],
+             'DOWN': [(x, graph.height - 1) for x in range(graph.width)],
+             'RIGHT': [(0, y) for y in range(graph.height)],
+             'LEFT': [(graph.width - 1, y) for y in range(graph.height)]}
+    for other, exits in sorted(final.ROOM_EXITS.items()):
+        for edge, leads_to in exits.items():
+            if leads_to == index:
+                for x, y in sides[edge]:
+                    if graph.isOpen(x, y):
+                        return (x, y)
+    return None
+
+
+def solve_room(index):
+    """Builds a room and solves it from its entrance"""
+    start = entrance(index)
+    if start is None:
+        return None
+    return RoomSolver(final.ROOM_BUILDERS[index](), start).solve()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Check every room can be finished.")
+    parser.add_argument('rooms', type = int, nargs = '*', help = "room numbers to check (all of them by default)")
+    args = parser.parse_args()
+
+    #Rooms are built from image sizes only
+    headless.enable()
+    failed = 0
+    for index in args.rooms or range(len(final.ROOM_BUILDERS)):
+        solution = solve_room(index)
+        if solution is None:
+            failed += 1
+            print("room {}: can't be finished".format(index + 1))
+            continue
+        print("room {}: {} Z presses, {} states searched in {:.1f}ms".format(
+            index + 1, solution.presses, solution.states, solution.seconds * 1000))
+        for step, action in enumerate(solution.actions, 1):
+            print("  {:2}. {}".format(step, action))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Tile-based lookups for sprites.
+
+Everything in a room sits on the SPRITE_SIZE grid, so instead of testing the
+player against every sprite in a list we remember which tiles each sprite
+covers and only look at the sprites on the tiles around the player.
+"""
+import math
+import arcade
+
+
+class TileIndex:
+    """Maps each tile (tile_x, tile_y) to the sprites that overlap it"""
+    def __init__(self, tile_size):
+        self.tile_size = tile_size
+        self.tiles = {}
+        #sprite -> the tiles it was filed under, so it can be removed even if it moved
+        self.placed = {}
+
+    def __len__(self):
+        return len(self.placed)
+
+    def __contains__(self, sprite):
+        return sprite in self.placed
+
+    def tileRange(self, left, right, bottom, top):
+        """Returns the first and last tile columns and rows a box touches, counting the
+        tiles its edges only touch, so lookups never miss a sprite"""
+        size = self.tile_size
+        return (int(math.floor(left / size)), int(math.floor(right / size)),
+                int(math.floor(bottom / size)), int(math.floor(top / size)))
+
+    def coveredRange(self, left, right, bottom, top):
+        """Returns the first and last tile columns and rows a box covers. A box that ends
+        exactly on a tile edge doesn't cover the next tile, so a sprite one tile big
+        covers just its own tile."""
+        first_x, last_x, first_y, last_y = self.tileRange(left, right, bottom, top)
+        size = self.tile_size
+        return (first_x, max(first_x, int(math.ceil(right / size)) - 1),
+                first_y, max(first_y, int(math.ceil(top / size)) - 1))
+
+    def insert(self, sprite):
+        """Files a sprite under every tile it covers"""
+        first_x, last_x, first_y, last_y = self.coveredRange(sprite.left, sprite.right, sprite.bottom, sprite.top)
+        keys = []
+        for x in range(first_x, last_x + 1):
+            for y in range(first_y, last_y + 1):
+                self.tiles.setdefault((x, y), []).append(sprite)
+                keys.append((x, y))
+        self.placed[sprite] = keys
+
+    def remove(self, sprite):
+        """Takes a sprite out of the index"""
+        for key in self.placed.pop(sprite):
+            occupants = self.tiles[key]
+            occupants.remove(sprite)
+            if not occupants:
+                del self.tiles[key]
+
+    def atTile(self, tile_x, tile_y):
+        """Returns the sprites covering a single tile"""
+        return self.tiles.get((tile_x, tile_y), [])
+
+    def query(self, left, right, bottom, top):
+        """Returns every sprite covering a tile that the box touches, each one once"""
+        first_x, last_x, first_y, last_y = self.tileRange(left, right, bottom, top)
+        found = []
+        for x in range(first_x, last_x + 1):
+            for y in range(first_y, last_y + 1):
+                for sprite in self.tiles.get((x, y), ()):
+                    if sprite not in found:
+                        found.append(sprite)
+        return found
+
+    def near(self, sprite, margin = 0):
+        """Returns the sprites on the tiles around a sprite"""
+        return self.query(sprite.left - margin, sprite.right + margin, sprite.bottom - margin, sprite.top + margin)
+
+    def collisions(self, sprite):
+        """Same result as arcade.check_for_collision_with_list, but only tests nearby sprites"""
+        return [other for other in self.near(sprite) if other is not sprite and arcade.check_for_collision(sprite, other)]
+
+
+def overlaps(sprite, left, right, bottom, top):
+    """True if a sprite overlaps a box. Touching edges don't count, like arcade.check_for_collision."""
+    return sprite.right > left and sprite.left < right and sprite.top > bottom and sprite.bottom < top
+
+
+class TilePhysicsEngine:
+    """
+    Moves the player through the walls of a room, one axis at a time.
+
+    It is made once for the whole game. Changing rooms only hands it the new
+    room's wall index, and portals move the player with teleport(). The walls
+    are read from the room's TileIndex, which the room keeps up to date as doors
+    open and crates break, so the engine never has to rescan a list of walls.
+
+    Each move is swept: the walls between where the player is and where it is
+    going are checked, not just the ones at the end. So the player can't pass
+    through a wall, however fast it moves.
+    """
+    def __init__(self, player_sprite, walls = None):
+        self.player_sprite = player_sprite
+        self.walls = walls
+        self.teleports = 0
+
+    def setWalls(self, walls):
+        """Moves the engine into another room, given that room's wall index"""
+        self.walls = walls
+
+    def teleport(self, left, bottom):
+        """Puts the player somewhere else in the room, without moving through what's between"""
+        self.player_sprite.left = left
+        self.player_sprite.bottom = bottom
+        self.teleports += 1
+
+    def blocking(self, left, right, bottom, top):
+        """Returns the walls that overlap a box"""
+        return [wall for wall in self.walls.query(left, right, bottom, top) if overlaps(wall, left, right, bottom, top)]
+
+    def update(self):
+        """Move the player and stop it at the first wall in its way"""
+        player = self.player_sprite
+        if self.walls is None:
+            player.center_x += player.change_x
+            player.center_y += player.change_y
+            return
+
+        # --- Move in the x direction
+        change = player.change_x
+        if change:
+            old_left, old_right = player.left, player.right
+            player.center_x += change
+            #The box the player swept through, from where it was to where it is
+            if change > 0:
+                walls = self.blocking(min(player.left, old_right), player.right, player.bottom, player.top)
+                if walls:
+                    player.right = min(player.right, min(wall.left for wall in walls))
+            else:
+                walls = self.blocking(player.left, max(player.right, old_left), player.bottom, player.top)
+                if walls:
+                    player.left = max(player.left, max(wall.right for wall in walls))
+
+        # --- Move in the y direction
+        change = player.change_y
+        if change:
+            old_bottom, old_top = player.bottom, player.top
+            player.center_y += change
+            if change > 0:
+                walls = self.blocking(player.left, player.right, min(player.bottom, old_top), player.top)
+                if walls:
+                    player.top = min(player.top, min(wall.bottom for wall in walls))
+            else:
+                walls = self.blocking(player.left, player.right, player.bottom, max(player.top, old_bottom))
+                if walls:
+                    player.bottom = max(player.bottom, max(wall.top for wall in walls))
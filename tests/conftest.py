@@ -0,0 +1,45 @@
+"""
+What the tests share: the project folder on the path, and games to test with.
+
+Test modules import this first, before anything imports arcade, so the tests
+run with no display. pytest also loads it by itself.
+
+Run from the project folder with: python -m unittest discover tests
+or: python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import headless
+import final
+import arcade
+
+
+def new_game():
+    """A headless game that has been set up and started in room 1"""
+    game = headless.HeadlessGame()
+    game.setup()
+    game.start_game()
+    return game
+
+
+def stand(game, tile):
+    """Puts the player's bottom left corner on a tile"""
+    game.player_sprite.left = tile[0] * final.SPRITE_SIZE
+    game.player_sprite.bottom = tile[1] * final.SPRITE_SIZE
+
+
+def play(game, actions):
+    """Does what solver.RoomSolver says: stands on each tile, faces the target and presses Z"""
+    for action in actions:
+        for start, target, times in action.presses:
+            stand(game, start)
+            game.player.facing_x = (target[0] > start[0]) - (target[0] < start[0])
+            game.player.facing_y = (target[1] > start[1]) - (target[1] < start[1])
+            for i in range(times):
+                game.press(arcade.key.Z)
+                game.release(arcade.key.Z)
+                game.step()
+                #Close the dialogue box the press opened
+                game.state = final.GAME
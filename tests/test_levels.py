@@ -0,0 +1,108 @@
+"""
+Compiling level files with levels.compileLevel, and the mistakes it catches.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import conftest
+import levels
+
+
+def level(**changes):
+    """A small valid level, with some of its keys changed"""
+    spec = {'size': [4, 3],
+            'wall': 'Images/RogueSprites/block1.png',
+            'map': ["####",
+                    "#...",
+                    "####"],
+            'exits': ['RIGHT'],
+            'portals': [[1, 1, 2, 1]],
+            'objects': [{'kind': 'object', 'image': 'Images/note.png', 'at': [1, 1], 'message': "Hi"},
+                        {'kind': 'switch', 'at': [2, 1], 'orientation': 'RIGHT'}],
+            'password': ['LEFT'],
+            'secrets': [{'image': 'Images/key.png', 'at': [3, 1], 'message': "A key", 'hasItem': 'KEY'}]}
+    spec.update(changes)
+    return json.dumps(spec).encode('utf-8')
+
+
+class Compiling(unittest.TestCase):
+    def test_a_level_compiles_to_tuples(self):
+        compiled = levels.compileLevel('room.json', level())
+        self.assertEqual(compiled['size'], (4, 3))
+        #Rows are counted from the bottom
+        self.assertEqual(compiled['walls'][:4], ((0, 0), (1, 0), (2, 0), (3, 0)))
+        self.assertNotIn((3, 1), compiled['walls'])
+        self.assertEqual(compiled['exits'], ('RIGHT',))
+        self.assertEqual(compiled['portals'], ((1, 1, 2, 1),))
+        self.assertEqual(compiled['objects'][1], ('switch', None, 2, 1, {'orientation': 'RIGHT'}))
+        self.assertEqual(compiled['secrets'][0][4]['hasItem'], 'KEY')
+
+
+class Mistakes(unittest.TestCase):
+    def assertRefused(self, source, words):
+        with self.assertRaises(levels.LevelError) as caught:
+            levels.compileLevel('room.json', source)
+        self.assertIn('room.json', str(caught.exception))
+        self.assertIn(words, str(caught.exception))
+
+    def test_not_json(self):
+        self.assertRefused(b'{"size": ', 'room.json')
+
+    def test_missing_keys(self):
+        source = json.loads(level().decode('utf-8'))
+        del source['wall']
+        self.assertRefused(json.dumps(source).encode('utf-8'), "no 'wall'")
+
+    def test_bad_sizes(self):
+        for size in ([4], [4, 3, 1], "4x3", [4, 1.5], [0, 3], None):
+            self.assertRefused(level(size = size), "size")
+
+    def test_map_of_the_wrong_size(self):
+        self.assertRefused(level(size = [5, 3]), "3 rows of 5 tiles")
+
+    def test_unknown_exit(self):
+        self.assertRefused(level(exits = ['NORTH']), "'NORTH' isn't an edge")
+
+    def test_bad_portal(self):
+        self.assertRefused(level(portals = [[1, 1, 2]]), "a portal is")
+
+    def test_bad_objects(self):
+        cases = (({'kind': 'statue', 'at': [1, 1]}, "unknown kind"),
+                 ({'kind': 'switch', 'at': [1, 1], 'message': "Hi"}, "can't have 'message'"),
+                 ({'kind': 'door', 'at': [1, 1]}, "has no message"),
+                 ({'at': [1, 1], 'message': "Hi", 'hasItem': 'SWORD'}, "unknown item 'SWORD'"),
+                 ({'kind': 'switch', 'at': [1, 1], 'orientation': 'UP'}, "can't point 'UP'"))
+        for spec, words in cases:
+            self.assertRefused(level(objects = [spec]), words)
+
+
+class Caching(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'room.json')
+        with open(self.path, 'wb') as file:
+            file.write(level())
+        levels.loaded.pop(self.path, None)
+
+    def tearDown(self):
+        levels.loaded.pop(self.path, None)
+        shutil.rmtree(self.folder)
+
+    def test_the_cache_is_used_until_the_file_changes(self):
+        first = levels.load(self.path)
+        self.assertTrue(os.path.exists(levels.cachePath(self.path)))
+        levels.loaded.pop(self.path)
+        self.assertEqual(levels.load(self.path), first)
+
+        with open(self.path, 'wb') as file:
+            file.write(level(exits = ['UP']))
+        self.assertEqual(levels.load(self.path)['exits'], ('UP',))
+
+
+if __name__ == '__main__':
+    unittest.main()
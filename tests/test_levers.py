@@ -0,0 +1,84 @@
+"""
+Pulling levers and checking the lever password, without a window.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+
+from conftest import new_game, stand
+import headless
+import final
+import model
+import objects
+import arcade
+
+
+def lever_positions(game):
+    return [switch.model.orientation for switch in game.rooms[0].puzzle.switches]
+
+
+def press_z(game, tile, keys):
+    """Stands the player on a tile, turns it with the arrow keys, and presses Z once"""
+    stand(game, tile)
+    for key in keys:
+        game.on_key_press(key, 0)
+        game.on_key_release(key, 0)
+    game.on_key_press(arcade.key.Z, 0)
+
+
+class PullingLevers(unittest.TestCase):
+    def test_one_press_pulls_one_lever(self):
+        #Standing between levers 3 and 4, facing lever 4
+        game = new_game()
+        before = lever_positions(game)
+        press_z(game, (7, 11), [arcade.key.UP, arcade.key.RIGHT])
+        after = lever_positions(game)
+        self.assertEqual(sum(1 for old, new in zip(before, after) if old != new), 1)
+        self.assertNotEqual(before[3], after[3])
+
+    def test_levers_cant_be_pulled_from_a_diagonal(self):
+        game = new_game()
+        before = lever_positions(game)
+        press_z(game, (3, 10), [arcade.key.UP, arcade.key.LEFT])
+        self.assertEqual(lever_positions(game), before)
+
+    def test_objects_cant_be_used_from_a_diagonal(self):
+        #The note is at (4, 1), down and to the right
+        game = new_game()
+        press_z(game, (3, 2), [arcade.key.DOWN, arcade.key.RIGHT])
+        self.assertEqual(game.state, final.GAME)
+
+
+class LeverPassword(unittest.TestCase):
+    def setUp(self):
+        #Levers load their textures, which needs the registry to be headless
+        headless.enable()
+        self.puzzle = objects.LeverPuzzle()
+        self.switches = [objects.Switch(final.SPRITE_SCALING, orientation) for orientation in ('LEFT', 'NEUTRAL', 'RIGHT')]
+        for switch in self.switches:
+            self.puzzle.addSwitch(switch)
+
+    def test_levers_start_out_matching_their_positions(self):
+        self.assertTrue(self.puzzle.matches(['LEFT', 'NEUTRAL', 'RIGHT']))
+        self.assertFalse(self.puzzle.matches(['LEFT', 'NEUTRAL', 'NEUTRAL']))
+
+    def test_a_password_has_to_name_every_lever(self):
+        self.assertEqual(self.puzzle.encode(['LEFT', 'NEUTRAL']), -1)
+        self.assertFalse(self.puzzle.matches(['LEFT', 'NEUTRAL']))
+
+    def test_pulling_a_lever_updates_the_state(self):
+        self.switches[0].toggleSwitch()
+        self.switches[2].toggleSwitch()
+        self.assertTrue(self.puzzle.matches(['NEUTRAL', 'NEUTRAL', 'LEFT']))
+
+    def test_restore_puts_the_levers_back(self):
+        saved = self.puzzle.state
+        self.switches[1].toggleSwitch()
+        self.switches[1].setOrientation(model.BROKEN)
+        self.puzzle.restore(saved)
+        self.assertEqual(self.puzzle.state, saved)
+        self.assertEqual([switch.model.orientation for switch in self.switches], [model.LEFT, model.NEUTRAL, model.RIGHT])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Generating mazes with mazegen.generate, and saving them as level files.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import json
+import unittest
+
+import conftest
+import levels
+import mazegen
+import navigation
+
+
+def open_tiles(level):
+    """The tiles of a maze that aren't wall"""
+    width, height = level['size']
+    walls = set(level['walls'])
+    return [(x, y) for y in range(height) for x in range(width) if (x, y) not in walls]
+
+
+class Generating(unittest.TestCase):
+    def test_the_same_seed_gives_the_same_maze(self):
+        self.assertEqual(mazegen.generate(31, 21, seed = 4), mazegen.generate(31, 21, seed = 4))
+        self.assertNotEqual(mazegen.generate(31, 21, seed = 4)['walls'], mazegen.generate(31, 21, seed = 5)['walls'])
+
+    def test_every_open_tile_can_be_reached(self):
+        level = mazegen.generate(41, 31, seed = 1)
+        width, height = level['size']
+        blocked = set(level['walls']) | set((x, y) for kind, image, x, y, options in level['objects'])
+        #Without its portals, so the maze itself has to join everything up
+        graph = navigation.NavGraph(width, height, blocked, ())
+        for tile in open_tiles(level):
+            if tile not in blocked:
+                self.assertTrue(graph.reachable(level['start'], tile), tile)
+
+    def test_things_stand_on_dead_ends(self):
+        level = mazegen.generate(41, 31, seed = 1, levers = 6, passwords = 2)
+        walls = set(level['walls'])
+        things = [(x, y) for kind, image, x, y, options in level['objects'] + level['secrets'] if kind != 'door']
+        self.assertEqual(len(things), 6 + 1 + 2)
+        for x, y in things:
+            sides = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+            self.assertEqual(sum(1 for side in sides if side not in walls), 1, (x, y))
+
+    def test_every_password_names_every_lever(self):
+        level = mazegen.generate(41, 31, seed = 1, levers = 6, passwords = 2)
+        self.assertEqual(len(level['password']), 2)
+        for password in level['password']:
+            self.assertEqual(len(password), 6)
+            self.assertNotEqual(password, ['LEFT'] * 6)
+        self.assertEqual(level['exits'], ('UP',))
+
+    def test_a_maze_too_small_for_a_puzzle_has_none(self):
+        level = mazegen.generate(7, 7, seed = 1)
+        self.assertEqual(level['password'], [])
+        self.assertEqual(level['exits'], ())
+        self.assertEqual([kind for kind, image, x, y, options in level['objects']], ['object'])
+
+
+class LevelFiles(unittest.TestCase):
+    def test_a_saved_maze_loads_back_the_same(self):
+        level = mazegen.generate(31, 21, seed = 2, floor = True)
+        source = json.dumps(mazegen.to_json(level)).encode('utf-8')
+        self.assertEqual(levels.compileLevel('maze.json', source), level)
+
+
+if __name__ == '__main__':
+    unittest.main()
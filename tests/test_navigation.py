@@ -0,0 +1,130 @@
+"""
+Finding the way around small hand-made rooms with navigation.NavGraph.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import time
+import unittest
+
+import conftest
+import headless
+import final
+import mazegen
+import navigation
+
+
+def graph(rows, portals = ()):
+    """Builds a graph from a map written top row first, with # for walls"""
+    height = len(rows)
+    blocked = set()
+    for row, line in enumerate(rows):
+        for x, tile in enumerate(line):
+            if tile == '#':
+                blocked.add((x, height - 1 - row))
+    return navigation.NavGraph(len(rows[0]), height, blocked, list(portals))
+
+
+#Two halves split by a wall
+SPLIT = ["...#...",
+         "...#...",
+         "...#..."]
+
+
+class Reaching(unittest.TestCase):
+    def test_walls_split_regions(self):
+        nav = graph(SPLIT)
+        self.assertEqual(nav.region_count, 2)
+        self.assertTrue(nav.reachable((0, 0), (2, 2)))
+        self.assertFalse(nav.reachable((0, 0), (4, 0)))
+
+    def test_portals_only_go_one_way(self):
+        nav = graph(SPLIT, [((2, 1), (4, 1))])
+        self.assertTrue(nav.reachable((0, 0), (6, 2)))
+        self.assertFalse(nav.reachable((6, 2), (0, 0)))
+
+    def test_walls_and_the_outside_cant_be_reached(self):
+        nav = graph(SPLIT)
+        self.assertFalse(nav.reachable((0, 0), (3, 1)))
+        self.assertFalse(nav.reachable((0, 0), (-1, 0)))
+        self.assertEqual(nav.regionOf(3, 1), -1)
+
+
+class Distances(unittest.TestCase):
+    def test_walking(self):
+        nav = graph(SPLIT)
+        nav.prepare([(2, 2), (0, 0), (4, 0)])
+        self.assertEqual(nav.distance((0, 0), (2, 2)), 4)
+        self.assertEqual(nav.distance((0, 0), (0, 0)), 0)
+        self.assertEqual(nav.distance((0, 0), (4, 0)), -1)
+
+    def test_a_portal_counts_as_one_step(self):
+        nav = graph(SPLIT, [((2, 1), (4, 1))])
+        nav.prepare([(5, 1)])
+        #Two steps to the portal, one through it, one more to (5, 1)
+        self.assertEqual(nav.distance((0, 1), (5, 1)), 4)
+        self.assertEqual(nav.path((0, 1), (5, 1)), [(0, 1), (1, 1), (2, 1), (4, 1), (5, 1)])
+        self.assertEqual(nav.nextStep((0, 1), (5, 1)), (1, 1))
+
+    def test_the_nearest_of_many_goals(self):
+        nav = graph(SPLIT)
+        nav.prepare([[(0, 0), (2, 1)], [(4, 0), (5, 0)]])
+        self.assertEqual(nav.distance((1, 1), [(2, 1), (0, 0)]), 1)
+        self.assertIsNone(nav.path((1, 1), [(4, 0), (5, 0)]))
+
+    def test_goals_are_searched_once(self):
+        nav = graph(SPLIT)
+        nav.prepare([(2, 2)])
+        self.assertEqual(nav.searches, 1)
+        nav.prepare([(2, 2)])
+        for start in ((0, 0), (1, 1), (2, 0)):
+            nav.distance(start, (2, 2))
+        self.assertEqual(nav.searches, 1)
+
+    def test_goals_that_werent_prepared_are_refused(self):
+        nav = graph(SPLIT)
+        nav.prepare([(2, 2)])
+        with self.assertRaises(ValueError):
+            nav.distance((0, 0), (1, 1))
+        with self.assertRaises(ValueError):
+            nav.path((0, 0), [(2, 2), (1, 1)])
+        self.assertEqual(nav.searches, 1)
+
+
+class BigRooms(unittest.TestCase):
+    def test_every_question_is_a_lookup(self):
+        headless.enable()
+        room = final.build_room(mazegen.generate(201, 101, seed = 1))
+        nav = room.navigation()
+        searches = nav.searches
+        #The note and the locked door, which Room.navigation prepared
+        note, door = [nav.besideSprite(sprite, final.SPRITE_SIZE) for sprite in room.object_list]
+        started = time.perf_counter()
+        for x in range(1, 200, 8):
+            for y in range(1, 100, 8):
+                nav.reachable((x, y), door[0])
+                nav.distance((x, y), door)
+                nav.nextStep((x, y), note)
+        each = (time.perf_counter() - started) / (25 * 13 * 3)
+        self.assertEqual(nav.searches, searches)
+        self.assertLess(each, 0.001)
+
+
+class Tiles(unittest.TestCase):
+    def test_exits_are_open_edge_tiles(self):
+        nav = graph(["#.#",
+                     "...",
+                     "###"])
+        self.assertEqual(sorted(nav.exits()), [(0, 1), (1, 2), (2, 1)])
+
+    def test_beside(self):
+        nav = graph(SPLIT)
+        self.assertEqual(nav.beside([(1, 1)]), [(0, 1), (1, 0), (1, 2), (2, 1)])
+        self.assertEqual(nav.beside([(3, 1)]), [(2, 1), (4, 1)])
+
+    def test_covered_tiles_stop_at_tile_edges(self):
+        self.assertEqual(navigation.coveredTiles(0, 40, 0, 40, 40), [(0, 0)])
+        self.assertEqual(navigation.coveredTiles(20, 60, 0, 40, 40), [(0, 0), (1, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
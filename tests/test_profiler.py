@@ -0,0 +1,56 @@
+"""
+The frame profiler: which frame each phase is counted in, and the overlay's lines.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+
+import conftest
+import profiler
+
+
+class Frames(unittest.TestCase):
+    def setUp(self):
+        self.profiler = profiler.FrameProfiler(enabled = True)
+
+    def test_phases_go_to_the_frame_they_ran_in(self):
+        with self.profiler.phase('physics'):
+            pass
+        self.profiler.endFrame('update')
+        with self.profiler.phase('floor'):
+            pass
+        self.profiler.endFrame('draw')
+        self.assertEqual(sorted(self.profiler.history), [('draw', 'floor'), ('update', 'physics')])
+
+    def test_key_presses_go_to_the_next_update(self):
+        #A key handled between frames, then a draw before the update that acts on it
+        with self.profiler.phase('interact', 'update'):
+            pass
+        self.profiler.endFrame('draw')
+        self.assertNotIn(('draw', 'interact'), self.profiler.history)
+
+        self.profiler.endFrame('update')
+        self.assertEqual(len(self.profiler.history['update', 'interact']), 1)
+        self.profiler.endFrame('update')
+        self.assertEqual(len(self.profiler.history['update', 'interact']), 1)
+
+    def test_nothing_is_timed_when_off(self):
+        self.profiler.toggle()
+        self.assertIs(self.profiler.phase('interact', 'update'), profiler.NO_PHASE)
+        self.profiler.endFrame('update')
+        self.assertEqual(len(self.profiler.history), 0)
+
+
+class Overlay(unittest.TestCase):
+    def test_the_numbers_only_change_every_few_frames(self):
+        frames = profiler.FrameProfiler(enabled = True)
+        frames.history['update', 'physics'].append(0.001)
+        first = frames.overlay()
+        frames.history['update', 'physics'].append(0.003)
+        for i in range(profiler.REFRESH_FRAMES - 1):
+            self.assertIs(frames.overlay(), first)
+        self.assertNotEqual(frames.overlay(), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Recording a session with replay.InputRecorder and playing it back.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import conftest
+import headless
+import replay
+
+
+def record(path, seed, ticks):
+    """Plays a session like a player would, from the start menu, and saves it. Returns the game."""
+    rng = random.Random(seed)
+    game = headless.HeadlessGame()
+    game.setup()
+    game.recorder = replay.InputRecorder()
+    #The Start button
+    game.on_mouse_press(950, 350, 1, 0)
+    game.on_mouse_release(950, 350, 1, 0)
+    while game.ticks < ticks:
+        game.hold(rng.choice(headless.SESSION_KEYS), rng.randint(1, 30))
+    game.recorder.save(path, game)
+    return game
+
+
+class Recordings(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'session.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_a_session_replays_the_same(self):
+        game = record(self.path, 3, 600)
+        events, ticks, expected = replay.load(self.path)
+        self.assertEqual(events, game.recorder.events)
+        self.assertEqual(ticks, game.ticks)
+        self.assertEqual(expected, replay.outcome(game))
+
+        again = replay.replay(events, ticks)
+        self.assertEqual(again.ticks, ticks)
+        self.assertTrue(replay.matches(replay.outcome(again), expected))
+
+    def test_a_different_ending_doesnt_match(self):
+        game = record(self.path, 3, 600)
+        events, ticks, expected = replay.load(self.path)
+        #Only press Start, so the player never moves
+        self.assertEqual([event[1] for event in events[:2]], [replay.MOUSE_PRESS, replay.MOUSE_RELEASE])
+        again = replay.replay(events[:2], ticks)
+        self.assertFalse(replay.matches(replay.outcome(again), expected))
+
+    def test_other_files_are_refused(self):
+        with open(self.path, 'wb') as file:
+            file.write(replay.HEADER.pack(b'NOTAREC', replay.VERSION, 0, 0))
+        with self.assertRaises(ValueError):
+            replay.load(self.path)
+        with open(self.path, 'wb') as file:
+            file.write(replay.HEADER.pack(replay.MAGIC, replay.VERSION + 1, 0, 0))
+        with self.assertRaisesRegex(ValueError, "recording version"):
+            replay.load(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
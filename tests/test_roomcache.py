@@ -0,0 +1,110 @@
+"""
+Room snapshots, and building and evicting rooms with roomcache.RoomCache.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+
+import conftest
+import headless
+import final
+import mazegen
+import model
+import roomcache
+
+
+def big_maze():
+    """A generated room with more levers than fit in 64 bits"""
+    return final.build_room(mazegen.generate(101, 101, seed = 1, levers = 40))
+
+
+class Snapshots(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+
+    def test_an_untouched_room_snapshots_as_it_started(self):
+        room = final.setup_room_1()
+        self.assertEqual(room.snapshot(), room.initial)
+
+    def test_changes_come_back_in_a_new_room(self):
+        room = final.setup_room_1()
+        room.puzzle.switches[0].toggleSwitch()
+        door = list(room.door_list)[0]
+        door.model.lock = False
+        door.unlock()
+        room.removeWall(door)
+
+        copy = final.setup_room_1()
+        copy.restore(room.snapshot())
+        self.assertEqual(copy.puzzle.state, room.puzzle.state)
+        self.assertNotIn(list(copy.door_list)[0], copy.wall_index)
+        self.assertFalse(list(copy.door_list)[0].model.lock)
+        self.assertEqual(copy.snapshot(), room.snapshot())
+
+    def test_more_than_32_levers(self):
+        room = big_maze()
+        self.assertEqual(len(room.puzzle.switches), 40)
+        room.puzzle.switches[-1].toggleSwitch()
+        room.puzzle.switches[-2].setOrientation(model.BROKEN)
+
+        copy = big_maze()
+        copy.restore(room.snapshot())
+        self.assertEqual(copy.puzzle.state, room.puzzle.state)
+        self.assertEqual(copy.puzzle.switches[-2].model.orientation, model.BROKEN)
+        self.assertEqual(copy.snapshot(), room.snapshot())
+
+    def test_restoring_the_start_undoes_everything(self):
+        room = big_maze()
+        start = room.snapshot()
+        for switch in room.puzzle.switches:
+            switch.toggleSwitch()
+        room.restore(start)
+        self.assertEqual(room.snapshot(), start)
+
+
+class Caching(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+        self.rooms = roomcache.RoomCache(final.ROOM_BUILDERS, keep_time = 1.0)
+
+    def tearDown(self):
+        self.rooms.pool.shutdown()
+
+    def test_rooms_are_built_when_first_looked_up(self):
+        self.assertEqual(len(self.rooms), len(final.ROOM_BUILDERS))
+        self.assertFalse(self.rooms.isBuilt(0))
+        room = self.rooms[0]
+        self.assertIs(self.rooms[0], room)
+        self.assertEqual(self.rooms.builds, 1)
+
+    def test_rooms_left_alone_are_evicted_and_come_back_changed(self):
+        self.rooms[0].puzzle.switches[0].toggleSwitch()
+        state = self.rooms[0].puzzle.state
+        self.rooms[1]
+        self.rooms.update(0.5, 1)
+        self.assertTrue(self.rooms.isBuilt(0))
+        self.rooms.update(1.0, 1)
+        self.assertFalse(self.rooms.isBuilt(0))
+        self.assertTrue(self.rooms.isBuilt(1))
+        self.assertEqual(self.rooms.evictions, 1)
+        self.assertGreater(self.rooms.snapshotSize(), 0)
+
+        self.assertEqual(self.rooms[0].puzzle.state, state)
+        self.assertEqual(self.rooms.snapshotSize(), 0)
+
+    def test_every_snapshot_covers_built_and_evicted_rooms(self):
+        self.rooms[0]
+        self.rooms[1]
+        self.rooms.update(2.0, 1)
+        self.assertEqual(sorted(self.rooms.everySnapshot()), [0, 1])
+
+    def test_restore_builds_nothing(self):
+        room = final.setup_room_1()
+        room.puzzle.switches[0].toggleSwitch()
+        self.rooms.restore({0: room.snapshot()})
+        self.assertFalse(self.rooms.isBuilt(0))
+        self.assertEqual(self.rooms[0].puzzle.state, room.puzzle.state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Saving progress and loading it back, without a window.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+
+from conftest import new_game, play
+import headless
+import final
+import model
+import savegame
+import solver
+
+
+class SavingAndLoading(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        headless.enable()
+        cls.actions = solver.solve_room(0).actions
+
+    def test_a_save_loads_back_the_same(self):
+        game = new_game()
+        play(game, self.actions[:len(self.actions) // 2])
+        data = savegame.dump(game)
+
+        fresh = new_game()
+        savegame.restore(fresh, data)
+        self.assertEqual(savegame.dump(fresh), data)
+        self.assertEqual(fresh.player.items, game.player.items)
+        self.assertEqual(fresh.rooms[0].puzzle.state, game.rooms[0].puzzle.state)
+
+    def test_loading_undoes_what_happened_since(self):
+        game = new_game()
+        data = savegame.dump(game)
+        play(game, self.actions)
+        self.assertNotEqual(savegame.dump(game), data)
+        savegame.restore(game, data)
+        self.assertEqual(savegame.dump(game), data)
+
+    def test_the_dialogue_box_loads_as_the_game(self):
+        game = new_game()
+        game.state = final.DIALOGUE
+        fresh = new_game()
+        savegame.restore(fresh, savegame.dump(game))
+        self.assertEqual(fresh.state, final.GAME)
+
+
+#Where the player's part of a save starts, after the fingerprint of each level
+PLAYER_AT = savegame.HEADER.size + len(final.LEVELS) * savegame.LEVEL.size
+
+
+def with_snapshots(data, snapshots):
+    """A save like data, but holding other snapshots (room number -> bytes)"""
+    count = savegame.PLAYER.unpack_from(data, PLAYER_AT)[-1]
+    rooms = [savegame.ROOMS.pack(len(snapshots))]
+    for index, snapshot in sorted(snapshots.items()):
+        rooms.append(savegame.ROOM.pack(index, len(snapshot)) + snapshot)
+    return data[:PLAYER_AT + savegame.PLAYER.size + count] + b''.join(rooms)
+
+
+class BadSaves(unittest.TestCase):
+    def setUp(self):
+        self.game = new_game()
+        #Something to lose, so a load that half happens would show
+        self.game.rooms[0].puzzle.switches[0].toggleSwitch()
+        self.data = savegame.dump(self.game)
+        self.snapshot = self.game.rooms[0].snapshot()
+
+    def assertRefused(self, data, words = ''):
+        with self.assertRaises(savegame.SaveError) as caught:
+            savegame.restore(self.game, data)
+        self.assertIn(words, str(caught.exception))
+        self.assertEqual(savegame.dump(self.game), self.data)
+
+    def test_not_a_save(self):
+        self.assertRefused(b'nope' + self.data[4:], "not a save")
+
+    def test_another_version(self):
+        header = savegame.HEADER.pack(savegame.MAGIC, savegame.VERSION - 1, len(final.LEVELS))
+        self.assertRefused(header + self.data[savegame.HEADER.size:], "version")
+
+    def test_cut_short(self):
+        self.assertRefused(self.data[:20], "cut short")
+        self.assertRefused(self.data[:-3])
+
+    def test_a_level_file_changed(self):
+        data = bytearray(self.data)
+        data[savegame.HEADER.size] ^= 1
+        self.assertRefused(bytes(data), "changed since the game was saved")
+
+    def test_unknown_item(self):
+        self.game.player_sprite.inventory.setItems(bytes([model.KEY]))
+        data = bytearray(savegame.dump(self.game))
+        self.data = savegame.dump(self.game)
+        #The items come right after the player
+        data[PLAYER_AT + savegame.PLAYER.size] = len(model.ITEM_NAMES)
+        self.assertRefused(bytes(data), "unknown item")
+
+    def test_a_room_this_game_doesnt_have(self):
+        data = bytearray(self.data)
+        #The room the player is in
+        data[PLAYER_AT + 1] = len(self.game.rooms)
+        self.assertRefused(bytes(data), "rooms this game doesn't")
+
+    def test_a_snapshot_made_for_another_room(self):
+        #Room 2 isn't built, and has none of room 1's objects
+        self.assertFalse(self.game.rooms.isBuilt(1))
+        self.assertRefused(with_snapshots(self.data, {1: self.snapshot}), "room 2")
+
+    def test_a_snapshot_cut_short(self):
+        #Room 1 is built, so nothing may be put back before the whole save is checked
+        room_2 = final.setup_room_2().snapshot()
+        self.assertRefused(with_snapshots(self.data, {0: self.snapshot[:-1], 1: room_2}), "room 1")
+        self.assertRefused(with_snapshots(self.data, {0: self.snapshot + b'!'}), "longer")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Finding the fewest Z presses through a room with solver.RoomSolver.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+
+from conftest import new_game, play
+import headless
+import final
+import mazegen
+import navigation
+import solver
+
+
+def can_leave(game):
+    """True if the player can walk out of the room they're in"""
+    graph = game.rooms[game.current_room].navigation()
+    tile = navigation.tileOf(game.player_sprite, final.SPRITE_SIZE)
+    return any(graph.reachable(tile, exit) for exit in graph.exits())
+
+
+class GameRooms(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+
+    def test_the_first_room_takes_19_presses(self):
+        solution = solver.solve_room(0)
+        self.assertEqual(solution.presses, 19)
+        self.assertEqual(sum(action.count() for action in solution.actions), 19)
+
+    def test_playing_the_solution_opens_the_way_out(self):
+        game = new_game()
+        self.assertFalse(can_leave(game))
+        play(game, solver.solve_room(0).actions)
+        self.assertTrue(can_leave(game))
+
+    def test_later_rooms_are_entered_from_an_edge(self):
+        x, y = solver.entrance(1)
+        graph = final.ROOM_BUILDERS[1]().navigation()
+        self.assertTrue(graph.isOpen(x, y))
+        self.assertIn(0, (x, y, graph.width - 1 - x, graph.height - 1 - y))
+
+
+class Mazes(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+        self.level = mazegen.generate(31, 21, seed = 2)
+
+    def test_levers_then_the_key_then_the_door(self):
+        solution = solver.RoomSolver(final.build_room(self.level), self.level['start']).solve()
+        self.assertEqual(solution.presses, 6)
+        self.assertEqual([action.kind for action in solution.actions[1:]], ['use', 'use'])
+        self.assertIn('key', str(solution.actions[1]))
+        self.assertIn('LockDoor', str(solution.actions[2]))
+
+    def test_a_room_with_no_key_cant_be_finished(self):
+        level = dict(self.level, secrets = ())
+        self.assertIsNone(solver.RoomSolver(final.build_room(level), level['start']).solve())
+
+
+if __name__ == '__main__':
+    unittest.main()
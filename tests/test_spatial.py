@@ -0,0 +1,86 @@
+"""
+Looking sprites up by tile with spatial.TileIndex.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+
+import conftest
+import spatial
+import arcade
+
+SIZE = 40
+
+
+def box(tile_x, tile_y, width = 1, height = 1):
+    """A sprite covering width x height tiles, starting at a tile"""
+    sprite = arcade.Sprite()
+    sprite.width = width * SIZE
+    sprite.height = height * SIZE
+    sprite.left = tile_x * SIZE
+    sprite.bottom = tile_y * SIZE
+    return sprite
+
+
+class Ranges(unittest.TestCase):
+    def setUp(self):
+        self.index = spatial.TileIndex(SIZE)
+
+    def test_tile_range_counts_touched_edges(self):
+        self.assertEqual(self.index.tileRange(0, 40, 0, 40), (0, 1, 0, 1))
+        self.assertEqual(self.index.tileRange(-10, 10, 50, 70), (-1, 0, 1, 1))
+
+    def test_covered_range_stops_at_tile_edges(self):
+        self.assertEqual(self.index.coveredRange(0, 40, 0, 40), (0, 0, 0, 0))
+        self.assertEqual(self.index.coveredRange(40, 120, 0, 41), (1, 2, 0, 1))
+
+    def test_a_box_with_no_size_still_covers_its_tile(self):
+        self.assertEqual(self.index.coveredRange(40, 40, 80, 80), (1, 1, 2, 2))
+
+
+class Filing(unittest.TestCase):
+    def setUp(self):
+        self.index = spatial.TileIndex(SIZE)
+
+    def test_a_sprite_is_filed_only_under_its_own_tiles(self):
+        sprite = box(2, 3)
+        self.index.insert(sprite)
+        self.assertEqual(self.index.atTile(2, 3), [sprite])
+        for tile in ((1, 3), (3, 3), (2, 2), (2, 4)):
+            self.assertEqual(self.index.atTile(*tile), [])
+
+    def test_a_big_sprite_is_filed_under_every_tile(self):
+        sprite = box(1, 1, 2, 3)
+        self.index.insert(sprite)
+        tiles = sorted(tile for tile, sprites in self.index.tiles.items() if sprite in sprites)
+        self.assertEqual(tiles, [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)])
+
+    def test_remove_after_moving(self):
+        sprite = box(2, 3)
+        self.index.insert(sprite)
+        sprite.left += 5 * SIZE
+        self.index.remove(sprite)
+        self.assertNotIn(sprite, self.index)
+        self.assertEqual(self.index.tiles, {})
+
+    def test_neighbours_are_found_but_not_returned_twice(self):
+        middle = box(2, 2, 2, 1)
+        right = box(4, 2)
+        far = box(8, 2)
+        for sprite in (middle, right, far):
+            self.index.insert(sprite)
+        found = self.index.near(box(3, 2))
+        self.assertEqual(len(found), 2)
+        self.assertEqual(set(found), {middle, right})
+
+    def test_touching_isnt_colliding(self):
+        wall = box(2, 2)
+        self.index.insert(wall)
+        self.assertEqual(self.index.collisions(box(3, 2)), [])
+        player = box(3, 2)
+        player.left -= 1
+        self.assertEqual(self.index.collisions(player), [wall])
+
+
+if __name__ == '__main__':
+    unittest.main()
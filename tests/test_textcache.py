@@ -0,0 +1,94 @@
+"""
+Laying text out once with textcache.TextCache and textcache.TextBatch.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+import conftest
+import textcache
+
+
+class FakeLabel:
+    """Stands in for a pyglet label, which needs GL to be made"""
+    def __init__(self, *entry, batch = None):
+        self.entry = entry
+        self.batch = batch
+        self.deleted = False
+        self.draws = 0
+
+    def draw(self):
+        self.draws += 1
+
+    def delete(self):
+        self.deleted = True
+
+
+class Labels(unittest.TestCase):
+    def setUp(self):
+        patches = [mock.patch.object(textcache, 'makeLabel', FakeLabel),
+                   mock.patch.object(textcache.gl, 'glLoadIdentity'),
+                   mock.patch.object(textcache.gl, 'glTranslatef')]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.cache = textcache.TextCache(limit = 3)
+
+    def test_each_string_is_laid_out_once(self):
+        first = self.cache.draw("Hi", 10, 20, (255, 255, 255))
+        self.assertIs(self.cache.draw("Hi", 30, 40, (255, 255, 255)), first)
+        self.assertEqual(first.draws, 2)
+        self.assertEqual(self.cache.layouts, 1)
+
+    def test_anything_that_changes_the_layout_is_a_new_label(self):
+        first = self.cache.label("Hi", (255, 255, 255))
+        self.assertIsNot(self.cache.label("Hi", (255, 255, 255), anchor_y = 'top'), first)
+        self.assertIsNot(self.cache.label("Hi", (0, 0, 0)), first)
+        self.assertIs(self.cache.label("Hi", [255, 255, 255]), first)
+        self.assertEqual(self.cache.layouts, 3)
+
+    def test_the_least_recently_used_label_is_dropped(self):
+        labels = [self.cache.label(text, (0, 0, 0)) for text in "abc"]
+        self.cache.label("a", (0, 0, 0))
+        self.cache.label("d", (0, 0, 0))
+        self.assertEqual(len(self.cache), 3)
+        self.assertTrue(labels[1].deleted)
+        self.assertFalse(labels[0].deleted)
+
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+        self.assertTrue(labels[0].deleted)
+
+
+class Batches(unittest.TestCase):
+    def setUp(self):
+        patches = [mock.patch.object(textcache, 'makeLabel', FakeLabel),
+                   mock.patch.object(textcache.pyglet.graphics, 'Batch', mock.MagicMock),
+                   mock.patch.object(textcache.gl, 'glLoadIdentity')]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_text_is_laid_out_when_first_drawn_and_again_after_a_change(self):
+        batch = textcache.TextBatch()
+        batch.add("One", 10, 20, (0, 0, 0))
+        batch.add("Two", 10, 40, (0, 0, 0))
+        self.assertIsNone(batch.batch)
+
+        batch.draw()
+        labels = batch.labels
+        batch.draw()
+        self.assertIs(batch.labels, labels)
+        self.assertEqual([label.entry[0] for label in labels], ["One", "Two"])
+        self.assertTrue(all(label.batch is batch.batch for label in labels))
+        self.assertEqual(batch.batch.draw.call_count, 2)
+
+        batch.add("Three", 10, 60, (0, 0, 0))
+        self.assertTrue(all(label.deleted for label in labels))
+        batch.draw()
+        self.assertEqual(len(batch.labels), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
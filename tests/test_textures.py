@@ -0,0 +1,146 @@
+"""
+The texture registry: loading each texture once, and building rooms on another thread.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import concurrent.futures
+import unittest
+from unittest import mock
+
+from conftest import new_game
+import headless
+import final
+import mazegen
+import roomcache
+import textures
+
+
+def on_a_thread(function, *args):
+    """Calls function on a worker thread and returns what it returned (or raises what it raised)"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as pool:
+        return pool.submit(function, *args).result()
+
+
+class Registry(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+        self.registry = textures.TextureRegistry()
+        self.registry.headless = True
+
+    def test_each_texture_is_made_once(self):
+        first = self.registry.get("Images/key.png", scale = 5)
+        self.assertIs(self.registry.get("Images/key.png", scale = 5), first)
+        self.assertEqual((first.width, first.height), (40, 40))
+        self.assertEqual(self.registry.stats(), {'hits': 1, 'misses': 1, 'decodes': 1, 'textures': 1})
+
+    def test_scales_share_an_image(self):
+        self.registry.get("Images/key.png")
+        self.registry.get("Images/key.png", scale = 5)
+        self.registry.get("Images/key.png", mirrored = True)
+        self.assertEqual(self.registry.decodes, 2)
+
+    def test_preloaded_textures_can_be_had_on_any_thread(self):
+        self.registry.preload([("Images/key.png", True, 5)])
+        self.assertIs(on_a_thread(self.registry.get, "Images/key.png", True, 5), self.registry.get("Images/key.png", True, 5))
+
+    def test_other_textures_cant_be_loaded_off_the_main_thread(self):
+        self.registry.preload([("Images/key.png", False, 5)])
+        with self.assertRaises(textures.TextureError):
+            on_a_thread(self.registry.get, "Images/key.png", True, 5)
+        self.assertEqual(self.registry.misses, 1)
+
+
+class Baking(unittest.TestCase):
+    """Baking needs GL, so arcade's loader is swapped for one that files textures
+    under keys unbake can't guess"""
+    def setUp(self):
+        self.registry = textures.TextureRegistry()
+        self.cache = {}
+        self.deleted = []
+
+        def load_texture(file):
+            texture = textures.arcade.Texture(100 + len(self.cache), 8, 8)
+            self.cache['baked {} {}'.format(len(self.cache), id(file))] = texture
+            return texture
+        load_texture.texture_cache = self.cache
+        patches = [mock.patch.object(textures.arcade, 'load_texture', load_texture),
+                   mock.patch.object(textures.gl, 'glDeleteTextures', lambda count, id: self.deleted.append(id.value))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_unbake_forgets_only_its_own_texture(self):
+        image = textures.PIL.Image.new('RGBA', (8, 8))
+        first = self.registry.bake(image)
+        second = self.registry.bake(image)
+        self.cache['somebody else'] = textures.arcade.Texture(7, 8, 8)
+
+        self.registry.unbake(first)
+        self.assertEqual(sorted(texture.texture_id for texture in self.cache.values()), [7, second.texture_id])
+        self.assertEqual(self.deleted, [first.texture_id])
+        self.registry.unbake(first)
+        self.assertEqual(self.deleted, [first.texture_id])
+
+
+class Preloading(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+        self.saved = textures.registry
+        textures.registry = textures.TextureRegistry()
+        textures.registry.headless = True
+        textures.registry.preload(final.all_textures())
+
+    def tearDown(self):
+        textures.registry = self.saved
+
+    def test_every_room_builds_on_a_thread_without_loading(self):
+        misses = textures.registry.misses
+        for builder in final.ROOM_BUILDERS:
+            room = on_a_thread(builder)
+            #What the game does to rooms as the player plays them
+            for thing in room.things:
+                if isinstance(thing, final.objects.InteractObjects):
+                    thing.unlock()
+                    thing.broken()
+            for switch in room.puzzle.switches:
+                switch.toggleSwitch()
+            on_a_thread(room.restore, room.snapshot())
+        self.assertEqual(textures.registry.misses, misses)
+
+    def test_level_textures_cover_a_generated_maze(self):
+        level = mazegen.generate(31, 21, seed = 2, floor = True)
+        textures.registry.preload(final.level_textures(level))
+        on_a_thread(final.build_room, level)
+
+    def test_big_images_nobody_uses_arent_loaded(self):
+        paths = set(path for path, mirrored in textures.registry.images)
+        self.assertNotIn("Images/god.png", paths)
+        self.assertIn("Images/floor1.jpg", paths)
+
+
+class Prefetching(unittest.TestCase):
+    def test_prefetched_rooms_load_nothing(self):
+        game = new_game()
+        misses = textures.registry.misses
+        game.rooms.prefetch(1)
+        self.assertIsNotNone(game.rooms[1])
+        self.assertEqual(textures.registry.misses, misses)
+
+    def test_a_room_that_needs_a_texture_is_built_on_the_main_thread(self):
+        headless.enable()
+        level = mazegen.generate(31, 21, seed = 3)
+        rooms = roomcache.RoomCache([lambda: final.build_room(level)])
+        saved = textures.registry
+        textures.registry = textures.TextureRegistry()
+        textures.registry.headless = True
+        try:
+            rooms.prefetch(0)
+            self.assertIsNotNone(rooms[0])
+            self.assertGreater(textures.registry.misses, 0)
+        finally:
+            textures.registry = saved
+            rooms.pool.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
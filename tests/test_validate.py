@@ -0,0 +1,80 @@
+"""
+Checking level files with validate.check, from mazegen to the solver.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import conftest
+import headless
+import final
+import levels
+import mazegen
+import solver
+import validate
+
+
+class Levels(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+        self.folder = tempfile.mkdtemp()
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            levels.loaded.pop(path, None)
+        shutil.rmtree(self.folder)
+
+    def save(self, spec):
+        """Writes a level file and returns its path"""
+        path = os.path.join(self.folder, 'level{}.json'.format(len(self.paths)))
+        with open(path, 'w') as file:
+            json.dump(spec, file)
+        self.paths.append(path)
+        return path
+
+    def test_the_game_levels_pass(self):
+        paths = sorted(glob.glob(os.path.join(validate.LEVEL_FOLDER, '*.json')))
+        results = validate.validate(paths, workers = 1)
+        self.assertEqual([result['errors'] for result in results], [[]] * len(paths))
+        self.assertEqual(results[0]['presses'], 19)
+
+    def test_a_generated_maze_passes_and_matches_the_solver(self):
+        level = mazegen.generate(41, 31, seed = 5, levers = 4)
+        result = validate.check(self.save(mazegen.to_json(level)))
+        self.assertEqual(result['errors'], [])
+
+        solution = solver.RoomSolver(final.build_room(level), level['start']).solve()
+        self.assertEqual(result['presses'], solution.presses)
+        self.assertEqual(result['states'], solution.states)
+
+    def test_mistakes_are_reported(self):
+        spec = mazegen.to_json(mazegen.generate(31, 21, seed = 2))
+        #A gap in the left wall, which isn't an exit
+        spec['map'][10] = '.' + spec['map'][10][1:]
+        spec['portals'] = [[1, 1, 0, 0]]
+        spec['password'] = [['LEFT']] + spec['password'][1:]
+        errors = validate.check(self.save(spec))['errors']
+        self.assertIn("gap in the outer wall at (0, 10)", errors)
+        self.assertIn("portal at (1, 1) lands inside a wall at (0, 0)", errors)
+        self.assertIn("password 1 names 1 levers, but the room has 5", errors)
+
+    def test_a_room_that_cant_be_finished_fails(self):
+        spec = mazegen.to_json(mazegen.generate(31, 21, seed = 2))
+        spec['secrets'] = []
+        result = validate.check(self.save(spec))
+        self.assertIn("the room can't be finished", result['errors'])
+        self.assertIsNone(result['presses'])
+
+    def test_levels_are_checked_in_parallel_in_order(self):
+        paths = [self.save(mazegen.to_json(mazegen.generate(21, 21, seed = seed))) for seed in range(3)]
+        self.assertEqual([result['level'] for result in validate.validate(paths, workers = 2)], paths)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Big rooms: world.ChunkedLayer streaming chunks in and out, the scrolling camera,
+and culling sprites off screen with world.CulledList.
+
+Run from the project folder with: python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+import conftest
+import arcade
+import headless
+import final
+import mazegen
+import textures
+import world
+
+#Chunks of 4 x 4 tiles, in a room of 40 x 24 tiles
+TILE = final.SPRITE_SIZE
+CHUNK = 4 * TILE
+
+
+def wall(x, y):
+    """A wall sprite on a tile"""
+    sprite = textures.sprite("Images/RogueSprites/block1.png", final.SPRITE_SCALING)
+    sprite.left = x * TILE
+    sprite.bottom = y * TILE
+    return sprite
+
+
+class Chunks(unittest.TestCase):
+    def setUp(self):
+        headless.enable()
+        self.layer = world.ChunkedLayer(40 * TILE, 24 * TILE, final.SPRITE_SCALING, CHUNK)
+        self.walls = {}
+        for x in range(40):
+            for y in (0, 23):
+                self.walls[x, y] = wall(x, y)
+                self.layer.append(self.walls[x, y])
+
+    def test_sprites_go_in_the_chunk_under_their_middle(self):
+        self.assertEqual((self.layer.columns, self.layer.rows), (10, 6))
+        self.assertEqual(len(self.layer), 80)
+        self.assertEqual(self.layer.chunkOf(self.walls[5, 23]), (1, 5))
+        #Only chunks something landed in are made
+        self.assertEqual(len(self.layer.chunks), 20)
+
+    def test_chunks_in_a_box_come_nearest_the_middle_first(self):
+        keys = self.layer.chunksIn(4 * CHUNK, 7 * CHUNK, 0, 6 * CHUNK)
+        self.assertEqual(sorted(keys), [(column, row) for column in (4, 5, 6) for row in (0, 5)])
+        self.assertEqual(keys[0][0], 5)
+
+    def test_composing_a_view_only_composes_the_chunks_in_it(self):
+        self.layer.compose((0, CHUNK, 0, CHUNK))
+        self.assertIsNotNone(self.layer.chunks[0, 0].image)
+        self.assertIsNone(self.layer.chunks[9, 0].image)
+        self.assertEqual(self.layer.resident, {(0, 0)})
+
+    def test_removing_a_sprite_only_releases_its_chunk(self):
+        self.layer.compose()
+        self.layer.remove(self.walls[5, 0])
+        self.assertNotIn(self.walls[5, 0], self.layer)
+        self.assertIsNone(self.layer.chunks[1, 0].image)
+        self.assertIsNotNone(self.layer.chunks[0, 0].image)
+
+    def test_streaming_keeps_only_chunks_near_the_view(self):
+        view = (0, 2 * CHUNK, 0, 2 * CHUNK)
+        self.layer.stream(view, CHUNK, budget = 1)
+        self.assertEqual(self.layer.streamed_in, 1)
+        for i in range(10):
+            self.layer.stream(view, CHUNK, budget = 1)
+        #Columns 0 to 2, bottom row only, since the top row is more than a chunk away
+        self.assertEqual(self.layer.resident, {(0, 0), (1, 0), (2, 0)})
+
+        self.layer.stream((7 * CHUNK, 9 * CHUNK, 4 * CHUNK, 6 * CHUNK), CHUNK, budget = 0)
+        self.assertEqual(self.layer.resident, set())
+        self.assertEqual(self.layer.streamed_out, 3)
+        self.assertIsNone(self.layer.chunks[0, 0].image)
+
+
+class PreparingRooms(unittest.TestCase):
+    def test_a_room_entered_from_an_edge_composes_only_around_it(self):
+        headless.enable()
+        room = final.build_room(mazegen.generate(101, 101, seed = 1))
+        room.prepare(('DOWN', TILE))
+        layer = room.static_layer
+        self.assertTrue(layer.resident)
+        self.assertLess(len(layer.resident), len(layer.chunks))
+        self.assertTrue(all(row == 0 for column, row in layer.resident))
+
+
+class Cameras(unittest.TestCase):
+    def setUp(self):
+        self.camera = world.Camera(800, 600)
+        self.player = arcade.Sprite()
+
+    def follow(self, x, y, room_width = 4000, room_height = 3000):
+        self.player.center_x = x
+        self.player.center_y = y
+        self.camera.follow(self.player, room_width, room_height)
+        return self.camera.view()
+
+    def test_the_player_is_kept_in_the_middle(self):
+        self.assertEqual(self.follow(2000.4, 1500), (1600, 2400, 1200, 1800))
+
+    def test_the_camera_stops_at_the_edges_of_the_room(self):
+        self.assertEqual(self.follow(10, 10), (0, 800, 0, 600))
+        self.assertEqual(self.follow(3990, 2990), (3200, 4000, 2400, 3000))
+
+    def test_a_small_room_stays_in_the_corner(self):
+        self.assertEqual(self.follow(500, 400, 700, 500), (0, 800, 0, 600))
+
+
+
+class Culling(unittest.TestCase):
+    def setUp(self):
+        self.sprites = world.CulledList(CHUNK)
+        #A prop on every fourth tile along the bottom row
+        self.props = []
+        for x in range(0, 40, 4):
+            prop = arcade.Sprite()
+            prop.width = prop.height = TILE
+            prop.left = x * TILE
+            prop.bottom = 0
+            self.props.append(prop)
+        #Added in the opposite order to where they stand
+        for prop in reversed(self.props):
+            self.sprites.append(prop)
+        #Drawing needs GL, so only what would be handed to arcade is checked
+        patch = mock.patch.object(self.sprites.visible, 'draw')
+        self.drawn = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_only_sprites_in_view_are_found_in_the_order_added(self):
+        found = self.sprites.inView((0, 2 * CHUNK - 1, 0, TILE))
+        self.assertEqual(found, [self.props[1], self.props[0]])
+
+    def test_drawing_skips_sprites_off_screen(self):
+        self.assertEqual(self.sprites.draw((0, 2 * CHUNK - 1, 0, TILE)), 8)
+        self.assertEqual(self.sprites.drawn, 2)
+        self.assertEqual(self.drawn.call_count, 1)
+
+    def test_the_list_is_only_made_again_when_it_has_to_be(self):
+        self.sprites.draw((0, CHUNK - 1, 0, TILE))
+        visible = self.sprites.visible.sprite_list
+        self.assertEqual(visible, [self.props[0]])
+        #Moving inside the same cells keeps the list
+        self.sprites.draw((10, CHUNK - 1, 0, TILE))
+        self.assertIs(self.sprites.visible.sprite_list, visible)
+
+        self.sprites.remove(self.props[0])
+        self.assertNotIn(self.props[0], self.sprites)
+        self.sprites.draw((10, CHUNK - 1, 0, TILE))
+        self.assertEqual(self.sprites.drawn, 0)
+        self.assertEqual(self.drawn.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
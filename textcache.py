@@ -0,0 +1,109 @@
+"""
+Text that is only laid out when it changes.
+
+Laying text out with pyglet (finding glyphs, wrapping lines, building the
+vertex lists) costs far more than drawing it, and the menus and dialogue box
+draw the same strings every frame. TextCache keeps the laid out labels, keyed
+by everything that changes how the text looks, and drops the least recently
+used ones. TextBatch puts a whole screen of text that never changes into one
+pyglet batch, so it is drawn with one call.
+
+Giving a width wraps the text onto as many lines as it needs. The dialogue box
+uses this for long notes, and grows to fit them.
+"""
+import collections
+import pyglet
+from pyglet import gl
+
+#The fonts arcade.draw_text uses when none is given
+FONT = ('Calibri', 'Arial')
+
+
+def makeLabel(text, color, font_size, width, align, font_name, bold, anchor_x, anchor_y, x = 0, y = 0, batch = None):
+    """Lays out a pyglet label. Text with a width is wrapped to it."""
+    if len(color) == 3:
+        color = (color[0], color[1], color[2], 255)
+    return pyglet.text.Label(text, font_name = font_name, font_size = font_size, bold = bold, color = color,
+                             x = x, y = y, width = width, anchor_x = anchor_x, anchor_y = anchor_y,
+                             align = align, multiline = width is not None, batch = batch)
+
+
+class TextCache:
+    """Keeps laid out labels, so each string is only laid out once"""
+    def __init__(self, limit = 256):
+        #How many labels are kept before the least recently used ones are dropped
+        self.limit = limit
+        self.labels = collections.OrderedDict()
+        #How many times text had to be laid out
+        self.layouts = 0
+
+    def __len__(self):
+        return len(self.labels)
+
+    def label(self, text, color, font_size = 12, width = None, align = 'left', font_name = FONT, bold = False,
+              anchor_x = 'left', anchor_y = 'baseline'):
+        """Returns the laid out label for some text, laying it out only if it isn't cached"""
+        key = (text, tuple(color), font_size, width, align, font_name, bold, anchor_x, anchor_y)
+        label = self.labels.get(key)
+        if label is not None:
+            self.labels.move_to_end(key)
+            return label
+
+        label = makeLabel(text, color, font_size, width, align, font_name, bold, anchor_x, anchor_y)
+        self.labels[key] = label
+        self.layouts += 1
+        if len(self.labels) > self.limit:
+            #Frees the dropped label's vertex lists too
+            self.labels.popitem(last = False)[1].delete()
+        return label
+
+    def drawLabel(self, label, x, y):
+        """Draws a label from label() with its anchor at (x, y)"""
+        gl.glLoadIdentity()
+        gl.glTranslatef(x, y, 0)
+        label.draw()
+
+    def draw(self, text, x, y, color, font_size = 12, width = None, align = 'left', font_name = FONT, bold = False,
+             anchor_x = 'left', anchor_y = 'baseline'):
+        """Works like arcade.draw_text, but with the layout cached. Returns the label."""
+        label = self.label(text, color, font_size, width, align, font_name, bold, anchor_x, anchor_y)
+        self.drawLabel(label, x, y)
+        return label
+
+    def clear(self):
+        for label in self.labels.values():
+            label.delete()
+        self.labels.clear()
+
+
+class TextBatch:
+    """A screen's worth of text that never changes, drawn with one call"""
+    def __init__(self):
+        self.entries = []
+        #Made the first time the text is drawn, since laying it out needs a window
+        self.batch = None
+        self.labels = []
+
+    def add(self, text, x, y, color, font_size = 12, width = None, align = 'left', font_name = FONT, bold = False,
+            anchor_x = 'left', anchor_y = 'baseline'):
+        """Adds a piece of text, with the same arguments as TextCache.draw"""
+        self.entries.append((text, color, font_size, width, align, font_name, bold, anchor_x, anchor_y, x, y))
+        self.release()
+
+    def draw(self):
+        if self.batch is None:
+            self.batch = pyglet.graphics.Batch()
+            self.labels = [makeLabel(*entry, batch = self.batch) for entry in self.entries]
+        gl.glLoadIdentity()
+        self.batch.draw()
+
+    def release(self):
+        """Frees the laid out text. It gets laid out again the next time it's drawn."""
+        for label in self.labels:
+            label.delete()
+        self.labels = []
+        self.batch = None
+
+
+#Shared by everything that draws text
+cache = TextCache()
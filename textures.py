@@ -0,0 +1,143 @@
+"""
+Shared texture registry.
+
+Every texture in the game is requested through here so that an image is only
+decoded from disk once, no matter how many sprites or frames ask for it.
+
+Rooms can be built on a worker thread (see roomcache), but loading a texture
+talks to GL, which only the main thread may do. So every texture a room uses is
+preloaded, and a texture that wasn't raises TextureError on any other thread
+instead of being loaded there. A lock keeps the two threads from changing the
+registry at once.
+"""
+import io
+import threading
+import arcade
+from pyglet import gl
+import PIL.Image
+import PIL.ImageOps
+
+class TextureError(RuntimeError):
+    """A texture that wasn't preloaded, asked for off the main thread"""
+    pass
+
+
+class TextureRegistry:
+    """Hands out one texture object per (path, mirrored, scale)"""
+    def __init__(self):
+        #(path, mirrored, scale) -> texture handed out to the game
+        self.textures = {}
+        #(path, mirrored) -> decoded texture at scale 1, shared by every scale
+        self.images = {}
+        #GL texture id -> (path, mirrored) it was decoded from
+        self.sources = {}
+        #(path, mirrored) -> pixels of the image, only kept for images that get baked
+        self.pixels = {}
+        #GL texture id -> (in-memory file handed to arcade for a baked texture, key of arcade's
+        #cache it was filed under). The files are kept alive so arcade's own cache never
+        #sees the same buffer object twice.
+        self.baked = {}
+        self.hits = 0
+        self.misses = 0
+        self.decodes = 0
+        #With no window there is no GL to upload to, so only image sizes are read
+        self.headless = False
+        self.lock = threading.Lock()
+
+    def get(self, path, mirrored = False, scale = 1):
+        """Returns the texture for this image, decoding it only the first time"""
+        key = (path, mirrored, scale)
+        with self.lock:
+            texture = self.textures.get(key)
+            if texture is not None:
+                self.hits += 1
+                return texture
+
+            if threading.current_thread() is not threading.main_thread():
+                raise TextureError("{} (mirrored {}, scale {}) wasn't preloaded, and can't be loaded off the main thread".format(
+                    path, mirrored, scale))
+            self.misses += 1
+            image = self.images.get((path, mirrored))
+            if image is None:
+                if self.headless:
+                    with PIL.Image.open(path) as file:
+                        width, height = file.size
+                    #Made-up ids, only used to look the image back up
+                    image = arcade.Texture(-1 - len(self.images), width, height)
+                else:
+                    image = arcade.load_texture(path, mirrored = mirrored)
+                self.images[(path, mirrored)] = image
+                self.sources[image.texture_id] = (path, mirrored)
+                self.decodes += 1
+
+            #Scaling only changes the drawn size, so every scale shares the same image
+            texture = arcade.Texture(image.texture_id, image.width * scale, image.height * scale)
+            self.textures[key] = texture
+            return texture
+
+    def image(self, texture):
+        """Returns the pixels (as an RGBA PIL image) a registry texture was made from"""
+        with self.lock:
+            source = self.sources[texture.texture_id]
+            image = self.pixels.get(source)
+        if image is None:
+            #Only reads a file, so it can happen on any thread, and without holding up the others
+            path, mirrored = source
+            with PIL.Image.open(path) as file:
+                image = file.convert('RGBA')
+            if mirrored:
+                image = PIL.ImageOps.mirror(image)
+            with self.lock:
+                image = self.pixels.setdefault(source, image)
+        return image
+
+    def bake(self, image):
+        """Uploads an image built in memory (like a composited room layer) as a texture"""
+        if self.headless:
+            return arcade.Texture(0, image.width, image.height)
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        buffer.seek(0)
+        texture = arcade.load_texture(buffer)
+        cache = arcade.load_texture.texture_cache
+        key = next(key for key, cached in cache.items() if cached is texture)
+        self.baked[texture.texture_id] = (buffer, key)
+        return texture
+
+    def unbake(self, texture):
+        """Frees a texture made by bake, once nothing is going to draw it again"""
+        baked = self.baked.pop(texture.texture_id, None)
+        if baked is None:
+            return
+        #Forget arcade's cached copy before the buffer can be reused by a new bake
+        buffer, key = baked
+        cache = arcade.load_texture.texture_cache
+        if key in cache and cache[key].texture_id == texture.texture_id:
+            del cache[key]
+        gl.glDeleteTextures(1, gl.GLuint(texture.texture_id))
+
+    def preload(self, textures):
+        """Loads textures, given as (path, mirrored, scale), so none of them get decoded
+        mid-game or have to be loaded on another thread"""
+        for path, mirrored, scale in textures:
+            self.get(path, mirrored, scale)
+
+    def stats(self):
+        """Returns the hit/miss counters of the registry"""
+        return {'hits': self.hits, 'misses': self.misses, 'decodes': self.decodes, 'textures': len(self.textures)}
+
+
+#The registry used by the whole game
+registry = TextureRegistry()
+
+
+def load(path, mirrored = False, scale = 1):
+    """Drop-in replacement for arcade.load_texture that goes through the registry"""
+    return registry.get(path, mirrored, scale)
+
+
+def sprite(path, scale = 1):
+    """Creates a plain sprite whose texture comes from the registry"""
+    new_sprite = arcade.Sprite(scale = scale)
+    new_sprite.texture = load(path, scale = scale)
+    return new_sprite
@@ -0,0 +1,198 @@
+"""
+Checks level files, many at once, spread over every CPU core.
+
+For each level it checks that:
+- the outer wall has no gaps, except on the edges the level says are exits
+- no portal starts or ends inside a wall or outside the map
+- every door can be reached once everything that can be opened is open
+- every password names every lever, with orientations a lever can have
+- the room can be finished (solver.RoomSolver), and how many Z presses it takes
+
+Each level is built into a Room exactly like the game builds it, without a
+window, in a pool of worker processes. The results are gathered into one report.
+
+python validate.py                  checks every level in the Levels folder
+python validate.py a.json b.json    checks some levels
+
+This is the command for CI. It needs no display, since headless is imported
+before arcade.
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+
+import headless
+import final
+import levels
+import navigation
+import objects
+import solver
+
+LEVEL_FOLDER = 'Levels'
+
+
+def start_worker():
+    """Gets a worker process ready: into the game folder, with textures read as sizes only"""
+    headless.enable()
+
+
+def gaps(level):
+    """Returns the open tiles of the outer wall that aren't on an exit edge"""
+    width, height = level['size']
+    blocked = set(level['walls'])
+    for kind, image, x, y, options in level['objects']:
+        blocked.add((x, y))
+    found = []
+    edges = (('DOWN', [(x, 0) for x in range(width)]),
+             ('UP', [(x, height - 1) for x in range(width)]),
+             ('LEFT', [(0, y) for y in range(height)]),
+             ('RIGHT', [(width - 1, y) for y in range(height)]))
+    for edge, tiles in edges:
+        if edge in level['exits']:
+            continue
+        for tile in tiles:
+            if tile not in blocked and tile not in found:
+                found.append(tile)
+    return found
+
+
+def start_tile(level):
+    """Where the player comes into the room: its start tile, or the first opening on an exit edge"""
+    if level['start'] is not None:
+        return level['start']
+    width, height = level['size']
+    walls = set(level['walls'])
+    rows = {'DOWN': [(x, 0) for x in range(width)], 'UP': [(x, height - 1) for x in range(width)],
+            'LEFT': [(0, y) for y in range(height)], 'RIGHT': [(width - 1, y) for y in range(height)]}
+    for edge in level['exits']:
+        for tile in rows[edge]:
+            if tile not in walls:
+                return tile
+    return None
+
+
+def check(path):
+    """Validates one level file. Returns a dict of what was found, safe to send between processes."""
+    started = time.perf_counter()
+    result = {'level': path, 'errors': [], 'warnings': [], 'presses': None, 'states': 0}
+    errors = result['errors']
+    try:
+        level = levels.load(path)
+        room = final.build_room(level)
+        size = final.SPRITE_SIZE
+        graph = room.navigation()
+
+        for x, y in gaps(level):
+            errors.append("gap in the outer wall at ({}, {})".format(x, y))
+
+        for start_x, start_y, end_x, end_y in level['portals']:
+            for name, tile in (('starts', (start_x, start_y)), ('lands', (end_x, end_y))):
+                if graph.number(*tile) is None:
+                    errors.append("portal at ({}, {}) {} outside the map at {}".format(start_x, start_y, name, tile))
+                elif not graph.isOpen(*tile):
+                    errors.append("portal at ({}, {}) {} inside a wall at {}".format(start_x, start_y, name, tile))
+
+        start = start_tile(level)
+        if start is None:
+            errors.append("the level has no start tile and no exits to come in by")
+        elif not graph.isOpen(*start):
+            errors.append("the player would start inside a wall at {}".format(start))
+        else:
+            #Open everything that can be opened, and see which doors the player could walk up to
+            openable = [thing for thing in room.things if isinstance(thing, objects.InteractObjects)]
+            opened = navigation.NavGraph.fromRoom(room, size, ignore = set(openable))
+            for door in room.door_list:
+                tile = (int(door.left // size), int(door.bottom // size))
+                if not opened.reachesAny(start, opened.besideSprite(door, size)):
+                    errors.append("the door at {} can never be reached".format(tile))
+
+        passwords = room.password
+        if passwords != [] and type(passwords[0]) != list:
+            passwords = [passwords]
+        for number, password in enumerate(passwords, 1):
+            if len(password) != len(room.puzzle.switches):
+                errors.append("password {} names {} levers, but the room has {}".format(number, len(password), len(room.puzzle.switches)))
+            wrong = [orientation for orientation in password if orientation not in objects.LeverPuzzle.codes]
+            if wrong:
+                errors.append("password {} has unknown orientations {}".format(number, ', '.join(wrong)))
+        if len(room.secret_item) < len(passwords):
+            result['warnings'].append("{} passwords but only {} secret items".format(len(passwords), len(room.secret_item)))
+
+        if start is not None and graph.isOpen(*start):
+            solution = solver.RoomSolver(room, start, size).solve()
+            if solution is None:
+                errors.append("the room can't be finished")
+            else:
+                result['presses'] = solution.presses
+                result['states'] = solution.states
+    except levels.LevelError as error:
+        errors.append(str(error))
+    except Exception as error:
+        errors.append("{}: {}".format(type(error).__name__, error))
+        result['traceback'] = traceback.format_exc()
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def validate(paths, workers = None):
+    """Checks every level in paths over a pool of processes. Returns the results in the same order."""
+    if workers == 1:
+        start_worker()
+        return [check(path) for path in paths]
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = start_worker) as pool:
+        return list(pool.map(check, paths, chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))))
+
+
+def report(results, seconds):
+    """Prints one line per level, the problems found, and a summary"""
+    failed = 0
+    for result in results:
+        if result['errors']:
+            failed += 1
+            print("FAIL {}".format(result['level']))
+        else:
+            print("ok   {}  ({} Z presses, {} states, {:.1f}ms)".format(
+                result['level'], result['presses'], result['states'], result['seconds'] * 1000))
+        for error in result['errors']:
+            print("       error: {}".format(error))
+        for warning in result['warnings']:
+            print("       warning: {}".format(warning))
+
+    work = sum(result['seconds'] for result in results)
+    print("{} levels, {} failed, in {:.2f}s ({:.2f}s of checking)".format(len(results), failed, seconds, work))
+    return failed
+
+
+def main(argv = None):
+    """Validates levels and returns the exit code: 0 if every level passed"""
+    parser = argparse.ArgumentParser(description = "Check that levels are well formed and can be finished.")
+    parser.add_argument('levels', nargs = '*', help = "level files (every level in the Levels folder by default)")
+    parser.add_argument('--workers', type = int, default = None, help = "worker processes (one per core by default)")
+    parser.add_argument('--json', action = 'store_true', help = "print the results as JSON")
+    args = parser.parse_args(argv)
+
+    #Paths are read from the game folder, like the game does
+    paths = [os.path.abspath(path) for path in args.levels]
+    start_worker()
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(LEVEL_FOLDER, '*.json')))
+
+    started = time.perf_counter()
+    results = validate(paths, args.workers)
+    seconds = time.perf_counter() - started
+
+    if args.json:
+        json.dump({'seconds': seconds, 'results': results}, sys.stdout, indent = 2)
+        print()
+        return 1 if any(result['errors'] for result in results) else 0
+    return 1 if report(results, seconds) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Big rooms: chunks of static layer that stream in and out, and a scrolling camera.
+
+A room's floor and plain walls are split into square chunks, each its own
+layers.StaticLayer. Only the chunks the camera can see are drawn, and only the
+chunks near the camera are kept composed and baked. Chunks further away are
+released, so a room can be any size without the drawing or the memory it uses
+growing with it.
+
+The camera follows the player around a room bigger than the screen. A room
+that fits on the screen keeps the camera in the corner, like before.
+
+The sprites drawn on top of the layer (props, portals, doors, smashed crates)
+are kept in CulledLists, which only hand the sprites on screen to arcade.
+"""
+import math
+import arcade
+import layers
+import spatial
+
+
+class ChunkedLayer:
+    """A static layer cut into chunks of chunk_size x chunk_size pixels"""
+    def __init__(self, width, height, scale, chunk_size):
+        #Size of the room in pixels, how much sprite images are scaled up, and how big a chunk is
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.chunk_size = chunk_size
+        self.columns = max(1, int(math.ceil(width / chunk_size)))
+        self.rows = max(1, int(math.ceil(height / chunk_size)))
+
+        #(column, row) -> layers.StaticLayer, made when the first sprite lands in it
+        self.chunks = {}
+        #sprite -> the chunk it was put in
+        self.placed = {}
+        #Chunks that may hold a composed image or a baked texture
+        self.resident = set()
+
+        self.streamed_in = 0
+        self.streamed_out = 0
+
+    def __contains__(self, sprite):
+        return sprite in self.placed
+
+    def __len__(self):
+        return len(self.placed)
+
+    @property
+    def bakes(self):
+        return sum(chunk.bakes for chunk in self.chunks.values())
+
+    def chunkOf(self, sprite):
+        """Returns the chunk a sprite belongs to, by where its middle is"""
+        column = min(max(int(sprite.center_x // self.chunk_size), 0), self.columns - 1)
+        row = min(max(int(sprite.center_y // self.chunk_size), 0), self.rows - 1)
+        return (column, row)
+
+    def append(self, sprite):
+        """Adds a sprite to the chunk under it"""
+        key = self.chunkOf(sprite)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            left = key[0] * self.chunk_size
+            bottom = key[1] * self.chunk_size
+            chunk = layers.StaticLayer(min(self.chunk_size, self.width - left), min(self.chunk_size, self.height - bottom),
+                                       self.scale, left, bottom)
+            self.chunks[key] = chunk
+        chunk.append(sprite)
+        self.placed[sprite] = key
+
+    def remove(self, sprite):
+        """Takes a sprite out of its chunk, so only that chunk has to be baked again"""
+        self.chunks[self.placed.pop(sprite)].remove(sprite)
+
+    def chunksIn(self, left, right, bottom, top):
+        """Returns the keys of the chunks that overlap a box, nearest the middle of it first"""
+        size = self.chunk_size
+        first_column = max(int(left // size), 0)
+        last_column = min(int(math.ceil(right / size)) - 1, self.columns - 1)
+        first_row = max(int(bottom // size), 0)
+        last_row = min(int(math.ceil(top / size)) - 1, self.rows - 1)
+        middle_x = (left + right) / 2 / size - 0.5
+        middle_y = (bottom + top) / 2 / size - 0.5
+        keys = [(column, row) for column in range(first_column, last_column + 1) for row in range(first_row, last_row + 1)
+                if (column, row) in self.chunks]
+        keys.sort(key = lambda key: (key[0] - middle_x) ** 2 + (key[1] - middle_y) ** 2)
+        return keys
+
+    def compose(self, view = None):
+        """Composes the chunks in view (left, right, bottom, top), or every chunk. This
+        doesn't touch GL, so it can run on a worker thread ahead of time."""
+        keys = self.chunks if view is None else self.chunksIn(*view)
+        for key in keys:
+            chunk = self.chunks[key]
+            if chunk.image is None and chunk.texture is None:
+                chunk.compose()
+                self.resident.add(key)
+
+    def stream(self, view, margin, budget = 1):
+        """Gets the chunks within margin of the view ready, at most budget of them per call,
+        and releases the chunks more than twice margin away"""
+        left, right, bottom, top = view
+        for key in self.chunksIn(left - margin, right + margin, bottom - margin, top + margin):
+            if budget <= 0:
+                break
+            chunk = self.chunks[key]
+            if chunk.image is None and chunk.texture is None:
+                chunk.compose()
+                self.resident.add(key)
+                self.streamed_in += 1
+                budget -= 1
+
+        keep = set(self.chunksIn(left - 2 * margin, right + 2 * margin, bottom - 2 * margin, top + 2 * margin))
+        for key in list(self.resident):
+            if key not in keep:
+                self.chunks[key].release()
+                self.resident.discard(key)
+                self.streamed_out += 1
+
+    def draw(self, view):
+        """Draws the chunks the view (left, right, bottom, top) can see. Returns how many were drawn."""
+        keys = self.chunksIn(*view)
+        for key in keys:
+            self.chunks[key].draw()
+            self.resident.add(key)
+        return len(keys)
+
+    def release(self):
+        """Frees every chunk's image and texture"""
+        for key in self.resident:
+            self.chunks[key].release()
+        self.resident.clear()
+
+
+class CulledList:
+    """A list of sprites that only draws the ones in view. The sprites are filed in a
+    coarse grid, so finding the ones on screen only looks at a few cells."""
+    def __init__(self, cell_size):
+        self.grid = spatial.TileIndex(cell_size)
+        #sprite -> when it was added, so sprites are drawn in the order they were added
+        self.order = {}
+        self.added = 0
+
+        #What was handed to arcade last time, and the cells and version it was made for
+        self.visible = arcade.SpriteList(use_spatial_hash = False)
+        self.drawn_for = None
+        #Goes up every time a sprite is added or removed
+        self.version = 0
+
+        #How many sprites the last draw drew and skipped
+        self.drawn = 0
+        self.culled = 0
+
+    def __contains__(self, sprite):
+        return sprite in self.order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(list(self.order))
+
+    def append(self, sprite):
+        """Adds a sprite. Sprites are filed where they are when added, so they shouldn't move after."""
+        self.order[sprite] = self.added
+        self.added += 1
+        self.grid.insert(sprite)
+        self.version += 1
+
+    def remove(self, sprite):
+        del self.order[sprite]
+        self.grid.remove(sprite)
+        self.version += 1
+
+    def inView(self, view):
+        """Returns the sprites in the cells the view (left, right, bottom, top) touches, in the order they were added"""
+        found = set()
+        first_x, last_x, first_y, last_y = self.grid.tileRange(*view)
+        for x in range(first_x, last_x + 1):
+            for y in range(first_y, last_y + 1):
+                found.update(self.grid.atTile(x, y))
+        return sorted(found, key = self.order.__getitem__)
+
+    def draw(self, view):
+        """Draws the sprites in view. The list handed to arcade is only made again when
+        the view moves onto other cells of the grid or a sprite is added or removed."""
+        key = (self.grid.tileRange(*view), self.version)
+        if key != self.drawn_for:
+            self.visible.sprite_list = self.inView(view)
+            self.visible.vbo_dirty = True
+            self.drawn_for = key
+        if self.visible.sprite_list:
+            self.visible.draw()
+        self.drawn = len(self.visible.sprite_list)
+        self.culled = len(self.order) - self.drawn
+        return self.culled
+
+
+class Camera:
+    """Which part of the room is on screen"""
+    def __init__(self, width, height):
+        #Size of the screen, and where its bottom left corner is in the room
+        self.width = width
+        self.height = height
+        self.left = 0
+        self.bottom = 0
+
+    @staticmethod
+    def clamp(value, highest):
+        """Keeps the camera inside the room. A room smaller than the screen stays in the corner."""
+        if highest <= 0:
+            return 0
+        return min(max(value, 0), highest)
+
+    def follow(self, sprite, room_width, room_height):
+        """Centres the camera on a sprite, without showing anything past the edges of the room"""
+        #Whole pixels, so the tiles don't shimmer as the camera moves
+        self.left = int(round(self.clamp(sprite.center_x - self.width / 2, room_width - self.width)))
+        self.bottom = int(round(self.clamp(sprite.center_y - self.height / 2, room_height - self.height)))
+
+    def view(self):
+        """Returns the part of the room on screen, as (left, right, bottom, top)"""
+        return (self.left, self.left + self.width, self.bottom, self.bottom + self.height)
+
+    def apply(self):
+        """Draws from here on in room coordinates"""
+        arcade.set_viewport(*self.view())
+
+    def reset(self):
+        """Draws from here on in screen coordinates, for menus and the dialogue box"""
+        arcade.set_viewport(0, self.width, 0, self.height)